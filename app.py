@@ -1,16 +1,42 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, abort, jsonify, render_template, request, redirect, url_for, flash, session, g, stream_with_context, has_request_context
+import bisect
+import click
 import sqlite3
+import csv
+import io
+import json
+import logging
 import os
+import queue
+import zlib
+from collections import OrderedDict
 import secrets
 import re
+import base64
+import random
+import threading
+import time
+from functools import lru_cache, total_ordering
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal, InvalidOperation
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
 from werkzeug.security import generate_password_hash, check_password_hash
+import audit_log
+import storage
+from storage import ConnectionPool, PoolTimeoutError, dialect_of
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot refreshes are only serialized within the process
+    fcntl = None
 
 app = Flask(__name__)
 
-# Generate a secure random secret key
-app.secret_key = secrets.token_hex(32)
+# The secret key is shared by every worker process; see load_secret_key()
 
 # Session configuration for security
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -18,43 +44,239 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
 
 # Constants
-DATABASE = 'database/bank_db.db'
+DATABASE = os.environ.get('BANK_DATABASE', 'database/bank_db.db')
+STORAGE_URL = os.environ.get('BANK_STORAGE_URL')  # None = SQLite at DATABASE; see storage.py for server URLs
+INIT_DB_ON_IMPORT = os.environ.get('BANK_INIT_DB', '1') != '0'  # serve.py sets 0 and migrates once in its master
+DEBUG = os.environ.get('BANK_DEBUG', '0') == '1'  # `python app.py` dev server only: debugger and reloader
 MIN_TRANSFER_AMOUNT = 0.01
 MAX_TRANSFER_AMOUNT = 1000000.00
 MIN_PASSWORD_LENGTH = 6
 USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_]{3,50}$')
 EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
+# Connection pool settings
+DB_POOL_SIZE = 8                    # Max open connections per process
+DB_POOL_TIMEOUT = 10                # Seconds to wait for a free connection
+DB_BUSY_TIMEOUT = 5                 # Seconds SQLite waits on a locked database
+DB_CACHE_SIZE_KB = 16 * 1024        # Page cache per connection (PRAGMA cache_size)
+DB_MMAP_SIZE = 256 * 1024 * 1024    # Memory-mapped I/O window (PRAGMA mmap_size)
+DB_STATEMENT_CACHE_SIZE = 256       # Prepared statements kept per connection
+
+# Read routing for heavy read-only routes (reports, history, search)
+READ_ROUTING = os.environ.get('BANK_READ_ROUTING', 'readonly')  # "primary", "readonly" or "snapshot"
+READ_POOL_SIZE = 8                  # Max open read-only connections per process
+READ_MAX_STALENESS = float(os.environ.get('BANK_READ_MAX_STALENESS', 30))  # Seconds a snapshot may lag
+SNAPSHOT_RETRY_INTERVAL = 1         # Seconds between refresh attempts while another process holds the lock
+
+# Transaction history pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+TRANSACTION_TYPES = ("Deposit", "Withdraw", "Transfer In", "Transfer Out")
+# Positional columns the history templates index into (trans[0]..trans[5])
+TRANSACTION_COLUMNS = "t.trans_id, t.user_id, t.emp_id, t.trans_type, t.amount_cents, t.trans_date"
+DASHBOARD_HISTORY_QUERY = (f"SELECT {TRANSACTION_COLUMNS} FROM transactions t WHERE t.user_id=? "
+                           "ORDER BY t.trans_date DESC LIMIT 10")
+# Admin history pages: the customer and employee behind each row
+HISTORY_NAME_JOINS = "LEFT JOIN users u ON t.user_id = u.user_id LEFT JOIN employees e ON t.emp_id = e.emp_id"
+REPORT_HISTORY_COLUMNS = TRANSACTION_COLUMNS + ", u.username as user_name, e.username as emp_name"
+ADMIN_HISTORY_COLUMNS = TRANSACTION_COLUMNS + (", u.username as user_name, u.full_name as user_full_name, "
+                                               "e.username as emp_name, e.full_name as emp_full_name")
+
+# Daily summary rollup: system-wide ('all') rows are spread over shards by entry_id,
+# so concurrent postings do not all update one row per day and type
+SUMMARY_SHARDS = 8
+
+# Report export
+EXPORT_CHUNK_SIZE = 1000            # Rows fetched per cursor.fetchmany() call
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# Password hashing (offloaded to a process pool)
+PASSWORD_HASH_METHOD = os.environ.get("BANK_HASH_METHOD", "pbkdf2:sha256:600000")
+PASSWORD_SALT_LENGTH = 16
+HASH_POOL_SIZE = int(os.environ.get("BANK_HASH_POOL_SIZE", os.cpu_count() or 2))  # 0 = hash inline
+HASH_QUEUE_LIMIT = 64               # Jobs queued or running before new ones get a 503
+HASH_TIMEOUT = 10                   # Seconds to wait for a hashing job
+
+# Bulk customer import
+BULK_IMPORT_BATCH_SIZE = 1000       # Rows validated, hashed and inserted per transaction
+BULK_IMPORT_FIELDS = ("full_name", "username", "email", "password", "balance")
+BULK_IMPORT_FORMATS = ("csv", "jsonl")
+
+# Batch postings
+BATCH_POSTING_MAX_ITEMS = 100000    # Largest batch accepted in one request
+RESOLVE_CHUNK_SIZE = 500            # Usernames per IN list on server backends
+
+# Customer accounts
+ACCOUNT_TYPES = ("checking", "savings")
+DEFAULT_ACCOUNT_TYPE = "checking"   # Opened for every customer; used when no account is chosen
+CASH_ACCOUNT_TYPE = "cash"          # System counterparty for teller deposits/withdrawals
+# Teller postings are spread over cash, cash-1 .. cash-7 (migration 12) by emp_id
+
+# Ledger reconciliation
+RECONCILE_CHUNK_ROWS = 50000        # transactions rows per parallel chunk
+RECONCILE_WORKERS = os.cpu_count() or 2
+
+# Login credential lookup
+UNKNOWN_USER_CACHE_SIZE = 10000     # Remembered nonexistent usernames
+UNKNOWN_USER_CACHE_TTL = 30         # Seconds before an unknown username is looked up again
+
+# Posting engine retry policy (busy/locked database)
+POSTING_MAX_RETRIES = 5
+POSTING_RETRY_BASE_DELAY = 0.005    # Seconds, doubled on every retry
+POSTING_RETRY_MAX_DELAY = 0.2       # Upper bound for a single backoff sleep
+
+# Group commit: transfers and teller postings share one transaction per batch
+GROUP_COMMIT = os.environ.get("BANK_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("BANK_GROUP_COMMIT_WINDOW_MS", 0))  # Extra ms to collect postings; 0 = take what is queued
+GROUP_COMMIT_MAX_ITEMS = 256        # Postings per batch transaction
+
+# Customer search (FTS5 index over username, full_name and email)
+SEARCH_RESULT_LIMIT = 10            # Matches shown to the teller
+SEARCH_CANDIDATE_LIMIT = 50         # Hits per index lookup that get re-ranked
+SEARCH_FUZZY_MIN_LENGTH = 4         # Shorter words are matched by prefix only
+SEARCH_MAX_TERMS = 4                # Words of the query that are used
+
+# Per-user dashboard cache (per process, checked against users.dashboard_generation)
+DASHBOARD_CACHE_SIZE = int(os.environ.get("BANK_DASHBOARD_CACHE_SIZE", 5000))  # Users kept; 0 disables
+DASHBOARD_CACHE_TTL = 60            # Seconds before an entry is reloaded even without a posting
+DASHBOARD_GENERATION_QUERY = "SELECT dashboard_generation FROM users WHERE user_id=?"
+
+# Request and SQL instrumentation (exposed at /admin/metrics)
+METRICS_ENABLED = os.environ.get("BANK_METRICS", "1") != "0"
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_MAX_STATEMENTS = 500        # Distinct SQL texts tracked; the rest share one "other" series
+SLOW_QUERY_MS = float(os.environ.get("BANK_SLOW_QUERY_MS", 250))  # 0 disables the slow-query log
+SLOW_QUERY_LOG = os.environ.get("BANK_SLOW_QUERY_LOG")  # File path; defaults to stderr
+
+# Server-side sessions (kept next to the database, shared by all worker processes)
+DATA_DIR = os.path.dirname(DATABASE) or "."
+SESSION_DATABASE = os.environ.get("BANK_SESSION_DATABASE") or os.path.join(DATA_DIR, "sessions.db")
+SECRET_KEY_FILE = os.environ.get("BANK_SECRET_KEY_FILE") or os.path.join(DATA_DIR, "secret_key")
+SESSION_SWEEP_INTERVAL = 60         # Seconds between background purges of expired sessions; 0 disables
+SESSION_SWEEP_BATCH = 1000          # Expired sessions deleted per statement
+SESSION_TOUCH_AFTER = 0.5           # Fraction of the lifetime used before an unchanged session's expiry is pushed back
+
+# Binary audit log of postings (see audit_log.py)
+AUDIT_LOG_ENABLED = os.environ.get("BANK_AUDIT_LOG", "1") != "0"
+AUDIT_LOG_DIR = os.environ.get("BANK_AUDIT_LOG_DIR") or os.path.join(DATA_DIR, "audit")
+AUDIT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024  # Size at which a new segment file is started
+
+# Idempotency keys (Idempotency-Key header or hidden form field on postings)
+IDEMPOTENCY_KEY_TTL = 24 * 3600     # Seconds a key replays its original result
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_PURGE_INTERVAL = 60     # Seconds between background purges of expired keys; 0 disables
+IDEMPOTENCY_PURGE_BATCH = 500       # Expired keys deleted per (short) transaction
+
+# JSON API (session cookie login, same validation as the form routes)
+API_PREFIX = "/api/v1"
+
 # Egypt Timezone (UTC+2) - Helper function
 def get_egypt_time():
     """Returns the current time in Egypt (UTC+2) formatted as YYYY-MM-DD HH:MM:SS."""
     timeNow = datetime.now()
     return timeNow.strftime('%Y-%m-%d %H:%M:%S')
 
+# Money
+@total_ordering
+class Money:
+    """
+    An exact amount of money stored as integer cents.
+    
+    Balances and amounts are kept as INTEGER minor units in the database, so
+    arithmetic and SUM() aggregates are exact and need no Decimal/float
+    round-trips. Money formats like a Decimal (f"{amount:.2f}").
+    """
+    __slots__ = ("cents",)
+    
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+        
+    @classmethod
+    def parse(cls, value):
+        """
+        Parse a user-supplied amount such as "12.5" or "1000.00".
+        
+        Raises:
+            ValueError: If value is not a number with at most two decimals
+        """
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError("Amount must be a number")
+        if not amount.is_finite():
+            raise ValueError("Amount must be a number")
+        cents = amount * 100
+        if cents != cents.to_integral_value():
+            raise ValueError("Amount cannot have more than two decimal places")
+        return cls(cents)
+    
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+    
+    def __add__(self, other):
+        return Money(self.cents + other.cents)
+    
+    def __sub__(self, other):
+        return Money(self.cents - other.cents)
+    
+    def __neg__(self):
+        return Money(-self.cents)
+    
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.cents == other.cents
+    
+    def __lt__(self, other):
+        return self.cents < other.cents
+    
+    def __hash__(self):
+        return hash(self.cents)
+    
+    def __bool__(self):
+        return self.cents != 0
+    
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec or ".2f")
+    
+    def __str__(self):
+        return format(self, ".2f")
+    
+    def __repr__(self):
+        return f"Money('{self}')"
+
+MIN_TRANSFER_MONEY = Money.parse(MIN_TRANSFER_AMOUNT)
+MAX_TRANSFER_MONEY = Money.parse(MAX_TRANSFER_AMOUNT)
+
+@app.template_filter("money")
+def format_money(cents):
+    """Format integer cents (or Money) as 1234.56 in templates."""
+    if isinstance(cents, Money):
+        return str(cents)
+    return str(Money(cents or 0))
+
 # Helper Functions
 def validate_amount(amount_str):
     """
-    Validate and convert amount string to Decimal.
+    Validate and convert amount string to Money.
     
     Args:
         amount_str: String representation of amount
         
     Returns:
-        Decimal: Validated amount
+        Money: Validated amount
         
     Raises:
         ValueError: If amount is invalid
     """
     try:
-        amount = Decimal(str(amount_str))
-        if amount <= 0:
+        amount = Money.parse(amount_str)
+        if amount.cents <= 0:
             raise ValueError("Amount must be positive")
-        if amount < MIN_TRANSFER_AMOUNT:
+        if amount < MIN_TRANSFER_MONEY:
             raise ValueError(f"Amount must be at least ${MIN_TRANSFER_AMOUNT}")
-        if amount > MAX_TRANSFER_AMOUNT:
+        if amount > MAX_TRANSFER_MONEY:
             raise ValueError(f"Amount cannot exceed ${MAX_TRANSFER_AMOUNT:,.2f}")
         return amount
-    except (InvalidOperation, ValueError) as e:
+    except ValueError as e:
         raise ValueError(f"Invalid amount: {str(e)}")
 
 def validate_username(username):
@@ -108,27 +330,1000 @@ def validate_password(password):
         raise ValueError(f"Password must be at least {MIN_PASSWORD_LENGTH} characters")
     return True
 
-def get_db():
+def validate_customer(full_name, username, email, password, balance_str):
     """
-    Get database connection with row factory.
+    Validate the fields of a new customer account.
     
+    Args:
+        full_name: Customer full name
+        username: Login username
+        email: Email address (optional, may be empty)
+        password: Plain-text password
+        balance_str: Initial balance as a string
+        
     Returns:
-        sqlite3.Connection: Database connection
+        Money: Validated initial balance
+        
+    Raises:
+        ValueError: If any field is invalid
+    """
+    if not full_name:
+        raise ValueError("Full name is required")
+    if not username:
+        raise ValueError("Username is required")
+    # Email is optional now
+    if not password:
+        raise ValueError("Password is required")
+        
+    validate_username(username)
+    if email:
+        validate_email(email)
+    validate_password(password)
+    
+    # Validate balance
+    try:
+        balance = Money.parse(balance_str)
+    except ValueError:
+        raise ValueError("Invalid balance amount")
+    if balance.cents < 0:
+        raise ValueError("Initial balance cannot be negative")
+    return balance
+
+# ---------------------------
+# Password hashing
+# ---------------------------
+class HashingOverloadedError(RuntimeError):
+    """Raised when the hashing pool is saturated and the request should be shed."""
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded process pool.
+    
+    PBKDF2 is deliberately slow; running it in worker processes keeps request
+    threads free for cheap routes during a login storm. At most queue_limit
+    jobs may be queued or running: beyond that callers get
+    HashingOverloadedError immediately instead of piling up.
+    """
+    
+    def __init__(self, workers=HASH_POOL_SIZE, queue_limit=HASH_QUEUE_LIMIT, timeout=HASH_TIMEOUT,
+                 method=None, salt_length=PASSWORD_SALT_LENGTH):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.method = method or PASSWORD_HASH_METHOD
+        self.salt_length = salt_length
+        self._prefix = None
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.shed = 0
+        
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.shed += 1
+                raise HashingOverloadedError("Password hashing queue is full")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+        try:
+            result = executor.submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.shed += 1
+            raise HashingOverloadedError("Password hashing timed out")
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+                
+    def hash(self, password):
+        """Hash a password with the configured method and salt length."""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+    
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash."""
+        return self._run(check_password_hash, pwhash, password)
+    
+    def hash_many(self, passwords):
+        """
+        Hash a batch of passwords in parallel across the worker processes.
+        
+        The whole batch occupies a single queue slot, so bulk jobs are shed
+        like any other request when the pool is saturated. Each worker gets
+        timeout seconds per password it has to hash.
+        
+        Args:
+            passwords: List of plain-text passwords
+            
+        Returns:
+            list: Hashes in the same order
+            
+        Raises:
+            HashingOverloadedError: If the queue is full or the batch times out
+        """
+        if self.workers <= 0 or len(passwords) < 2:
+            return [self.hash(password) for password in passwords]
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.shed += 1
+                raise HashingOverloadedError("Password hashing queue is full")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+        try:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            timeout = self.timeout * ((len(passwords) + self.workers - 1) // self.workers)
+            hashes = list(executor.map(generate_password_hash, passwords,
+                                       [self.method] * len(passwords), [self.salt_length] * len(passwords),
+                                       timeout=timeout, chunksize=chunksize))
+        except FutureTimeoutError:
+            with self._lock:
+                self.shed += 1
+            raise HashingOverloadedError("Password hashing timed out")
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self.completed += len(passwords)
+        return hashes
+                
+    def needs_rehash(self, pwhash):
+        """Return True if pwhash was made with different hashing parameters."""
+        if self._prefix is None:
+            # Werkzeug expands bare methods ("scrypt" -> "scrypt:32768:8:1"), so compare
+            # against the prefix it actually writes; one dummy hash, on first use
+            self._prefix = generate_password_hash("", self.method, 1).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._prefix
+    
+    def shutdown(self):
+        """Stop the worker processes (a new pool starts on next use)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+    def stats(self):
+        """
+        Snapshot of hashing counters.
+        
+        Returns:
+            dict: workers, pending, completed and shed counts
+        """
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending,
+                    "completed": self.completed, "shed": self.shed}
+
+password_hasher = PasswordHasher()
+
+def verify_login_password(conn, table, id_column, row_id, pwhash, password):
+    """
+    Verify a login password and transparently upgrade outdated hashes.
+    
+    When the stored hash was made with different parameters than
+    PASSWORD_HASH_METHOD, the password is re-hashed and saved. A failed
+    upgrade never fails the login.
+    
+    Args:
+        conn: Database connection
+        table: Credential table ("users", "employees" or "admins")
+        id_column: Primary key column of table
+        row_id: Primary key of the account
+        pwhash: Stored password hash
+        password: Password submitted by the user
+        
+    Returns:
+        bool: True if the password matches
+    """
+    if not password_hasher.verify(pwhash, password):
+        return False
+    if password_hasher.needs_rehash(pwhash):
+        try:
+            conn.execute(f"UPDATE {table} SET password=? WHERE {id_column}=? AND password=?",
+                         (password_hasher.hash(password), row_id, pwhash))
+            conn.commit()
+        except (HashingOverloadedError, sqlite3.Error) as e:
+            print(f"Password rehash skipped: {str(e)}")
+    return True
+
+# ---------------------------
+# Credential lookup
+# ---------------------------
+# role -> (table, id column, session key, dashboard endpoint)
+LOGIN_ROLES = {
+    "user": ("users", "user_id", "user_id", "user_dashboard"),
+    "employee": ("employees", "emp_id", "emp_id", "employee_dashboard"),
+    "admin": ("admins", "admin_id", "admin_id", "admin_dashboard"),
+}
+
+# Built once so every lookup reuses the connection's prepared statement
+CREDENTIAL_QUERIES = {
+    role: f"SELECT {id_column}, password, full_name FROM {table} WHERE username=?"
+    for role, (table, id_column, _, _) in LOGIN_ROLES.items()
+}
+
+class NegativeCache:
+    """
+    Bounded LRU set of recently seen unknown keys with a time-to-live.
+    
+    Used to answer repeated lookups of nonexistent usernames (credential
+    stuffing) without touching the database.
+    """
+    
+    def __init__(self, max_size=UNKNOWN_USER_CACHE_SIZE, ttl=UNKNOWN_USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+    def __contains__(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if expires is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False
+        
+    def add(self, key):
+        """Remember key as unknown for ttl seconds."""
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                
+    def discard(self, key):
+        """Forget key (call when the account gets created)."""
+        with self._lock:
+            self._entries.pop(key, None)
+            
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            
+    def stats(self):
+        """
+        Snapshot of cache counters.
+        
+        Returns:
+            dict: hits, misses and current size
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+unknown_usernames = NegativeCache()
+
+def lookup_credentials(conn, role, username):
+    """
+    Fetch the id, password hash and full name for a login.
+    
+    Usernames recently found not to exist are answered from
+    unknown_usernames without a query.
+    
+    Args:
+        conn: Database connection
+        role: "user", "employee" or "admin"
+        username: Submitted username
+        
+    Returns:
+        sqlite3.Row or None: (id, password, full_name) if the account exists
+    """
+    key = (role, username)
+    if key in unknown_usernames:
+        return None
+    row = conn.execute(CREDENTIAL_QUERIES[role], (username,)).fetchone()
+    if row is None:
+        unknown_usernames.add(key)
+    return row
+
+@app.errorhandler(HashingOverloadedError)
+def handle_hashing_overload(error):
+    """Shed load quickly with a 503 instead of queueing more hashing work."""
+    return render_template("error.html", code=503,
+                           message="The server is busy. Please try again in a moment."), 503, {"Retry-After": "1"}
+
+# ---------------------------
+# Metrics
+# ---------------------------
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus sense."""
+    
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        
+    def cumulative(self):
+        """Yield (upper bound label, cumulative count) pairs ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            total += count
+            yield ("+Inf" if bound is None else repr(bound)), total
+            
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts, other.sum, other.count = list(self.counts), self.sum, self.count
+        return other
+
+@lru_cache(maxsize=4096)
+def statement_key(query):
+    """
+    Normalise SQL text into a bounded metrics label.
+    
+    Whitespace is collapsed and placeholder lists of any length become
+    "(?, ...)", so IN lists built per request share one series.
+    """
+    text = " ".join(query.split())
+    text = re.sub(r"\(\?(?:\s*,\s*\?)+\)", "(?, ...)", text)
+    return text if len(text) <= 200 else text[:197] + "..."
+
+class MetricsRegistry:
+    """
+    Process-wide request and SQL counters.
+    
+    Records per-route latency histograms and response counts, per-statement
+    call counts, time and rows returned, write-lock waits (the time spent in
+    BEGIN) and busy/locked errors. All updates take one short lock.
+    """
+    
+    def __init__(self, max_statements=METRICS_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self.reset()
+        
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.responses = {}
+            self.statements = {}
+            self.lock_wait = Histogram()
+            self.busy_errors = 0
+            self.slow_queries = 0
+            
+    def observe_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            histogram = self.routes.get((endpoint, method))
+            if histogram is None:
+                histogram = self.routes[(endpoint, method)] = Histogram()
+            histogram.observe(seconds)
+            key = (endpoint, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            
+    def _statement(self, sql):
+        stats = self.statements.get(sql)
+        if stats is None:
+            if len(self.statements) >= self.max_statements:
+                sql = "other"
+                stats = self.statements.get(sql)
+            if stats is None:
+                stats = self.statements[sql] = {"calls": 0, "seconds": 0.0, "max": 0.0, "rows": 0}
+        return stats
+    
+    def observe_statement(self, sql, seconds, slow=False):
+        with self._lock:
+            stats = self._statement(sql)
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if seconds > stats["max"]:
+                stats["max"] = seconds
+            if sql.startswith("BEGIN"):
+                self.lock_wait.observe(seconds)
+            if slow:
+                self.slow_queries += 1
+                
+    def add_rows(self, sql, rows):
+        if rows:
+            with self._lock:
+                self._statement(sql)["rows"] += rows
+                
+    def count_busy(self):
+        with self._lock:
+            self.busy_errors += 1
+            
+    def snapshot(self):
+        """
+        Consistent copy of every series for rendering.
+        
+        Returns:
+            dict: routes, responses, statements, lock_wait, busy_errors and slow_queries
+        """
+        with self._lock:
+            return {
+                "routes": {key: histogram.copy() for key, histogram in self.routes.items()},
+                "responses": dict(self.responses),
+                "statements": {sql: dict(stats) for sql, stats in self.statements.items()},
+                "lock_wait": self.lock_wait.copy(),
+                "busy_errors": self.busy_errors,
+                "slow_queries": self.slow_queries,
+            }
+
+metrics = MetricsRegistry()
+
+slow_query_log = logging.getLogger("bank.slow_query")
+if SLOW_QUERY_LOG:
+    _slow_query_handler = logging.FileHandler(SLOW_QUERY_LOG)
+    _slow_query_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_log.addHandler(_slow_query_handler)
+
+def _observe_statement(sql, seconds):
+    """Record one statement and write it to the slow-query log if over SLOW_QUERY_MS."""
+    slow = SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS
+    metrics.observe_statement(sql, seconds, slow)
+    if slow:
+        endpoint = request.endpoint if has_request_context() else "-"
+        slow_query_log.warning("slow query %.1f ms endpoint=%s sql=%s", seconds * 1000, endpoint, sql)
+
+class InstrumentedCursor:
+    """Cursor proxy that times every statement and counts the rows fetched."""
+    
+    def __init__(self, raw, dialect):
+        self._raw = raw
+        self._dialect = dialect
+        self._sql = None
+        
+    def _timed(self, method, query, params):
+        sql = statement_key(query)
+        started = time.perf_counter()
+        try:
+            method(query, params)
+        except Exception as e:
+            if self._dialect.is_retryable(e):
+                metrics.count_busy()
+            raise
+        finally:
+            _observe_statement(sql, time.perf_counter() - started)
+        self._sql = sql
+        return self
+    
+    def execute(self, query, params=()):
+        return self._timed(self._raw.execute, query, params)
+    
+    def executemany(self, query, seq_of_params):
+        return self._timed(self._raw.executemany, query, seq_of_params)
+    
+    def fetchone(self):
+        row = self._raw.fetchone()
+        if row is not None:
+            metrics.add_rows(self._sql, 1)
+        return row
+    
+    def fetchmany(self, size=None):
+        rows = self._raw.fetchmany(size) if size else self._raw.fetchmany()
+        metrics.add_rows(self._sql, len(rows))
+        return rows
+    
+    def fetchall(self):
+        rows = self._raw.fetchall()
+        metrics.add_rows(self._sql, len(rows))
+        return rows
+    
+    def __iter__(self):
+        count = 0
+        try:
+            for row in self._raw:
+                count += 1
+                yield row
+        finally:
+            metrics.add_rows(self._sql, count)
+            
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+class InstrumentedConnection:
+    """
+    Connection proxy handed out by get_db() and get_read_db().
+    
+    Statements run through InstrumentedCursor; COMMIT is timed as its own
+    statement. Everything else is delegated to the pooled connection, which
+    is what goes back to the pool.
+    """
+    
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+        self.dialect = dialect_of(wrapped)
+        
+    def cursor(self):
+        return InstrumentedCursor(self.wrapped.cursor(), self.dialect)
+    
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+    
+    def executemany(self, query, seq_of_params):
+        return self.cursor().executemany(query, seq_of_params)
+    
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self.wrapped.commit()
+        finally:
+            _observe_statement("COMMIT", time.perf_counter() - started)
+            
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.wrapped.rollback()
+        return False
+    
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+def instrument(conn):
+    """Wrap a pooled connection for metrics when METRICS_ENABLED."""
+    return InstrumentedConnection(conn) if METRICS_ENABLED else conn
+
+def unwrap(conn):
+    """Return the pooled connection behind instrument()."""
+    return conn.wrapped if isinstance(conn, InstrumentedConnection) else conn
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Add the request to the per-route latency histogram."""
+    started = g.pop("request_started", None)
+    if started is not None and METRICS_ENABLED:
+        metrics.observe_request(request.endpoint or "unmatched", request.method,
+                                response.status_code, time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def record_failed_request(exception):
+    """Requests that raised never reach after_request; count them as 500s."""
+    started = g.pop("request_started", None)
+    if started is not None and exception is not None and METRICS_ENABLED:
+        metrics.observe_request(request.endpoint or "unmatched", request.method,
+                                500, time.perf_counter() - started)
+
+def _prometheus_labels(**labels):
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+def render_metrics():
+    """
+    Render every counter in the Prometheus text exposition format.
+    
+    Besides the MetricsRegistry series this includes the connection pools,
+    posting engine, password hasher, unknown-username cache and read snapshot.
+    
+    Returns:
+        str: Exposition text
+    """
+    lines = []
+    
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_prometheus_labels(**labels) if labels else ''} {value}")
+            
+    def histogram_samples(histogram, **labels):
+        for le, count in histogram.cumulative():
+            yield "_bucket", dict(labels, le=le), count
+        yield "_sum", labels, f"{histogram.sum:.6f}"
+        yield "_count", labels, histogram.count
+        
+    snapshot = metrics.snapshot()
+    route_samples = [sample for (endpoint, method), histogram in sorted(snapshot["routes"].items())
+                     for sample in histogram_samples(histogram, endpoint=endpoint, method=method)]
+    family("bank_http_request_duration_seconds", "histogram", "Request latency by endpoint.", route_samples)
+    family("bank_http_responses_total", "counter", "Responses by endpoint and status.",
+           [("", {"endpoint": endpoint, "method": method, "status": status}, count)
+            for (endpoint, method, status), count in sorted(snapshot["responses"].items())])
+    
+    ordered = sorted(snapshot["statements"].items())
+    family("bank_sql_statement_calls_total", "counter", "Executions per SQL statement.",
+           [("", {"sql": sql}, stats["calls"]) for sql, stats in ordered])
+    family("bank_sql_statement_seconds_total", "counter", "Time spent executing each SQL statement.",
+           [("", {"sql": sql}, f"{stats['seconds']:.6f}") for sql, stats in ordered])
+    family("bank_sql_statement_max_seconds", "gauge", "Slowest single execution of each SQL statement.",
+           [("", {"sql": sql}, f"{stats['max']:.6f}") for sql, stats in ordered])
+    family("bank_sql_rows_returned_total", "counter", "Rows fetched per SQL statement.",
+           [("", {"sql": sql}, stats["rows"]) for sql, stats in ordered])
+    family("bank_sql_slow_queries_total", "counter", f"Statements slower than {SLOW_QUERY_MS:g} ms.",
+           [("", None, snapshot["slow_queries"])])
+    family("bank_db_lock_wait_seconds", "histogram", "Time spent in BEGIN waiting for the write lock.",
+           histogram_samples(snapshot["lock_wait"]))
+    family("bank_db_busy_errors_total", "counter", "Statements that failed with a busy/locked/deadlock error.",
+           [("", None, snapshot["busy_errors"])])
+    
+    pools = [("primary", _pool)]
+    if _read_pool is not None and _read_pool is not _pool:
+        pools.append(("read", _read_pool))
+    if _snapshot_pool is not None:
+        pools.append(("snapshot", _snapshot_pool))
+    pool_stats = [(label, pool.stats()) for label, pool in pools if pool is not None]
+    for key in ("hits", "misses", "waits", "timeouts"):
+        family(f"bank_db_pool_{key}_total", "counter", f"Connection pool {key}.",
+               [("", {"pool": label}, stats[key]) for label, stats in pool_stats])
+    family("bank_db_pool_connections", "gauge", "Pooled connections by state.",
+           [("", {"pool": label, "state": state}, stats[state])
+            for label, stats in pool_stats for state in ("open", "idle", "in_use")])
+    
+    with _posting_stats_lock:
+        postings = dict(posting_stats)
+    family("bank_postings_total", "counter", "Posting engine outcomes.",
+           [("", {"outcome": outcome}, count) for outcome, count in postings.items()])
+    if audit_trail is not None:
+        audit = audit_trail.stats()
+        family("bank_audit_log_records_total", "counter", "Records appended to the binary audit log.",
+               [("", None, audit["records"])])
+        family("bank_audit_log_rotations_total", "counter", "Audit log segments started by this process.",
+               [("", None, audit["rotations"])])
+    if posting_writer is not None:
+        writer = posting_writer.stats()
+        family("bank_group_commit_batches_total", "counter", "Batch transactions committed by the group-commit writer.",
+               [("", None, writer["batches"])])
+        family("bank_group_commit_postings_total", "counter", "Postings committed in group-commit batches.",
+               [("", None, writer["postings"])])
+        family("bank_group_commit_fallbacks_total", "counter", "Failed batches retried one posting at a time.",
+               [("", None, writer["fallbacks"])])
+    
+    hasher = password_hasher.stats()
+    family("bank_password_hash_jobs_total", "counter", "Hashing jobs by outcome.",
+           [("", {"outcome": "completed"}, hasher["completed"]), ("", {"outcome": "shed"}, hasher["shed"])])
+    family("bank_password_hash_pending", "gauge", "Hashing jobs queued or running.",
+           [("", None, hasher["pending"])])
+    
+    cache = unknown_usernames.stats()
+    family("bank_unknown_username_cache_total", "counter", "Unknown-username cache lookups.",
+           [("", {"result": "hit"}, cache["hits"]), ("", {"result": "miss"}, cache["misses"])])
+    family("bank_unknown_username_cache_size", "gauge", "Unknown usernames remembered.",
+           [("", None, cache["size"])])
+    
+    dashboard = dashboard_cache.stats()
+    family("bank_dashboard_cache_total", "counter", "Dashboard cache lookups.",
+           [("", {"result": "hit"}, dashboard["hits"]), ("", {"result": "miss"}, dashboard["misses"])])
+    family("bank_dashboard_cache_invalidations_total", "counter", "Dashboard entries dropped by postings.",
+           [("", None, dashboard["invalidations"])])
+    family("bank_dashboard_cache_stale_total", "counter",
+           "Cached dashboards reloaded because the user's generation changed.",
+           [("", None, dashboard["stale"])])
+    family("bank_dashboard_cache_size", "gauge", "Users with a cached dashboard.",
+           [("", None, dashboard["size"])])
+    family("bank_dashboard_cache_hit_ratio", "gauge", "Dashboard cache hits / lookups.",
+           [("", None, f"{dashboard['hit_ratio']:.4f}")])
+    
+    sessions = session_store.stats()
+    family("bank_session_lookups_total", "counter", "Session loads from the session store.",
+           [("", {"result": "hit"}, sessions["hits"]), ("", {"result": "miss"}, sessions["misses"])])
+    family("bank_session_writes_total", "counter", "Session store writes.",
+           [("", {"kind": "data"}, sessions["writes"]), ("", {"kind": "expiry"}, sessions["touches"])])
+    family("bank_sessions_purged_total", "counter", "Expired sessions deleted.",
+           [("", None, sessions["purged"])])
+    
+    if _read_snapshot is not None:
+        family("bank_read_snapshot_age_seconds", "gauge", "Age of the read snapshot.",
+               [("", None, f"{_read_snapshot.age():.3f}")])
+        family("bank_read_snapshot_refreshes_total", "counter", "Read snapshot copies made by this process.",
+               [("", None, _read_snapshot.refreshes)])
+        family("bank_read_snapshot_refresh_failures_total", "counter", "Read snapshot refreshes that failed.",
+               [("", None, _read_snapshot.failures)])
+    return "\n".join(lines) + "\n"
+
+def connect_db(database=None, readonly=False):
+    """
+    Open a new SQLite connection tuned for the application.
+    
+    When BANK_STORAGE_URL is set and no database path is given, a
+    connection to the configured server backend is returned instead.
+    
+    Args:
+        database: Path to the database file (defaults to DATABASE)
+        readonly: Open with mode=ro and query_only so the connection can
+                  never write or take the write lock (server backends get
+                  a read-only session)
+        
+    Returns:
+        sqlite3.Connection: Configured connection with row factory
     """
-    conn = sqlite3.connect(DATABASE)
+    if STORAGE_URL and database is None:
+        return storage.connect_factory(STORAGE_URL, busy_timeout=DB_BUSY_TIMEOUT, readonly=readonly)()
+    if readonly:
+        conn = sqlite3.connect(f"file:{os.path.abspath(database or DATABASE)}?mode=ro", uri=True,
+                               timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA query_only=ON")
+    else:
+        conn = sqlite3.connect(database or DATABASE, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
     conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
     return conn
 
-def init_db():
-    """Initialize the database with tables."""
-    if not os.path.exists('database'):
-        os.makedirs('database')
+def database_path():
+    """The SQLite file postings go to (DATABASE or the stand-in's file); None on server backends."""
+    return storage.sqlite_path(STORAGE_URL) if STORAGE_URL else DATABASE
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Get the process-wide connection pool, creating it on first use.
     
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
+    Returns:
+        ConnectionPool: Pool bound to BANK_STORAGE_URL or the current DATABASE path
+    """
+    global _pool
+    target = STORAGE_URL or DATABASE
+    if _pool is None or _pool.name != target:
+        with _pool_lock:
+            if _pool is None or _pool.name != target:
+                if _pool is not None:
+                    _pool.close_all()
+                if STORAGE_URL:
+                    connect = storage.connect_factory(STORAGE_URL, busy_timeout=DB_BUSY_TIMEOUT)
+                else:
+                    connect = lambda: connect_db(target)
+                _pool = ConnectionPool(connect, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, name=target)
+    return _pool
+
+def get_db():
+    """
+    Get the pooled database connection for the current app context.
+    
+    The connection is borrowed on first use and handed back to the pool by
+    release_db() when the app context is torn down, so routes must not close it.
+    It is wrapped by instrument() so its statements show up in /admin/metrics.
+    
+    Returns:
+        sqlite3.Connection: Database connection
+    """
+    if "db_conn" not in g:
+        g.db_conn = instrument(get_pool().acquire())
+    return g.db_conn
+
+class ReadSnapshot:
+    """
+    A copy of the primary database that heavy read routes query instead of it.
+    
+    A refresh copies the primary with the SQLite online backup API into
+    path + ".tmp" and renames it over path, so readers keep using the copy
+    they have open until the new one is complete; the copy is then switched
+    to rollback-journal mode so mode=ro readers need no -wal/-shm files.
+    Refreshes run on a background thread and no request waits for one.
+    Processes sharing the file (serve.py workers) take an flock on
+    path + ".lock", so one of them copies while the others keep reading and
+    pick the new file up from its mtime, which is set to when the copy began.
+    """
+    
+    def __init__(self, database, path):
+        self.database = database
+        self.path = path
+        self.refreshes = 0
+        self.failures = 0
+        self._attempted_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+        
+    def current(self):
+        """
+        Describe the copy on disk.
+        
+        Returns:
+            tuple: (identity, age in seconds), identity changing with every
+                   refresh; None before the first copy exists
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_ino}:{stat.st_mtime_ns}", max(0.0, time.time() - stat.st_mtime)
     
-    # Create tables
-    cursor.execute('''
+    def age(self):
+        """Seconds since the copy on disk was taken (infinite before the first refresh)."""
+        copy = self.current()
+        return float("inf") if copy is None else copy[1]
+    
+    def refresh_in_background(self, max_age):
+        """Start a refresh thread unless one is running or one was tried moments ago."""
+        with self._lock:
+            now = time.monotonic()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._attempted_at is not None and now - self._attempted_at < SNAPSHOT_RETRY_INTERVAL:
+                return
+            self._attempted_at = now
+            self._thread = threading.Thread(target=self._refresh_logged, args=(max_age,),
+                                            name="read-snapshot-refresh", daemon=True)
+            self._thread.start()
+            
+    def _refresh_logged(self, max_age):
+        try:
+            self.refresh(max_age)
+        except Exception:
+            self.failures += 1
+            app.logger.exception("Read snapshot refresh failed")
+            
+    def refresh(self, max_age=0):
+        """
+        Copy the primary into the snapshot file.
+        
+        Args:
+            max_age: Skip the copy if the one on disk is at most this old
+                     (another process refreshed it while we waited)
+            
+        Returns:
+            bool: True if this call made a new copy, False if another process
+                  holds the lock or the copy was fresh enough
+        """
+        lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        temp = self.path + ".tmp"
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            if self.age() <= max_age:
+                return False
+            for leftover in (temp, temp + "-journal"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            started = time.time()
+            source = connect_db(self.database, readonly=True)
+            target = sqlite3.connect(temp, timeout=DB_BUSY_TIMEOUT)
+            try:
+                # One step: a stepped backup restarts whenever the primary is written to,
+                # and in WAL mode the copy's read transaction never blocks writers anyway
+                source.backup(target)
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+                source.close()
+            # The copy holds everything committed before the backup started
+            os.utime(temp, (started, started))
+            os.replace(temp, self.path)
+            self.refreshes += 1
+            return True
+        finally:
+            os.close(lock_fd)
+
+_read_pool = None
+_read_snapshot = None
+_snapshot_pool = None
+
+def get_read_pool(max_staleness=None):
+    """
+    Get the pool get_read_db() borrows from for READ_ROUTING.
+    
+    In "snapshot" mode this is a pool on the current snapshot copy, replaced
+    whenever a refresh swaps in a new file. A background refresh starts once
+    the copy is older than half of max_staleness; while there is no copy yet,
+    or it is past max_staleness because a refresh is slow or failing, reads
+    go to the mode=ro pool on the primary instead of waiting.
+    
+    Args:
+        max_staleness: Seconds the caller tolerates (defaults to READ_MAX_STALENESS)
+        
+    Returns:
+        tuple: (ConnectionPool, data source name, staleness in seconds)
+    """
+    global _read_pool, _read_snapshot, _snapshot_pool
+    database = DATABASE
+    if _read_pool is None or _read_pool.name != database:
+        with _pool_lock:
+            if _read_pool is None or _read_pool.name != database:
+                if _read_pool is not None:
+                    _read_pool.close_all()
+                _read_pool = ConnectionPool(lambda: connect_db(database, readonly=True),
+                                            max_size=READ_POOL_SIZE, timeout=DB_POOL_TIMEOUT, name=database)
+    if READ_ROUTING != "snapshot":
+        return _read_pool, READ_ROUTING, 0.0
+    
+    path = database + "-snapshot"
+    if _read_snapshot is None or _read_snapshot.path != path:
+        with _pool_lock:
+            if _read_snapshot is None or _read_snapshot.path != path:
+                _read_snapshot = ReadSnapshot(database, path)
+    snapshot = _read_snapshot
+    bound = READ_MAX_STALENESS if max_staleness is None else max_staleness
+    copy = snapshot.current()
+    if copy is None or copy[1] > bound / 2:
+        snapshot.refresh_in_background(bound / 2)
+    if copy is None or copy[1] > bound:
+        return _read_pool, "readonly", 0.0
+    
+    identity, staleness = copy
+    name = f"{path}@{identity}"
+    if _snapshot_pool is None or _snapshot_pool.name != name:
+        with _pool_lock:
+            if _snapshot_pool is None or _snapshot_pool.name != name:
+                # Connections still borrowed from the old pool are closed when released
+                retired, _snapshot_pool = _snapshot_pool, ConnectionPool(
+                    lambda: connect_db(path, readonly=True),
+                    max_size=READ_POOL_SIZE, timeout=DB_POOL_TIMEOUT, name=name)
+                if retired is not None:
+                    retired.close_all()
+    return _snapshot_pool, "snapshot", staleness
+
+def get_read_db(max_staleness=None):
+    """
+    Get a read-only connection for routes that never write.
+    
+    Depending on READ_ROUTING this is the primary connection ("primary"),
+    a separate pool of mode=ro/query_only connections to the primary file
+    ("readonly"), or a pool on a backup copy refreshed in the background
+    ("snapshot", see get_read_pool()). Server backends (BANK_STORAGE_URL)
+    always read from the primary. The source and staleness of the data served are recorded for the X-Data-Source and X-Data-Staleness response headers.
+    
+    Args:
+        max_staleness: Seconds this request tolerates (defaults to READ_MAX_STALENESS)
+        
+    Returns:
+        sqlite3.Connection: Database connection that must only be read from
+    """
+    if READ_ROUTING == "primary" or STORAGE_URL:
+        g.read_source = "primary"
+        g.read_staleness = 0.0
+        return get_db()
+    if "read_conn" not in g:
+        pool, source, staleness = get_read_pool(max_staleness)
+        g.read_conn = instrument(pool.acquire())
+        g.read_pool = pool
+        g.read_source = source
+        g.read_staleness = staleness
+    return g.read_conn
+
+@app.after_request
+def add_staleness_header(response):
+    """Tell clients how old the data behind a read-routed response may be."""
+    if "read_staleness" in g:
+        response.headers["X-Data-Source"] = g.read_source
+        response.headers["X-Data-Staleness"] = f"{g.read_staleness:.3f}"
+    return response
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the app context's connections to their pools."""
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        get_pool().release(unwrap(conn))
+    read_conn = g.pop("read_conn", None)
+    if read_conn is not None:
+        pool = g.pop("read_pool")
+        pool.release(unwrap(read_conn))
+        if pool is not _read_pool and pool is not _snapshot_pool:
+            pool.close_all()  # A refresh retired this snapshot copy while the request ran
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is (version, description, step) where step is either a SQL script
+# or a callable taking the connection. Never edit a released migration; append
+# a new one instead.
+MIGRATIONS = [
+    (1, "Base schema", """
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY AUTOINCREMENT,
             username VARCHAR(50) UNIQUE NOT NULL,
@@ -136,57 +1331,2489 @@ def init_db():
             full_name VARCHAR(100),
             email VARCHAR(100),
             balance DECIMAL(10,2) DEFAULT 0.0
-        )
-    ''')
+        );
+        
+        CREATE TABLE IF NOT EXISTS employees (
+            emp_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100),
+            role VARCHAR(50)
+        );
+        
+        CREATE TABLE IF NOT EXISTS admins (
+            admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100)
+        );
+        
+        -- Note: accounts table reserved for future multi-account feature
+        CREATE TABLE IF NOT EXISTS accounts (
+            acc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            acc_type VARCHAR(50),
+            balance DECIMAL(10,2) DEFAULT 0.0,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        );
+        
+        CREATE TABLE IF NOT EXISTS transactions (
+            trans_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            emp_id INTEGER,
+            trans_type VARCHAR(50),
+            amount DECIMAL(10,2),
+            trans_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id),
+            FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+        );
+    """),
+    (2, "Index customer history by user and date", """
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+            ON transactions (user_id, trans_date DESC);
+    """),
+    (3, "Index teller activity by employee and date", """
+        CREATE INDEX IF NOT EXISTS idx_transactions_emp_date
+            ON transactions (emp_id, trans_date);
+    """),
+    (4, "Index system-wide history by date", """
+        CREATE INDEX IF NOT EXISTS idx_transactions_date
+            ON transactions (trans_date);
+    """),
+    (5, "Key customer history index on (trans_date, trans_id) for paging", """
+        DROP INDEX IF EXISTS idx_transactions_user_date;
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date_id
+            ON transactions (user_id, trans_date, trans_id);
+    """),
+    (6, "Daily summary rollup", """
+        CREATE TABLE IF NOT EXISTS daily_summary (
+            day DATE NOT NULL,
+            scope VARCHAR(10) NOT NULL,
+            scope_id INTEGER NOT NULL,
+            trans_type VARCHAR(50) NOT NULL,
+            trans_count INTEGER NOT NULL DEFAULT 0,
+            total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, scope_id, day, trans_type)
+        ) WITHOUT ROWID;
+        
+        INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_amount)
+            SELECT date(trans_date), 'all', 0, trans_type, COUNT(*), SUM(amount)
+            FROM transactions GROUP BY date(trans_date), trans_type;
+        INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_amount)
+            SELECT date(trans_date), 'employee', emp_id, trans_type, COUNT(*), SUM(amount)
+            FROM transactions WHERE emp_id IS NOT NULL GROUP BY date(trans_date), emp_id, trans_type;
+        INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_amount)
+            SELECT date(trans_date), 'customer', user_id, trans_type, COUNT(*), SUM(amount)
+            FROM transactions WHERE user_id IS NOT NULL GROUP BY date(trans_date), user_id, trans_type;
+    """),
+    (7, "Store money as INTEGER cents", """
+        ALTER TABLE users ADD COLUMN balance_cents INTEGER NOT NULL DEFAULT 0;
+        UPDATE users SET balance_cents = CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER);
+        ALTER TABLE users DROP COLUMN balance;
+        
+        ALTER TABLE accounts ADD COLUMN balance_cents INTEGER NOT NULL DEFAULT 0;
+        UPDATE accounts SET balance_cents = CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER);
+        ALTER TABLE accounts DROP COLUMN balance;
+        
+        ALTER TABLE daily_summary ADD COLUMN total_cents INTEGER NOT NULL DEFAULT 0;
+        UPDATE daily_summary SET total_cents = CAST(ROUND(total_amount * 100) AS INTEGER);
+        ALTER TABLE daily_summary DROP COLUMN total_amount;
+        
+        -- Rebuilt rather than altered to keep amount_cents in the old amount position
+        CREATE TABLE transactions_cents (
+            trans_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            emp_id INTEGER,
+            trans_type VARCHAR(50),
+            amount_cents INTEGER NOT NULL,
+            trans_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id),
+            FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+        );
+        INSERT INTO transactions_cents (trans_id, user_id, emp_id, trans_type, amount_cents, trans_date)
+            SELECT trans_id, user_id, emp_id, trans_type, CAST(ROUND(amount * 100) AS INTEGER), trans_date
+            FROM transactions;
+        DROP TABLE transactions;
+        ALTER TABLE transactions_cents RENAME TO transactions;
+        CREATE INDEX idx_transactions_user_date_id ON transactions (user_id, trans_date, trans_id);
+        CREATE INDEX idx_transactions_emp_date ON transactions (emp_id, trans_date);
+        CREATE INDEX idx_transactions_date ON transactions (trans_date);
+    """),
+    (8, "Multi-account double-entry ledger", """
+        CREATE UNIQUE INDEX idx_accounts_user_type ON accounts (user_id, acc_type);
+        
+        -- Counterparty for teller deposits and withdrawals. Its balance is
+        -- minus all customer money, so every balance in accounts sums to zero.
+        INSERT INTO accounts (user_id, acc_type, balance_cents) VALUES (NULL, 'cash', 0);
+        INSERT INTO accounts (user_id, acc_type, balance_cents)
+            SELECT user_id, 'checking', balance_cents FROM users ORDER BY user_id;
+        
+        CREATE TABLE journal_entries (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_type VARCHAR(50) NOT NULL,
+            emp_id INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+        );
+        
+        -- One row per leg; amount_cents is added to the account balance, so
+        -- the legs of every entry sum to zero.
+        CREATE TABLE ledger_legs (
+            leg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            acc_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            FOREIGN KEY(entry_id) REFERENCES journal_entries(entry_id),
+            FOREIGN KEY(acc_id) REFERENCES accounts(acc_id)
+        );
+        CREATE INDEX idx_ledger_legs_acc ON ledger_legs (acc_id, entry_id);
+        
+        -- Existing balances become a single opening entry against cash
+        INSERT INTO journal_entries (entry_type, emp_id, created_at)
+            SELECT 'Opening Balance', NULL, datetime('now')
+            WHERE EXISTS (SELECT 1 FROM accounts WHERE acc_type = 'checking' AND balance_cents <> 0);
+        INSERT INTO ledger_legs (entry_id, acc_id, amount_cents)
+            SELECT (SELECT MAX(entry_id) FROM journal_entries), acc_id, balance_cents
+            FROM accounts WHERE acc_type = 'checking' AND balance_cents <> 0;
+        UPDATE accounts SET balance_cents = -(SELECT COALESCE(SUM(balance_cents), 0) FROM accounts WHERE user_id IS NOT NULL)
+            WHERE user_id IS NULL AND acc_type = 'cash';
+        INSERT INTO ledger_legs (entry_id, acc_id, amount_cents)
+            SELECT (SELECT MAX(entry_id) FROM journal_entries), acc_id, balance_cents
+            FROM accounts WHERE user_id IS NULL AND acc_type = 'cash' AND balance_cents <> 0;
+        
+        ALTER TABLE transactions ADD COLUMN acc_id INTEGER REFERENCES accounts(acc_id);
+        ALTER TABLE transactions ADD COLUMN entry_id INTEGER REFERENCES journal_entries(entry_id);
+        UPDATE transactions SET acc_id = (
+            SELECT a.acc_id FROM accounts a WHERE a.user_id = transactions.user_id AND a.acc_type = 'checking'
+        );
+        
+        -- Every new customer (from any code path) gets a checking account
+        -- funded by an opening entry against cash.
+        CREATE TRIGGER trg_users_open_checking AFTER INSERT ON users
+        BEGIN
+            INSERT INTO accounts (user_id, acc_type, balance_cents)
+                VALUES (NEW.user_id, 'checking', NEW.balance_cents);
+            INSERT INTO journal_entries (entry_type, emp_id, created_at)
+                SELECT 'Opening Balance', NULL, datetime('now') WHERE NEW.balance_cents <> 0;
+            INSERT INTO ledger_legs (entry_id, acc_id, amount_cents)
+                SELECT (SELECT MAX(entry_id) FROM journal_entries), acc_id,
+                       CASE WHEN user_id IS NULL THEN -NEW.balance_cents ELSE NEW.balance_cents END
+                FROM accounts
+                WHERE NEW.balance_cents <> 0
+                  AND ((user_id = NEW.user_id AND acc_type = 'checking') OR (user_id IS NULL AND acc_type = 'cash'));
+            UPDATE accounts SET balance_cents = balance_cents - NEW.balance_cents
+                WHERE user_id IS NULL AND acc_type = 'cash' AND NEW.balance_cents <> 0;
+        END;
+    """),
+    (9, "Reconciliation checkpoints", """
+        -- Baseline: whatever is not explained by a customer's history is
+        -- treated as their opening balance at the time of this migration.
+        ALTER TABLE users ADD COLUMN opening_balance_cents INTEGER NOT NULL DEFAULT 0;
+        UPDATE users SET opening_balance_cents = balance_cents - COALESCE((
+            SELECT SUM(CASE WHEN t.trans_type IN ('Deposit', 'Transfer In') THEN t.amount_cents
+                            ELSE -t.amount_cents END)
+            FROM transactions t WHERE t.user_id = users.user_id
+        ), 0);
+        CREATE TRIGGER trg_users_opening_balance AFTER INSERT ON users
+        BEGIN
+            UPDATE users SET opening_balance_cents = NEW.balance_cents WHERE user_id = NEW.user_id;
+        END;
+        
+        CREATE TABLE reconciliation_checkpoints (
+            user_id INTEGER PRIMARY KEY,
+            last_trans_id INTEGER NOT NULL,
+            net_cents INTEGER NOT NULL,
+            checked_at TIMESTAMP NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        );
+        
+        CREATE TABLE reconciliation_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP NOT NULL,
+            from_trans_id INTEGER NOT NULL,
+            to_trans_id INTEGER NOT NULL,
+            rows_checked INTEGER NOT NULL,
+            users_checked INTEGER NOT NULL,
+            drifted INTEGER NOT NULL,
+            elapsed_ms REAL NOT NULL
+        );
+    """),
+    (10, "Customer search index", """
+        -- Usernames and emails are matched by prefix on these indexes...
+        CREATE INDEX idx_users_username_lower ON users (lower(username));
+        CREATE INDEX idx_users_email_lower ON users (lower(email));
+        
+        -- ...and names by word on an FTS5 index. Trailing digits are cut from
+        -- the email's local part so "smith1234" indexes as "smith": one term
+        -- per customer would make every prefix query expand into thousands.
+        CREATE VIEW customer_search_source AS
+            SELECT user_id, full_name,
+                   rtrim(substr(email, 1, instr(email, '@') - 1), '0123456789') AS email_words
+            FROM users;
+        CREATE VIRTUAL TABLE customer_search USING fts5(
+            full_name, email_words,
+            content='customer_search_source', content_rowid='user_id', prefix='2 3 4'
+        );
+        INSERT INTO customer_search(customer_search) VALUES ('rebuild');
+        
+        CREATE TRIGGER trg_users_search_insert AFTER INSERT ON users
+        BEGIN
+            INSERT INTO customer_search (rowid, full_name, email_words)
+                SELECT user_id, full_name, email_words FROM customer_search_source WHERE user_id = NEW.user_id;
+        END;
+        CREATE TRIGGER trg_users_search_delete AFTER DELETE ON users
+        BEGIN
+            INSERT INTO customer_search (customer_search, rowid, full_name, email_words)
+                VALUES ('delete', OLD.user_id, OLD.full_name,
+                        rtrim(substr(OLD.email, 1, instr(OLD.email, '@') - 1), '0123456789'));
+        END;
+        -- Only the indexed columns: balance updates must not touch the index
+        CREATE TRIGGER trg_users_search_update AFTER UPDATE OF full_name, email ON users
+        BEGIN
+            INSERT INTO customer_search (customer_search, rowid, full_name, email_words)
+                VALUES ('delete', OLD.user_id, OLD.full_name,
+                        rtrim(substr(OLD.email, 1, instr(OLD.email, '@') - 1), '0123456789'));
+            INSERT INTO customer_search (rowid, full_name, email_words)
+                SELECT user_id, full_name, email_words FROM customer_search_source WHERE user_id = NEW.user_id;
+        END;
+    """),
+    (11, "Idempotency keys for postings", """
+        -- key_id is "<role>:<account id>:<client key>", so clients cannot collide
+        CREATE TABLE idempotency_keys (
+            key_id TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_idempotency_keys_expires ON idempotency_keys (expires);
+    """),
+    (12, "Cash account shards", """
+        -- Every teller deposit/withdrawal updates a cash account row; spreading
+        -- tellers over eight of them keeps server backends from serializing all
+        -- teller postings on one row lock. Opening balances stay on 'cash'.
+        INSERT INTO accounts (user_id, acc_type, balance_cents) VALUES
+            (NULL, 'cash-1', 0), (NULL, 'cash-2', 0), (NULL, 'cash-3', 0), (NULL, 'cash-4', 0),
+            (NULL, 'cash-5', 0), (NULL, 'cash-6', 0), (NULL, 'cash-7', 0);
+    """),
+    (13, "Dashboard cache generations", """
+        -- Bumped in the same transaction as every posting leg and new account
+        -- of the user; cached dashboards compare it on each hit, so a posting
+        -- made by any process invalidates them.
+        ALTER TABLE users ADD COLUMN dashboard_generation INTEGER NOT NULL DEFAULT 0;
+    """),
+    (14, "Daily summary shards by day", """
+        -- The 'all' rows of a day now sit in several shards (scope_id = entry_id
+        -- % SUMMARY_SHARDS); the day report walks this index to sum them in day order.
+        CREATE INDEX idx_daily_summary_scope_day ON daily_summary (scope, day);
+    """),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_cash_accounts = ()
+
+def load_cash_accounts(cursor):
+    """
+    Read the acc_ids of the cash account shards and cache them for this process.
+    
+    init_db() calls this after migrating, so forked workers inherit the ids;
+    they never change once the shards exist.
+    
+    Returns:
+        tuple: acc_ids, the 'cash' account first
+    """
+    global _cash_accounts
+    cursor.execute(
+        "SELECT acc_id FROM accounts WHERE user_id IS NULL AND (acc_type = ? OR acc_type LIKE ?) ORDER BY acc_type",
+        (CASH_ACCOUNT_TYPE, CASH_ACCOUNT_TYPE + "-%")
+    )
+    _cash_accounts = tuple(row[0] for row in cursor.fetchall())
+    return _cash_accounts
+
+def get_schema_version(conn):
+    """Return the schema version stored in PRAGMA user_version."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _script_statements(script):
+    """Split a migration script into complete statements (trigger bodies stay whole)."""
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+def migrate(conn):
+    """
+    Apply pending schema migrations.
+    
+    Every migration runs in its own transaction together with the
+    user_version bump, so a failed step leaves the database at the last
+    good version. The version is re-read once the write lock is held, so
+    processes starting at the same time never apply a step twice.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        list: Versions that were applied (empty when already up to date)
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if get_schema_version(conn) >= version:
+                conn.rollback()  # Applied by another process while we waited for the lock
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in _script_statements(step):
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            raise RuntimeError(f"Migration {version} ({description}) failed: {e}") from e
+        applied.append(version)
+    return applied
+
+def init_db():
+    """
+    Initialize the database and bring its schema up to date.
+    
+    Server backends manage their schema with the DDL in database/; only
+    SQLite files (including the stand-in backend's) are migrated here.
+    """
+    path = database_path()
+    if path is None:
+        return
+    db_dir = os.path.dirname(path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    
+    conn = connect_db(path)
+    try:
+        applied = migrate(conn)
+        if applied:
+            print(f"Database migrated to schema version {applied[-1]}")
+        load_cash_accounts(conn.cursor())
+    finally:
+        conn.close()
+
+# Initialize database on startup
+if INIT_DB_ON_IMPORT:
+    init_db()
+
+# ---------------------------
+# Process lifecycle (serve.py)
+# ---------------------------
+def close_pools():
+    """Close every pooled connection, so a forked child never inherits an open SQLite handle."""
+    global _pool, _read_pool, _read_snapshot, _snapshot_pool
+    with _pool_lock:
+        pools = [pool for pool in (_pool, _read_pool, _snapshot_pool) if pool is not None]
+        _pool = _read_pool = _read_snapshot = _snapshot_pool = None
+    for pool in pools:
+        pool.close_all()
+
+def warm_up(connections=0):
+    """
+    Do the work a first request would otherwise pay for.
+    
+    Compiles every template into the Jinja cache and reads the hot tables
+    and indexes once so their pages sit in the OS page cache. Run in the
+    serve.py master before forking, both are shared by every worker. With
+    connections > 0 (in each worker) that many pooled connections are also
+    opened, and one read-only connection when reads are routed.
+    
+    Args:
+        connections: Primary pool connections to open in this process
+        
+    Returns:
+        int: Templates compiled
+    """
+    templates = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in templates:
+        app.jinja_env.get_template(name)
+    
+    pool = get_pool()
+    conns = [pool.acquire() for _ in range(max(1, min(connections, pool.max_size)))]
+    try:
+        cursor = conns[0].cursor()
+        for sql in ("SELECT COUNT(*) FROM users", "SELECT COUNT(*) FROM accounts",
+                    "SELECT COUNT(*) FROM transactions", "SELECT MAX(trans_date) FROM transactions"):
+            cursor.execute(sql)
+            cursor.fetchall()
+    finally:
+        for conn in conns:
+            pool.release(conn)
+    if connections and READ_ROUTING != "primary" and not STORAGE_URL:
+        read_pool, _, _ = get_read_pool()
+        read_pool.release(read_pool.acquire())
+    if not connections:
+        close_pools()
+    return len(templates)
+
+def reset_after_fork():
+    """
+    Drop per-process state a forked worker must not share with its parent.
+    
+    Pools and the hashing executor start fresh on first use, metrics count
+    this worker only, and the dashboard cache starts empty (each worker
+    keeps its own; sibling postings are caught by the generation check in
+    DashboardCache).
+    """
+    global _pool, _read_pool, _read_snapshot, _snapshot_pool
+    _pool = _read_pool = _read_snapshot = _snapshot_pool = None
+    password_hasher.shutdown()
+    metrics.reset()
+    dashboard_cache.clear()
+
+# ---------------------------
+# Server-side sessions
+# ---------------------------
+def load_secret_key(path=SECRET_KEY_FILE):
+    """
+    Return the key that signs session cookies, identical in every worker process.
+    
+    BANK_SECRET_KEY wins when set. Otherwise the key is read from path; the
+    first process to start creates the file (mode 0600) by hard-linking a
+    fully written temporary file into place, so processes starting at the
+    same time all end up with the winner's key.
+    
+    Args:
+        path: Key file
+        
+    Returns:
+        str: Secret key
+    """
+    key = os.environ.get("BANK_SECRET_KEY")
+    if key:
+        return key
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass  # Another process got there first; use its key
+        finally:
+            os.remove(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+app.secret_key = load_secret_key()
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data loaded from SessionStore; the cookie only carries the signed sid."""
+    
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+        self.replaced_sid = None
+        
+    def rotate(self):
+        """Move the data to a fresh sid (call on login so a planted session id is useless)."""
+        if not self.new:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class SessionStore(SessionInterface):
+    """
+    Flask sessions stored in a SQLite file instead of the cookie.
+    
+    The cookie holds a random session id signed with the shared secret key;
+    the data lives in SESSION_DATABASE, so every worker process sees the same
+    sessions. Rows also record the role and id from the identity snapshot,
+    so an account's sessions can be ended with revoke(). Unchanged sessions
+    are only written back (to push their expiry out) once SESSION_TOUCH_AFTER
+    of their lifetime has passed, and a background thread per process deletes
+    expired rows in batches.
+    
+    Args:
+        path: SQLite file for the sessions table
+        sweep_interval: Seconds between purges (0 disables the thread)
+        sweep_batch: Rows deleted per purge statement
+    """
+    serializer = TaggedJSONSerializer()
+    salt = "bank-session"
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            role TEXT,
+            subject_id INTEGER,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires);
+        CREATE INDEX IF NOT EXISTS idx_sessions_subject ON sessions (role, subject_id);
+    """
+    
+    def __init__(self, path=SESSION_DATABASE, sweep_interval=SESSION_SWEEP_INTERVAL, sweep_batch=SESSION_SWEEP_BATCH):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "touches": 0, "purged": 0}
+        
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+            
+    def _conn(self):
+        """This thread's connection, reopened after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+    
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation="hmac")
+    
+    def open_session(self, app, request):
+        self._start_sweeper()
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            try:
+                sid = self._signer(app).unsign(token).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                row = self._conn().execute(
+                    "SELECT data, expires FROM sessions WHERE sid=? AND expires > ?", (sid, time.time())
+                ).fetchone()
+                if row:
+                    self._count("hits")
+                    return ServerSession(self.serializer.loads(row[0]), sid=sid, expires=row[1])
+            self._count("misses")
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+    
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        conn = self._conn()
+        if session.replaced_sid:
+            conn.execute("DELETE FROM sessions WHERE sid=?", (session.replaced_sid,))
+        
+        if not session:
+            if session.modified:
+                if not session.new:
+                    conn.execute("DELETE FROM sessions WHERE sid=?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app))
+            return
+        
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        expires = now + lifetime
+        if not session.modified and not session.new:
+            if session.expires - now > lifetime * (1 - SESSION_TOUCH_AFTER):
+                return
+            conn.execute("UPDATE sessions SET expires=? WHERE sid=?", (expires, session.sid))
+            self._count("touches")
+        else:
+            identity = session.get("identity") or {}
+            conn.execute(
+                "INSERT INTO sessions (sid, role, subject_id, data, expires) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET role=excluded.role, subject_id=excluded.subject_id, "
+                "data=excluded.data, expires=excluded.expires",
+                (session.sid, identity.get("role"), identity.get("id"), self.serializer.dumps(dict(session)), expires)
+            )
+            self._count("writes")
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+        )
+    
+    def revoke(self, role, subject_id):
+        """End every session of one account (e.g. after its role changed); returns how many."""
+        return self._conn().execute("DELETE FROM sessions WHERE role=? AND subject_id=?",
+                                    (role, int(subject_id))).rowcount
+    
+    def purge_expired(self):
+        """
+        Delete expired sessions, sweep_batch rows per statement.
+        
+        Returns:
+            int: Sessions removed
+        """
+        conn = self._conn()
+        now = time.time()
+        removed = 0
+        while True:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE sid IN (SELECT sid FROM sessions WHERE expires <= ? LIMIT ?)",
+                (now, self.sweep_batch)
+            ).rowcount
+            removed += deleted
+            if deleted < self.sweep_batch:
+                break
+        self._count("purged", removed)
+        return removed
+    
+    def _start_sweeper(self):
+        """Start the purge thread once per process (again in a forked child)."""
+        if self.sweep_interval <= 0 or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep, name="session-sweeper", daemon=True).start()
+        
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                print(f"Session purge error: {str(e)}")
+                
+    def stats(self):
+        """
+        Snapshot of store counters.
+        
+        Returns:
+            dict: hits, misses, writes, touches and purged
+        """
+        with self._lock:
+            return dict(self._stats)
+
+session_store = SessionStore()
+app.session_interface = session_store
+
+def start_session(role, account, username):
+    """
+    Log an account in on the current session.
+    
+    The session gets a fresh id and an identity snapshot (role, id, username,
+    full name) that pages render from instead of re-reading the account row.
+    
+    Args:
+        role: Key of LOGIN_ROLES
+        account: (id, password hash, full_name) from lookup_credentials()
+        username: Login name
+    """
+    session_key = LOGIN_ROLES[role][2]
+    session.clear()
+    session.rotate()
+    session[session_key] = account[0]
+    session["identity"] = {"role": role, "id": account[0], "username": username, "full_name": account[2]}
+    session.permanent = True
+
+@app.cli.command("purge-sessions")
+def purge_sessions_command():
+    """Delete expired sessions now (the app also does this in the background)."""
+    print(f"Purged {session_store.purge_expired()} expired session(s)")
+
+# ---------------------------
+# Dashboard cache
+# ---------------------------
+class DashboardCache:
+    """
+    Per-user LRU cache of what the customer dashboard shows.
+    
+    Entries are loaded on a miss and dropped write-through by the posting
+    engine right after a posting that touches the user commits. To keep a
+    load that raced a posting from re-inserting pre-commit data, every
+    invalidation bumps a counter and an entry is only stored if its user was
+    not invalidated after the load started.
+    
+    Postings committed by other processes (serve.py workers) are caught by
+    the user's generation (users.dashboard_generation, bumped inside every
+    posting transaction): an entry remembers the generation read before it
+    was loaded, and a hit is only served while the database still reports
+    it. That check is one primary-key read instead of the three queries of
+    a load. Entries also expire after ttl seconds, for changes made outside
+    the posting engine.
+    """
+    
+    def __init__(self, max_size=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._invalidated = OrderedDict()
+        self._floor = 0
+        self._version = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+        
+    def get(self, user_id, load, generation=None):
+        """
+        Return the cached dashboard for user_id, calling load() on a miss.
+        
+        Args:
+            user_id: Customer user_id
+            load: Zero-argument callable reading the dashboard from the database
+            generation: Zero-argument callable returning the user's current
+                        dashboard generation (None skips the check)
+            
+        Returns:
+            Whatever load() returns
+        """
+        if self.max_size <= 0:
+            return load()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                entry = None
+                self.misses += 1
+            started = self._version
+        current = generation() if generation is not None else None
+        if entry is not None:
+            with self._lock:
+                if entry[2] == current:
+                    if user_id in self._entries:
+                        self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+                self.stale += 1
+        value = load()
+        with self._lock:
+            if self._invalidated.get(user_id, self._floor) <= started:
+                self._entries[user_id] = (now + self.ttl, value, current)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+    
+    def invalidate(self, *user_ids):
+        """Drop the entries of users whose data just changed (call after commit)."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._version += 1
+            for user_id in user_ids:
+                if user_id is None:
+                    continue
+                self._entries.pop(user_id, None)
+                self._invalidated[user_id] = self._version
+                self._invalidated.move_to_end(user_id)
+                self.invalidations += 1
+            # Forgotten stamps are covered by the floor: loads older than it are never stored
+            while len(self._invalidated) > self.max_size:
+                _, version = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, version)
+                
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            
+    def stats(self):
+        """
+        Snapshot of cache counters.
+        
+        Returns:
+            dict: hits, misses, stale (misses on an entry whose generation
+                  changed), invalidations, size and hit_ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale,
+                    "invalidations": self.invalidations,
+                    "size": len(self._entries), "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+dashboard_cache = DashboardCache()
+
+# ---------------------------
+# Posting engine
+# ---------------------------
+class InsufficientFundsError(ValueError):
+    """Raised when a debit would take an account below zero."""
+    
+    def __init__(self, balance):
+        self.balance = balance
+        super().__init__(f"Insufficient balance! Balance: ${balance:.2f}")
+
+class AccountNotFoundError(ValueError):
+    """Raised when a posting references an account that does not exist."""
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when an idempotency key comes back with a different posting."""
+
+posting_stats = {"commits": 0, "retries": 0, "rejected": 0, "replayed": 0}
+_posting_stats_lock = threading.Lock()
+
+def _count_posting(key):
+    with _posting_stats_lock:
+        posting_stats[key] += 1
+
+audit_trail = audit_log.AuditLog(AUDIT_LOG_DIR, AUDIT_LOG_SEGMENT_BYTES) if AUDIT_LOG_ENABLED else None
+
+def append_audit(rows):
+    """
+    Append committed transactions rows to the binary audit log.
+    
+    Runs after the commit, so a failure cannot undo the posting: it is
+    reported, and `scripts/audit_log_tool.py sync` fills the gap later.
+    
+    Args:
+        rows: Audit rows collected by _record_transaction()
+    """
+    if audit_trail is None or not rows:
+        return
+    try:
+        audit_trail.append(rows)
+    except Exception as e:
+        print(f"Audit log error: {str(e)}")
+
+def run_posting(conn, work):
+    """
+    Run a posting inside a write transaction.
+    
+    On SQLite the write lock is taken up front (BEGIN IMMEDIATE) so two
+    postings never interleave their reads and writes; server backends lock
+    the touched rows instead. If the database is busy, or the server reports
+    a deadlock or serialization failure, the transaction is rolled back and
+    retried with jittered exponential backoff, up to POSTING_MAX_RETRIES.
+    
+    Args:
+        conn: Database connection
+        work: Callable receiving a cursor; its return value is returned
+        
+    Returns:
+        Whatever work(cursor) returned, after a successful commit
+        
+    Raises:
+        ValueError: Business rule violations raised by work (nothing is written)
+        sqlite3.OperationalError: If the database stays busy after all retries
+    """
+    dialect = dialect_of(conn)
+    for attempt in range(POSTING_MAX_RETRIES + 1):
+        try:
+            if dialect.begin:
+                conn.execute(dialect.begin)
+            result = work(conn.cursor())
+            conn.commit()
+            _count_posting("commits")
+            return result
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if isinstance(e, ValueError):
+                _count_posting("rejected")
+                raise
+            if not dialect.is_retryable(e) or attempt == POSTING_MAX_RETRIES:
+                raise
+            _count_posting("retries")
+            delay = min(POSTING_RETRY_MAX_DELAY, POSTING_RETRY_BASE_DELAY * (2 ** attempt))
+            time.sleep(random.uniform(delay / 2, delay))
+
+class GroupCommitWriter:
+    """
+    Single writer thread that commits queued postings in batches.
+    
+    Callers hand their posting work to submit() and block until it is
+    acknowledged. The thread takes the first queued posting, waits up to
+    window_ms for more (or until max_items), and runs them all in one
+    run_posting() transaction with a savepoint per posting, so a rejected
+    posting (insufficient funds, missing account) is rolled back alone and
+    the rest still commit. Its SQLite connection uses synchronous=FULL, so a
+    posting is only acknowledged once its batch is on disk, and that fsync
+    is paid once per batch instead of once per posting. If a batch fails for
+    another reason, its postings are retried one transaction each so one bad
+    posting cannot fail its neighbours.
+    
+    The thread and its connection are per process, started on first use
+    (again in a forked child).
+    
+    Args:
+        window_ms: Milliseconds to wait for more postings after the first
+        max_items: Postings per batch transaction
+        connect: Callable returning a new connection (defaults to connect_db)
+    """
+    
+    def __init__(self, window_ms=GROUP_COMMIT_WINDOW_MS, max_items=GROUP_COMMIT_MAX_ITEMS, connect=None):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self.connect = connect or connect_db
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "postings": 0, "fallbacks": 0}
+        
+    def submit(self, work):
+        """
+        Run work(cursor) in the next batch and wait for the batch to commit.
+        
+        Returns:
+            Whatever work(cursor) returned
+            
+        Raises:
+            ValueError: Business rule violations raised by work (nothing is written)
+        """
+        future = Future()
+        self._start().put((work, future))
+        return future.result()
+    
+    def _start(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.SimpleQueue()
+                    threading.Thread(target=self._run, args=(self._queue,), name="group-commit", daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+    
+    def _open(self):
+        conn = instrument(self.connect())
+        if isinstance(unwrap(conn), sqlite3.Connection):
+            conn.execute("PRAGMA synchronous=FULL")
+        return conn
+    
+    def _run(self, pending):
+        conn = None
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_items:
+                try:
+                    batch.append(pending.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._open()
+                self._commit(conn, batch)
+            except Exception as e:
+                print(f"Group commit error: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                    
+    def _commit(self, conn, batch):
+        """Commit one batch and resolve every future in it."""
+        def work(cursor):
+            outcome = []
+            for item_work, future in batch:
+                # A rejected posting must not leave any of its legs behind in the batch
+                cursor.execute("SAVEPOINT posting")
+                try:
+                    outcome.append((future, item_work(cursor), None))
+                except ValueError as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT posting")
+                    outcome.append((future, None, e))
+                cursor.execute("RELEASE SAVEPOINT posting")
+            return outcome
+        try:
+            outcome = run_posting(conn, work)
+        except Exception:
+            if len(batch) == 1:
+                raise
+            self._count("fallbacks")
+            for item_work, future in batch:
+                try:
+                    future.set_result(run_posting(conn, item_work))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        self._count("batches")
+        self._count("postings", len(batch))
+        for future, result, error in outcome:
+            if error is not None:
+                _count_posting("rejected")
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+                
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+            
+    def stats(self):
+        """
+        Snapshot of writer counters.
+        
+        Returns:
+            dict: batches, postings (committed in batches) and fallbacks
+                  (batches retried one posting at a time)
+        """
+        with self._lock:
+            return dict(self._stats)
+
+posting_writer = GroupCommitWriter() if GROUP_COMMIT else None
+
+def commit_posting(conn, work):
+    """
+    Run a posting on conn, or through posting_writer when group commit is on.
+    
+    Returns and raises like run_posting().
+    """
+    if posting_writer is None:
+        return run_posting(conn, work)
+    return posting_writer.submit(work)
+
+def commit_idempotent(conn, work, idempotency):
+    """
+    commit_posting() for work that records an idempotency key.
+    
+    On a server backend a concurrent request with the same key blocks on
+    the key's row and then fails its INSERT; running the work again replays
+    the result the other request committed.
+    """
+    try:
+        return commit_posting(conn, work)
+    except sqlite3.IntegrityError:
+        if idempotency is None:
+            raise
+        return commit_posting(conn, work)
+
+def _replay_posting(cursor, idempotency, fingerprint):
+    """
+    Look up an idempotency key inside the posting transaction.
+    
+    The lookup is by primary key, and it runs under the posting's write
+    lock, so a duplicate submitted at the same moment waits for the first
+    one to commit and then finds its result. An expired key is deleted and
+    the posting runs again.
+    
+    Args:
+        cursor: Cursor inside the posting transaction
+        idempotency: Key id from request_idempotency_key(), or None
+        fingerprint: What the posting does (accounts, amount, employee)
+        
+    Returns:
+        The stored result of the original posting, or None if it must run
+        
+    Raises:
+        IdempotencyKeyReusedError: If the key was used for a different posting
+    """
+    if idempotency is None:
+        return None
+    cursor.execute("SELECT fingerprint, result, expires FROM idempotency_keys WHERE key_id=?", (idempotency,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if row[2] <= time.time():
+        cursor.execute("DELETE FROM idempotency_keys WHERE key_id=?", (idempotency,))
+        return None
+    if row[0] != fingerprint:
+        raise IdempotencyKeyReusedError("This request was already submitted with different details.")
+    _count_posting("replayed")
+    return json.loads(row[1])
+
+def _remember_posting(cursor, idempotency, fingerprint, result):
+    """Store a posting's result under its idempotency key, in the same transaction."""
+    if idempotency is None:
+        return
+    now = time.time()
+    cursor.execute(
+        "INSERT INTO idempotency_keys (key_id, fingerprint, result, created_at, expires) VALUES (?,?,?,?,?)",
+        (idempotency, fingerprint, json.dumps(result), get_egypt_time(), now + IDEMPOTENCY_KEY_TTL)
+    )
+
+def purge_idempotency_keys(conn=None, batch=IDEMPOTENCY_PURGE_BATCH, pause=0.0):
+    """
+    Delete expired idempotency keys.
+    
+    Each batch is its own short transaction found through the expires index,
+    and the pause between batches lets postings take the write lock.
+    
+    Args:
+        conn: Database connection (a new one is opened and closed if None)
+        batch: Keys deleted per transaction
+        pause: Seconds to sleep between batches
+        
+    Returns:
+        int: Keys removed
+    """
+    own = conn is None
+    conn = conn or connect_db()
+    removed = 0
+    try:
+        while True:
+            keys = [row[0] for row in conn.execute(
+                "SELECT key_id FROM idempotency_keys WHERE expires <= ? ORDER BY expires LIMIT ?", (time.time(), batch)
+            ).fetchall()]
+            if keys:
+                conn.execute(f"DELETE FROM idempotency_keys WHERE key_id IN ({', '.join('?' for _ in keys)})", keys)
+            conn.commit()
+            removed += len(keys)
+            if len(keys) < batch:
+                return removed
+            time.sleep(pause)
+    finally:
+        if own:
+            conn.close()
+
+_idempotency_purger_pid = None
+_idempotency_purger_lock = threading.Lock()
+
+def _start_idempotency_purger():
+    """Start the purge thread once per process (again in a forked child)."""
+    global _idempotency_purger_pid
+    if IDEMPOTENCY_PURGE_INTERVAL <= 0 or _idempotency_purger_pid == os.getpid():
+        return
+    with _idempotency_purger_lock:
+        if _idempotency_purger_pid == os.getpid():
+            return
+        _idempotency_purger_pid = os.getpid()
+    threading.Thread(target=_purge_idempotency_keys_forever, name="idempotency-purger", daemon=True).start()
+
+def _purge_idempotency_keys_forever():
+    while True:
+        time.sleep(IDEMPOTENCY_PURGE_INTERVAL)
+        try:
+            purge_idempotency_keys(pause=0.01)
+        except Exception as e:
+            print(f"Idempotency key purge error: {str(e)}")
+
+def _apply_leg(cursor, acc_id, cents, allow_overdraft=False):
+    """
+    Add cents to one account and to its owner's total balance.
+    
+    Negative legs only apply if the account stays non-negative, unless
+    allow_overdraft is set (the cash account).
+    
+    Returns:
+        int: user_id owning the account (None for the cash account)
+    """
+    if cents < 0 and not allow_overdraft:
+        sql = "UPDATE accounts SET balance_cents = balance_cents + ? WHERE acc_id=? AND balance_cents + ? >= 0"
+        params = (cents, acc_id, cents)
+    else:
+        sql = "UPDATE accounts SET balance_cents = balance_cents + ? WHERE acc_id=?"
+        params = (cents, acc_id)
+    if dialect_of(cursor.connection).returning:
+        cursor.execute(f"{sql} RETURNING user_id", params)
+        row = cursor.fetchone()
+    else:
+        cursor.execute(sql, params)
+        row = None
+        if cursor.rowcount:
+            cursor.execute("SELECT user_id FROM accounts WHERE acc_id=?", (acc_id,))
+            row = cursor.fetchone()
+    if row is None:
+        cursor.execute("SELECT balance_cents FROM accounts WHERE acc_id=?", (acc_id,))
+        account = cursor.fetchone()
+        if account is None:
+            raise AccountNotFoundError("Account not found!")
+        raise InsufficientFundsError(Money(account[0]))
+    user_id = row[0]
+    if user_id is not None:
+        cursor.execute(
+            "UPDATE users SET balance_cents = balance_cents + ?, dashboard_generation = dashboard_generation + 1 "
+            "WHERE user_id=?", (cents, user_id)
+        )
+    return user_id
+
+def _cash_account(cursor, emp_id=None):
+    """
+    Return the acc_id of the cash account shard a teller posts against.
+    
+    Each teller (emp_id modulo the number of shards) has a shard of their
+    own, so concurrent teller postings on a server backend do not all wait
+    for one row lock. Read from the per-process cache, no query.
+    
+    Raises:
+        AccountNotFoundError: If the database has no cash account
+    """
+    accounts = _cash_accounts or load_cash_accounts(cursor)
+    if not accounts:
+        raise AccountNotFoundError("Cash account not found!")
+    return accounts[(emp_id or 0) % len(accounts)]
+
+def _post_entry(cursor, entry_type, emp_id, legs, created_at):
+    """
+    Write one balanced journal entry and apply its legs.
+    
+    Each leg touches one account row and one users row by primary key, so
+    the cost of a posting does not grow with the size of the journal. Legs
+    are applied in acc_id order so concurrent entries on a server backend
+    lock rows in the same order and cannot deadlock each other.
+    
+    Args:
+        cursor: Cursor inside the posting transaction
+        entry_type: Kind of entry ("Transfer", "Deposit", "Withdraw")
+        emp_id: Employee responsible, or None
+        legs: List of (acc_id, cents, allow_overdraft); cents must sum to zero
+        created_at: Entry timestamp
+        
+    Returns:
+        tuple: (entry_id, list of owning user_ids in leg order)
+    """
+    if sum(cents for _, cents, _ in legs) != 0:
+        raise RuntimeError("Journal entry legs do not balance")
+    owners = [None] * len(legs)
+    for index in sorted(range(len(legs)), key=lambda i: legs[i][0]):
+        acc_id, cents, allow_overdraft = legs[index]
+        owners[index] = _apply_leg(cursor, acc_id, cents, allow_overdraft)
+    dialect = dialect_of(cursor.connection)
+    entry_id = dialect.insert(
+        cursor, "INSERT INTO journal_entries (entry_type, emp_id, created_at) VALUES (?,?,?)",
+        (entry_type, emp_id, created_at), "entry_id"
+    )
+    cursor.executemany(
+        "INSERT INTO ledger_legs (entry_id, acc_id, amount_cents) VALUES (?,?,?)",
+        [(entry_id, acc_id, cents) for acc_id, cents, _ in legs]
+    )
+    return entry_id, owners
+
+def _record_transaction(cursor, user_id, acc_id, entry_id, emp_id, trans_type, amount, trans_date, audit):
+    """
+    Insert a customer-facing transactions row, roll it into daily_summary and return its trans_id.
+    
+    The row is also added to audit, which the caller hands to append_audit()
+    once the transaction has committed.
+    """
+    dialect = dialect_of(cursor.connection)
+    trans_id = dialect.insert(
+        cursor,
+        "INSERT INTO transactions (user_id, emp_id, trans_type, amount_cents, trans_date, acc_id, entry_id) "
+        "VALUES (?,?,?,?,?,?,?)",
+        (user_id, emp_id, trans_type, amount.cents, trans_date, acc_id, entry_id), "trans_id"
+    )
+    scopes = [("all", entry_id % SUMMARY_SHARDS), ("customer", user_id)]
+    if emp_id is not None:
+        scopes.append(("employee", emp_id))
+    cursor.executemany(
+        dialect.upsert_sql("daily_summary", ("day", "scope", "scope_id", "trans_type", "trans_count", "total_cents"),
+                           ("scope", "scope_id", "day", "trans_type"), ("trans_count", "total_cents")),
+        [(trans_date[:10], scope, scope_id, trans_type, 1, amount.cents) for scope, scope_id in scopes]
+    )
+    audit.append((trans_id, entry_id, acc_id, user_id, emp_id, trans_type, amount.cents, trans_date))
+    return trans_id
+
+def post_transfer(conn, sender_acc, receiver_acc, amount, emp_id=None, idempotency=None):
+    """
+    Atomically move money between two accounts as one two-leg journal entry.
+    
+    Args:
+        conn: Database connection
+        sender_acc: acc_id to debit
+        receiver_acc: acc_id to credit
+        amount: Money amount (already validated)
+        emp_id: Employee performing the transfer, or None for self-service
+        idempotency: Key id from request_idempotency_key(); a repeated key
+                     returns the original trans_ids without posting again
+        
+    Returns:
+        tuple: trans_ids of the (Transfer Out, Transfer In) rows
+        
+    Raises:
+        InsufficientFundsError: If the sender account cannot cover the amount
+        AccountNotFoundError: If either account does not exist
+        IdempotencyKeyReusedError: If the key was used for a different posting
+    """
+    if sender_acc == receiver_acc:
+        raise ValueError("Cannot transfer to the same account")
+    fingerprint = f"Transfer:{sender_acc}:{receiver_acc}:{amount.cents}:{emp_id or ''}"
+    
+    def work(cursor):
+        replayed = _replay_posting(cursor, idempotency, fingerprint)
+        if replayed is not None:
+            return tuple(replayed), (), []
+        now = get_egypt_time()
+        audit = []
+        entry_id, (sender_id, receiver_id) = _post_entry(
+            cursor, "Transfer", emp_id,
+            [(sender_acc, -amount.cents, False), (receiver_acc, amount.cents, False)], now
+        )
+        trans_ids = (
+            _record_transaction(cursor, sender_id, sender_acc, entry_id, emp_id, "Transfer Out", amount, now, audit),
+            _record_transaction(cursor, receiver_id, receiver_acc, entry_id, emp_id, "Transfer In", amount, now, audit),
+        )
+        _remember_posting(cursor, idempotency, fingerprint, trans_ids)
+        return trans_ids, (sender_id, receiver_id), audit
+    trans_ids, user_ids, audit = commit_idempotent(conn, work, idempotency)
+    dashboard_cache.invalidate(*user_ids)
+    append_audit(audit)
+    return trans_ids
+
+def post_cash(conn, acc_id, action_type, amount, emp_id, idempotency=None):
+    """
+    Atomically apply a teller Deposit or Withdraw against the cash account.
+    
+    Args:
+        conn: Database connection
+        acc_id: Customer account
+        action_type: "Deposit" or "Withdraw"
+        amount: Money amount (already validated)
+        emp_id: Employee processing the posting
+        idempotency: Key id from request_idempotency_key(); a repeated key
+                     returns the original trans_id without posting again
+        
+    Returns:
+        int: trans_id of the recorded transaction
+        
+    Raises:
+        InsufficientFundsError: If a withdrawal exceeds the account balance
+        AccountNotFoundError: If the account does not exist
+        IdempotencyKeyReusedError: If the key was used for a different posting
+    """
+    fingerprint = f"{action_type}:{acc_id}:{amount.cents}:{emp_id}"
+    
+    def work(cursor):
+        replayed = _replay_posting(cursor, idempotency, fingerprint)
+        if replayed is not None:
+            return replayed, None, []
+        audit = []
+        trans_id, user_id = _apply_cash(cursor, acc_id, action_type, amount, emp_id, get_egypt_time(), audit)
+        _remember_posting(cursor, idempotency, fingerprint, trans_id)
+        return trans_id, user_id, audit
+    trans_id, user_id, audit = commit_idempotent(conn, work, idempotency)
+    dashboard_cache.invalidate(user_id)
+    append_audit(audit)
+    return trans_id
+
+def _apply_cash(cursor, acc_id, action_type, amount, emp_id, trans_date, audit):
+    """
+    Apply one Deposit/Withdraw inside the caller's transaction; nothing is written on failure.
+    
+    The transactions row is added to audit (see _record_transaction()).
+    
+    Returns:
+        tuple: (trans_id, user_id of the account owner)
+    """
+    cash_acc = _cash_account(cursor, emp_id)
+    if action_type == "Deposit":
+        legs = [(cash_acc, -amount.cents, True), (acc_id, amount.cents, False)]
+    else:
+        legs = [(acc_id, -amount.cents, False), (cash_acc, amount.cents, True)]
+    entry_id, owners = _post_entry(cursor, action_type, emp_id, legs, trans_date)
+    user_id = owners[1] if action_type == "Deposit" else owners[0]
+    return _record_transaction(cursor, user_id, acc_id, entry_id, emp_id, action_type, amount, trans_date,
+                               audit), user_id
+
+def find_account(cursor, user_id, acc_type=None):
+    """
+    Look up a customer's account of the given type.
+    
+    Args:
+        cursor: Database cursor
+        user_id: Customer user_id
+        acc_type: One of ACCOUNT_TYPES (defaults to DEFAULT_ACCOUNT_TYPE)
+        
+    Returns:
+        int: acc_id, or None if the customer has no such account
+    """
+    cursor.execute(
+        "SELECT acc_id FROM accounts WHERE user_id=? AND acc_type=?",
+        (user_id, acc_type or DEFAULT_ACCOUNT_TYPE)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def list_accounts(cursor, user_id):
+    """Return (acc_id, acc_type, balance_cents) rows for a customer, ordered by type."""
+    cursor.execute(
+        "SELECT acc_id, acc_type, balance_cents FROM accounts WHERE user_id=? ORDER BY acc_type",
+        (user_id,)
+    )
+    return cursor.fetchall()
+
+def open_account(conn, user_id, acc_type):
+    """
+    Open an additional zero-balance account for a customer.
+    
+    Args:
+        conn: Database connection
+        user_id: Customer user_id
+        acc_type: One of ACCOUNT_TYPES
+        
+    Returns:
+        int: acc_id of the new account
+        
+    Raises:
+        ValueError: If the type is unknown or the customer already has one
+    """
+    if acc_type not in ACCOUNT_TYPES:
+        raise ValueError("Invalid account type")
+    try:
+        cursor = conn.cursor()
+        acc_id = dialect_of(conn).insert(
+            cursor, "INSERT INTO accounts (user_id, acc_type, balance_cents) VALUES (?, ?, 0)",
+            (user_id, acc_type), "acc_id"
+        )
+        cursor.execute("UPDATE users SET dashboard_generation = dashboard_generation + 1 WHERE user_id=?",
+                       (user_id,))
+        conn.commit()
+        dashboard_cache.invalidate(user_id)
+        return acc_id
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise ValueError(f"Customer already has a {acc_type} account")
+
+def verify_ledger(conn):
+    """
+    Check the maintained balances against the journal.
+    
+    Verifies that every journal entry balances, that every account balance
+    equals the sum of its legs, and that users.balance_cents equals the sum
+    of the customer's accounts. This scans the whole journal and is meant
+    for offline checks, not request paths.
+    
+    Returns:
+        list: Human readable problems (empty when consistent)
+    """
+    problems = []
+    for entry_id, total in conn.execute(
+        "SELECT entry_id, SUM(amount_cents) FROM ledger_legs GROUP BY entry_id HAVING SUM(amount_cents) <> 0"
+    ):
+        problems.append(f"entry {entry_id}: legs sum to {Money(total)}")
+    for acc_id, balance, ledger in conn.execute("""
+        SELECT a.acc_id, a.balance_cents, COALESCE(SUM(l.amount_cents), 0)
+        FROM accounts a LEFT JOIN ledger_legs l ON l.acc_id = a.acc_id
+        GROUP BY a.acc_id HAVING a.balance_cents <> COALESCE(SUM(l.amount_cents), 0)
+    """):
+        problems.append(f"account {acc_id}: balance {Money(balance)} != ledger {Money(ledger)}")
+    for user_id, balance, accounts_total in conn.execute("""
+        SELECT u.user_id, u.balance_cents, COALESCE(SUM(a.balance_cents), 0)
+        FROM users u LEFT JOIN accounts a ON a.user_id = u.user_id
+        GROUP BY u.user_id HAVING u.balance_cents <> COALESCE(SUM(a.balance_cents), 0)
+    """):
+        problems.append(f"user {user_id}: balance {Money(balance)} != accounts {Money(accounts_total)}")
+    return problems
+
+@app.cli.command("verify-ledger")
+def verify_ledger_command():
+    """Check account and customer balances against the double-entry journal."""
+    conn = connect_db()
+    try:
+        started = time.perf_counter()
+        problems = verify_ledger(conn)
+    finally:
+        conn.close()
+    for problem in problems[:50]:
+        print(f"[X] {problem}")
+    if problems:
+        raise SystemExit(1)
+    print(f"[OK] Ledger consistent ({time.perf_counter() - started:.2f}s)")
+
+def resolve_accounts(conn, usernames, acc_type=None):
+    """
+    Map usernames to their account of acc_type with a single query.
+    
+    On SQLite the names are passed as one JSON array parameter, so the
+    statement is the same no matter how many names are resolved. Server
+    backends use IN lists of up to RESOLVE_CHUNK_SIZE names instead.
+    
+    Args:
+        conn: Database connection
+        usernames: Iterable of usernames
+        acc_type: Account type (defaults to DEFAULT_ACCOUNT_TYPE)
+        
+    Returns:
+        dict: username -> acc_id for the customers that have such an account
+    """
+    names = sorted(set(usernames))
+    acc_type = acc_type or DEFAULT_ACCOUNT_TYPE
+    if dialect_of(conn).json_each:
+        rows = conn.execute(
+            "SELECT u.username, a.acc_id FROM json_each(?) j "
+            "JOIN users u ON u.username = j.value "
+            "JOIN accounts a ON a.user_id = u.user_id AND a.acc_type = ?",
+            (json.dumps(names), acc_type)
+        ).fetchall()
+    else:
+        rows = []
+        for i in range(0, len(names), RESOLVE_CHUNK_SIZE):
+            chunk = names[i:i + RESOLVE_CHUNK_SIZE]
+            rows.extend(conn.execute(
+                "SELECT u.username, a.acc_id FROM users u "
+                "JOIN accounts a ON a.user_id = u.user_id AND a.acc_type = ? "
+                f"WHERE u.username IN ({', '.join('?' for _ in chunk)})",
+                (acc_type, *chunk)
+            ).fetchall())
+    return {row[0]: row[1] for row in rows}
+
+def post_batch(conn, postings, emp_id, chunk_size=None, atomic=False):
+    """
+    Apply many Deposit/Withdraw postings (e.g. a payroll run).
+    
+    Every item is validated first and all usernames are resolved in one
+    query. Postings are then applied in chunks of chunk_size, one
+    transaction per chunk (a single transaction when chunk_size is None).
+    Items that fail are reported and skipped. With atomic=True the whole
+    batch runs in one transaction and any failure rolls all of it back.
+    
+    Args:
+        conn: Database connection
+        postings: List of (username, action, amount) tuples
+        emp_id: Employee submitting the batch
+        chunk_size: Postings per transaction (ignored when atomic)
+        atomic: All-or-nothing mode
+        
+    Returns:
+        dict: results (one per item, in order), applied, failed,
+              elapsed_ms and postings_per_sec
+    """
+    started = time.perf_counter()
+    results = []
+    valid = []
+    for index, (username, action, amount_str) in enumerate(postings):
+        result = {"index": index, "username": username, "action": action, "status": "error"}
+        results.append(result)
+        try:
+            if action not in ("Deposit", "Withdraw"):
+                raise ValueError("Invalid transaction type")
+            amount = validate_amount(amount_str)
+        except ValueError as e:
+            result["error"] = str(e)
+            continue
+        result["amount"] = f"{amount:.2f}"
+        valid.append((result, username, action, amount))
+    
+    acc_ids = resolve_accounts(conn, [item[1] for item in valid])
+    ready = []
+    for result, username, action, amount in valid:
+        if username in acc_ids:
+            ready.append((result, acc_ids[username], action, amount))
+        else:
+            result["error"] = "Customer not found"
+    
+    if atomic:
+        chunks = [ready] if ready and len(ready) == len(postings) else []
+        if len(ready) != len(postings):
+            for result, _, _, _ in ready:
+                result["error"] = "Batch rejected: another item failed validation"
+    else:
+        size = chunk_size or len(ready) or 1
+        chunks = [ready[i:i + size] for i in range(0, len(ready), size)]
+    
+    for chunk in chunks:
+        def work(cursor):
+            trans_date = get_egypt_time()
+            outcome = []
+            audit = []
+            for result, acc_id, action, amount in chunk:
+                if atomic:
+                    outcome.append((result, *_apply_cash(cursor, acc_id, action, amount, emp_id, trans_date, audit),
+                                    None))
+                    continue
+                # A failed item must not leave any of its legs behind in the chunk
+                cursor.execute("SAVEPOINT batch_item")
+                try:
+                    outcome.append((result, *_apply_cash(cursor, acc_id, action, amount, emp_id, trans_date, audit),
+                                    None))
+                except ValueError as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+                    outcome.append((result, None, None, str(e)))
+                cursor.execute("RELEASE SAVEPOINT batch_item")
+            return outcome, audit
+        try:
+            outcome, audit = run_posting(conn, work)
+        except ValueError as e:
+            for result, _, _, _ in chunk:
+                result["error"] = f"Batch rolled back: {str(e)}"
+            continue
+        dashboard_cache.invalidate(*{user_id for _, _, user_id, error in outcome if not error})
+        append_audit(audit)
+        for result, trans_id, _, error in outcome:
+            if error:
+                result["error"] = error
+            else:
+                result["status"] = "ok"
+                result["trans_id"] = trans_id
+    
+    elapsed = time.perf_counter() - started
+    applied = sum(1 for r in results if r["status"] == "ok")
+    return {
+        "results": results,
+        "applied": applied,
+        "failed": len(results) - applied,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "postings_per_sec": round(applied / elapsed, 1) if elapsed else None,
+    }
+
+# ---------------------------
+# Customer search
+# ---------------------------
+SEARCH_WORD_PATTERN = re.compile(r"\w+")
+SEARCH_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+SEARCH_DIGITS = "0123456789"
+
+def _edit_variants(word):
+    """
+    Strings one deletion, transposition, substitution or insertion away from word.
+    
+    Substituted and inserted characters are drawn only from the classes
+    (letters, digits) of the surrounding characters, which keeps
+    "jsmith_4821" from fanning out into every letter/digit mix while still
+    covering the usual slips.
+    """
+    def alphabet(*chars):
+        letters = any(ch.isalpha() for ch in chars)
+        digits = any(ch.isdigit() for ch in chars)
+        return (SEARCH_LETTERS if letters or not digits else "") + (SEARCH_DIGITS if digits else "") + "_"
+    
+    variants = set()
+    for i in range(len(word)):
+        variants.add(word[:i] + word[i + 1:])
+        if i + 1 < len(word):
+            variants.add(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+        for ch in alphabet(*word[max(i - 1, 0):i + 2]):
+            variants.add(word[:i] + ch + word[i + 1:])
+    for i in range(len(word) + 1):
+        for ch in alphabet(*word[max(i - 1, 0):i + 1]):
+            variants.add(word[:i] + ch + word[i:])
+    variants.discard(word)
+    variants.discard("")
+    return variants
+
+def _one_edit_apart(a, b):
+    """True if a and b differ by exactly one insertion, deletion, substitution or adjacent swap."""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    return a[i + 1:] == b[i:] if len(a) > len(b) else a[i:] == b[i + 1:]
+
+def _search_score(text, words, row):
+    """
+    Rank one candidate.
+    
+    Every query word scores its best hit across the username (weight 3),
+    full name (2) and email (1): an exact word beats a prefix, which beats a
+    one-typo match. A username or email starting with the whole query gets
+    a bonus on top.
+    """
+    username, email = row[1].lower(), (row[3] or "").lower()
+    score = 10.0 if username == text else 3.0 if username.startswith(text) else 0.0
+    if email.startswith(text):
+        score += 2.0
+    terms = [(term, weight) for value, weight in ((username, 3.0), ((row[2] or "").lower(), 2.0), (email, 1.0))
+             for term in SEARCH_WORD_PATTERN.findall(value)]
+    for word in words:
+        best = 0.0
+        fuzzy = len(word) >= SEARCH_FUZZY_MIN_LENGTH
+        for term, weight in terms:
+            if term == word:
+                hit = weight
+            elif term.startswith(word):
+                hit = (0.6 + 0.3 * len(word) / len(term)) * weight
+            elif fuzzy and abs(len(term) - len(word)) <= 1 and _one_edit_apart(word, term):
+                hit = 0.4 * weight
+            else:
+                continue
+            best = max(best, hit)
+        score += best
+    return score
+
+def search_customers(conn, query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Find customers by username, email or name prefix, tolerating one typo.
+    
+    Candidates come from three index lookups: a one-word query is matched
+    as a username or email prefix (B-tree range scans on the lower() indexes)
+    and, if no username starts with it, against usernames one edit away;
+    every query word is matched by prefix against the words of the full name
+    and email (FTS5). Name words of SEARCH_FUZZY_MIN_LENGTH or more that match
+    nothing also try their one-edit variants as exact terms. The edit variants
+    are looked up in the indexes, so no path scans the customers table. At most
+    SEARCH_CANDIDATE_LIMIT hits per lookup are re-ranked in Python. Server
+    backends have no FTS5 index and only get the username/email prefix lookups.
+    
+    Args:
+        conn: Database connection
+        query: Free text typed by the teller
+        limit: Maximum results
+        
+    Returns:
+        list: (user_id, username, full_name, email) rows, best match first
+    """
+    text = " ".join(query.lower().split())
+    words = SEARCH_WORD_PATTERN.findall(text)[:SEARCH_MAX_TERMS]
+    if not words:
+        return []
+    cursor = conn.cursor()
+    select = "SELECT user_id, username, full_name, email FROM users"
+    candidates = {}
+    
+    def add(sql, params):
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            candidates.setdefault(row[0], row)
+    
+    if " " not in text:
+        bounds = (text, text + "\U0010ffff", SEARCH_CANDIDATE_LIMIT)
+        add(f"{select} WHERE lower(username) >= ? AND lower(username) < ? ORDER BY lower(username) LIMIT ?", bounds)
+        has_username_prefix = bool(candidates)
+        add(f"{select} WHERE lower(email) >= ? AND lower(email) < ? ORDER BY lower(email) LIMIT ?", bounds)
+        if not has_username_prefix and len(text) >= SEARCH_FUZZY_MIN_LENGTH:
+            variants = sorted(_edit_variants(text))
+            for i in range(0, len(variants), RESOLVE_CHUNK_SIZE):
+                chunk = variants[i:i + RESOLVE_CHUNK_SIZE]
+                add(f"{select} WHERE lower(username) IN ({', '.join('?' * len(chunk))})", chunk)
+    
+    # Name words; trailing digits are not indexed (see migration 10)
+    name_words = [word.rstrip(SEARCH_DIGITS) for word in words]
+    name_words = [word for word in name_words if len(word) >= 2 and word.isalpha()]
+    if name_words and dialect_of(conn).name in ("sqlite", "standin"):
+        sql = ("SELECT u.user_id, u.username, u.full_name, u.email FROM customer_search s "
+               "JOIN users u ON u.user_id = s.rowid WHERE customer_search MATCH ? LIMIT ?")
+        add(sql, (" AND ".join(f'"{word}"*' for word in name_words), SEARCH_CANDIDATE_LIMIT))
+        if len(candidates) < limit:
+            # Only words that match nothing on their own are treated as typos
+            fuzzy = [
+                word for word in name_words
+                if len(word) >= SEARCH_FUZZY_MIN_LENGTH and cursor.execute(
+                    "SELECT 1 FROM customer_search WHERE customer_search MATCH ? LIMIT 1", (f'"{word}"*',)
+                ).fetchone() is None
+            ]
+            if fuzzy:
+                groups = []
+                for word in name_words:
+                    terms = [f'"{word}"*']
+                    if word in fuzzy:
+                        # "_" splits FTS tokens, so those variants would turn into phrase queries
+                        terms += [f'"{variant}"' for variant in sorted(_edit_variants(word)) if variant.isalpha()]
+                    groups.append("(" + " OR ".join(terms) + ")")
+                add(sql, (" AND ".join(groups), SEARCH_CANDIDATE_LIMIT))
+    
+    ranked = sorted(candidates.values(), key=lambda row: (-_search_score(text, words, row), len(row[1]), row[0]))
+    return ranked[:limit]
+
+# ---------------------------
+# Transaction history pagination
+# ---------------------------
+def encode_cursor(trans_date, trans_id):
+    """Encode a (trans_date, trans_id) position as an opaque URL-safe token."""
+    raw = f"{trans_date}|{trans_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    """
+    Decode a cursor produced by encode_cursor().
+    
+    Args:
+        token: Cursor string from the query string
+        
+    Returns:
+        tuple: (trans_date, trans_id)
+        
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        trans_date, trans_id = raw.rsplit("|", 1)
+        return trans_date, int(trans_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid page cursor") from e
+
+def parse_history_filters(args):
+    """
+    Read history filters from request arguments.
+    
+    Supported keys: page_size, date_from and date_to (YYYY-MM-DD), trans_type,
+    user (username or user ID), and the after/before page cursors.
+    
+    Args:
+        args: request.args (or any mapping)
+        
+    Returns:
+        dict: Normalized filters
+        
+    Raises:
+        ValueError: If a filter value is invalid
+    """
+    try:
+        page_size = int(args.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Page size must be a number")
+    filters = {
+        "page_size": max(1, min(page_size, MAX_PAGE_SIZE)),
+        "date_from": args.get("date_from", "").strip(),
+        "date_to": args.get("date_to", "").strip(),
+        "trans_type": args.get("trans_type", "").strip(),
+        "user": args.get("user", "").strip(),
+        "after": None,
+        "before": None,
+    }
+    for key in ("date_from", "date_to"):
+        if filters[key]:
+            try:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError("Dates must use the YYYY-MM-DD format")
+    if filters["trans_type"] and filters["trans_type"] not in TRANSACTION_TYPES:
+        raise ValueError("Invalid transaction type")
+    if args.get("after"):
+        filters["after"] = decode_cursor(args["after"])
+    elif args.get("before"):
+        filters["before"] = decode_cursor(args["before"])
+    return filters
+
+def history_filters_from_request():
+    """Parse history filters from the query string, flashing and ignoring bad input."""
+    try:
+        return parse_history_filters(request.args)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return parse_history_filters({})
+
+def filter_link_args(filters):
+    """Return the non-empty filters as query arguments for pager links."""
+    link_args = {key: filters[key] for key in ("date_from", "date_to", "trans_type", "user") if filters[key]}
+    if filters["page_size"] != DEFAULT_PAGE_SIZE:
+        link_args["page_size"] = filters["page_size"]
+    return link_args
+
+def history_conditions(cursor, filters, user_id=None):
+    """
+    Build the WHERE conditions for the history filters (cursors excluded).
+    
+    Args:
+        cursor: Database cursor (used to resolve a username filter)
+        filters: Output of parse_history_filters()
+        user_id: Restrict to one customer (overrides the user filter)
+        
+    Returns:
+        tuple: (list of SQL conditions, list of parameters)
+    """
+    where, params = [], []
+    if user_id is None and filters["user"]:
+        if filters["user"].isdigit():
+            user_id = int(filters["user"])
+        else:
+            cursor.execute("SELECT user_id FROM users WHERE username=?", (filters["user"],))
+            row = cursor.fetchone()
+            user_id = row[0] if row else -1
+    if user_id is not None:
+        where.append("t.user_id = ?")
+        params.append(user_id)
+    if filters["trans_type"]:
+        where.append("t.trans_type = ?")
+        params.append(filters["trans_type"])
+    if filters["date_from"]:
+        where.append("t.trans_date >= ?")
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        # Bound computed here rather than with date(?, '+1 day'), which only SQLite has
+        day_after = datetime.strptime(filters["date_to"], "%Y-%m-%d") + timedelta(days=1)
+        where.append("t.trans_date < ?")
+        params.append(day_after.strftime("%Y-%m-%d"))
+    return where, params
+
+def fetch_transactions_page(cursor, filters, columns=TRANSACTION_COLUMNS, joins="", user_id=None):
+    """
+    Fetch one page of transactions, newest first, using keyset pagination.
+    
+    Pages are addressed by the (trans_date, trans_id) of their boundary rows
+    rather than an OFFSET, so every page costs one index range scan of
+    page_size rows no matter how deep into the history it is.
+    
+    Args:
+        cursor: Database cursor
+        filters: Output of parse_history_filters()
+        columns: SELECT list (transactions must be aliased as t)
+        joins: Extra JOIN clauses
+        user_id: Restrict to one customer (overrides the user filter)
+        
+    Returns:
+        dict: rows, next_cursor and prev_cursor (None when there is no such page)
+    """
+    where, params = history_conditions(cursor, filters, user_id)
+    
+    backwards = filters["before"] is not None
+    if filters["after"]:
+        where.append("(t.trans_date, t.trans_id) < (?, ?)")
+        params.extend(filters["after"])
+    elif backwards:
+        where.append("(t.trans_date, t.trans_id) > (?, ?)")
+        params.extend(filters["before"])
+    
+    order = "ASC" if backwards else "DESC"
+    sql = f"SELECT {columns} FROM transactions t {joins}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY t.trans_date {order}, t.trans_id {order} LIMIT ?"
+    page_size = filters["page_size"]
+    cursor.execute(sql, params + [page_size + 1])
+    rows = cursor.fetchall()
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = filters["after"] is not None, has_more
+    return {
+        "rows": rows,
+        "next_cursor": encode_cursor(rows[-1]["trans_date"], rows[-1]["trans_id"]) if rows and has_older else None,
+        "prev_cursor": encode_cursor(rows[0]["trans_date"], rows[0]["trans_id"]) if rows and has_newer else None,
+    }
+
+# Export columns holding INTEGER cents; iter_export() writes them as exact "123.45" strings
+EXPORT_MONEY_COLUMNS = ("amount", "balance")
+
+def export_query(cursor, report_type, filters):
+    """
+    Build the SELECT for a report export.
+    
+    Args:
+        cursor: Database cursor
+        report_type: "transactions", "users" or "employees"
+        filters: Output of parse_history_filters() (transactions only)
+        
+    Returns:
+        tuple: (sql, params, column names)
+        
+    Raises:
+        ValueError: If the report type is unknown
+    """
+    if report_type == "transactions":
+        where, params = history_conditions(cursor, filters)
+        sql = f"""
+            SELECT t.trans_id, t.trans_date, t.trans_type, t.amount_cents,
+                   t.user_id, u.username, t.emp_id, e.username
+            FROM transactions t {HISTORY_NAME_JOINS}
+        """
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY t.trans_date DESC, t.trans_id DESC"
+        columns = ["trans_id", "trans_date", "trans_type", "amount", "user_id", "username", "emp_id", "employee"]
+        return sql, params, columns
+    if report_type == "users":
+        return ("SELECT user_id, username, full_name, email, balance_cents FROM users ORDER BY user_id", [],
+                ["user_id", "username", "full_name", "email", "balance"])
+    if report_type == "employees":
+        return ("SELECT emp_id, username, full_name, role FROM employees ORDER BY emp_id", [],
+                ["emp_id", "username", "full_name", "role"])
+    raise ValueError("Invalid report type")
+
+def iter_export(cursor, columns, fmt):
+    """
+    Yield an executed cursor's rows as CSV or JSON Lines text chunks.
+    
+    Rows are pulled EXPORT_CHUNK_SIZE at a time with fetchmany(), so memory
+    use stays flat regardless of how many rows the query returns. Columns
+    named in EXPORT_MONEY_COLUMNS are converted from cents to "123.45".
+    
+    Args:
+        cursor: Cursor with the export query already executed
+        columns: Column names for the header / JSON keys
+        fmt: "csv" or "jsonl"
+        
+    Yields:
+        str: One encoded chunk per fetched batch
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+    money = [i for i, name in enumerate(columns) if name in EXPORT_MONEY_COLUMNS]
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        if money:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in money:
+                    row[i] = format_money(row[i])
+        if fmt == "csv":
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row))))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def gzip_stream(chunks):
+    """Compress a stream of text chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+# ---------------------------
+# Bulk customer import
+# ---------------------------
+def iter_customer_records(stream, fmt):
+    """
+    Read customer records from a CSV (with header) or JSON Lines text stream.
+    
+    Args:
+        stream: Text file object
+        fmt: "csv" or "jsonl"
+        
+    Yields:
+        tuple: (line number, dict of fields) or (line number, error message)
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, "Invalid JSON"
+            continue
+        yield line_no, record if isinstance(record, dict) else "Expected a JSON object"
+
+def _existing_usernames(conn, usernames):
+    """
+    Return which of usernames are already taken.
+
+    Passed as one JSON array on SQLite, like resolve_accounts, so a batch
+    never runs into the 999 bound-variable limit of older SQLite builds;
+    server backends use IN lists of up to RESOLVE_CHUNK_SIZE names.
+    """
+    if dialect_of(conn).json_each:
+        return {row[0] for row in conn.execute(
+            "SELECT u.username FROM json_each(?) j JOIN users u ON u.username = j.value",
+            (json.dumps(usernames),))}
+    existing = set()
+    for i in range(0, len(usernames), RESOLVE_CHUNK_SIZE):
+        chunk = usernames[i:i + RESOLVE_CHUNK_SIZE]
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT username FROM users WHERE username IN ({', '.join('?' for _ in chunk)})", chunk))
+    return existing
+
+def import_customers(conn, records, hasher=None, batch_size=BULK_IMPORT_BATCH_SIZE):
+    """
+    Create customer accounts in bulk.
+    
+    Each batch is validated with the same rules as add_customer, hashed in
+    parallel on the hashing pool and inserted with one executemany() inside a
+    single transaction. Invalid or duplicate rows are reported and skipped;
+    they never abort the import.
+    
+    Args:
+        conn: Database connection
+        records: Iterable from iter_customer_records()
+        hasher: PasswordHasher to use (defaults to password_hasher)
+        batch_size: Rows per transaction
+        
+    Returns:
+        dict: imported, failed and errors (list of (line, username, message))
+    """
+    hasher = hasher or password_hasher
+    report = {"imported": 0, "failed": 0, "errors": []}
+    
+    def fail(line_no, username, message):
+        report["failed"] += 1
+        report["errors"].append((line_no, username, message))
+        
+    seen = set()
+    batch = []
+    
+    def flush():
+        if not batch:
+            return
+        existing = _existing_usernames(conn, [item[1] for item in batch])
+        pending = []
+        for item in batch:
+            if item[1] in existing:
+                fail(item[0], item[1], "Username already exists")
+            else:
+                pending.append(item)
+        hashes = hasher.hash_many([item[3] for item in pending])
+        rows = [(username, pwhash, full_name, email, balance.cents)
+                for (_, username, full_name, _, email, balance), pwhash in zip(pending, hashes)]
+        
+        def work(cursor):
+            cursor.execute("SAVEPOINT bulk_batch")
+            try:
+                cursor.executemany(
+                    "INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,?)", rows)
+                cursor.execute("RELEASE bulk_batch")
+                return [True] * len(rows)
+            except sqlite3.IntegrityError:
+                # Someone created one of these usernames meanwhile: redo row by row
+                cursor.execute("ROLLBACK TO bulk_batch")
+                cursor.execute("RELEASE bulk_batch")
+                results = []
+                for row in rows:
+                    try:
+                        cursor.execute(
+                            "INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,?)", row)
+                        results.append(True)
+                    except sqlite3.IntegrityError:
+                        results.append(False)
+                return results
+            
+        for item, inserted in zip(pending, run_posting(conn, work)):
+            if inserted:
+                report["imported"] += 1
+                unknown_usernames.discard(("user", item[1]))
+            else:
+                fail(item[0], item[1], "Username already exists")
+        batch.clear()
+        
+    for line_no, record in records:
+        if isinstance(record, str):
+            fail(line_no, "", record)
+            continue
+        fields = {key: str(record.get(key) or "").strip() for key in BULK_IMPORT_FIELDS}
+        fields["password"] = str(record.get("password") or "")
+        username = fields["username"]
+        try:
+            balance = validate_customer(fields["full_name"], username, fields["email"],
+                                        fields["password"], fields["balance"] or "0")
+        except ValueError as e:
+            fail(line_no, username, str(e))
+            continue
+        if username in seen:
+            fail(line_no, username, "Duplicate username in file")
+            continue
+        seen.add(username)
+        batch.append((line_no, username, fields["full_name"], fields["password"], fields["email"], balance))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report
+
+# ---------------------------
+# Daily summary rollup
+# ---------------------------
+SUMMARY_GROUPS = {
+    "day": ("all", "day", "day"),
+    "employee": ("employee", "scope_id", "name"),
+    "customer": ("customer", "scope_id", "name"),
+}
+
+def rebuild_daily_summary(conn):
+    """
+    Recompute daily_summary from the full transactions table.
+    
+    Used for backfills and to repair the rollup; runs as a single write
+    transaction so readers never see a half-built summary. The 'all' totals
+    are rebuilt into shard 0; fetch_summary() sums whatever shards hold.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        int: Number of summary rows written
+    """
+    day = dialect_of(conn).day.format("trans_date")
+    
+    def work(cursor):
+        cursor.execute("DELETE FROM daily_summary")
+        cursor.execute(f"""
+            INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_cents)
+            SELECT {day}, 'all', 0, trans_type, COUNT(*), SUM(amount_cents)
+            FROM transactions GROUP BY {day}, trans_type
+        """)
+        cursor.execute(f"""
+            INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_cents)
+            SELECT {day}, 'employee', emp_id, trans_type, COUNT(*), SUM(amount_cents)
+            FROM transactions WHERE emp_id IS NOT NULL GROUP BY {day}, emp_id, trans_type
+        """)
+        cursor.execute(f"""
+            INSERT INTO daily_summary (day, scope, scope_id, trans_type, trans_count, total_cents)
+            SELECT {day}, 'customer', user_id, trans_type, COUNT(*), SUM(amount_cents)
+            FROM transactions WHERE user_id IS NOT NULL GROUP BY {day}, user_id, trans_type
+        """)
+        cursor.execute("SELECT COUNT(*) FROM daily_summary")
+        return cursor.fetchone()[0]
+    return run_posting(conn, work)
+
+def fetch_summary(cursor, group, date_from="", date_to="", limit=MAX_PAGE_SIZE):
+    """
+    Aggregate deposits, withdrawals and transfer volume from daily_summary.
+    
+    Reads only the rollup, so the cost depends on the number of days (and
+    employees or customers) in range, not on the number of transactions.
+    
+    Args:
+        cursor: Database cursor
+        group: "day", "employee" or "customer"
+        date_from: Optional first day (YYYY-MM-DD)
+        date_to: Optional last day (YYYY-MM-DD)
+        limit: Maximum rows returned
+        
+    Returns:
+        list: Rows with key, name, deposits, withdrawals, transfers, trans_count
+    """
+    scope, key, _ = SUMMARY_GROUPS[group]
+    where, params = ["s.scope = ?"], [scope]
+    if date_from:
+        where.append("s.day >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("s.day <= ?")
+        params.append(date_to)
+    if group == "employee":
+        name, join = "e.username", "LEFT JOIN employees e ON e.emp_id = s.scope_id"
+    elif group == "customer":
+        name, join = "u.username", "LEFT JOIN users u ON u.user_id = s.scope_id"
+    else:
+        name, join = "s.day", ""
+    order = "s.day DESC" if group == "day" else "SUM(s.total_cents) DESC"
+    cursor.execute(f"""
+        SELECT s.{key} AS key, {name} AS name,
+               SUM(CASE WHEN s.trans_type = 'Deposit' THEN s.total_cents ELSE 0 END) AS deposits,
+               SUM(CASE WHEN s.trans_type = 'Withdraw' THEN s.total_cents ELSE 0 END) AS withdrawals,
+               SUM(CASE WHEN s.trans_type = 'Transfer Out' THEN s.total_cents ELSE 0 END) AS transfers,
+               SUM(s.trans_count) AS trans_count
+        FROM daily_summary s {join}
+        WHERE {" AND ".join(where)}
+        GROUP BY s.{key}
+        ORDER BY {order}
+        LIMIT ?
+    """, params + [limit])
+    return cursor.fetchall()
+
+@app.cli.command("rebuild-summary")
+def rebuild_summary_command():
+    """Rebuild the daily_summary rollup from the transactions table."""
+    conn = connect_db()
+    try:
+        started = time.perf_counter()
+        rows = rebuild_daily_summary(conn)
+        print(f"Rebuilt daily_summary: {rows} rows in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+# ---------------------------
+# Ledger reconciliation
+# ---------------------------
+# Signed effect of a transactions row on its customer's balance
+SIGNED_AMOUNT_SQL = "CASE WHEN trans_type IN ('Deposit', 'Transfer In') THEN amount_cents ELSE -amount_cents END"
+
+def _sum_transactions(conn, from_trans_id, to_trans_id):
+    """Per-user (user_id, rows, net_cents, last_trans_id) of transactions in (from_trans_id, to_trans_id]."""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT user_id, COUNT(*), SUM({SIGNED_AMOUNT_SQL}), MAX(trans_id)
+        FROM transactions
+        WHERE trans_id > ? AND trans_id <= ? AND user_id IS NOT NULL
+        GROUP BY user_id
+    """, (from_trans_id, to_trans_id))
+    return [tuple(row) for row in cursor.fetchall()]
+
+def _reconcile_chunk(database, from_trans_id, to_trans_id):
+    """
+    Sum the signed amounts of transactions in (from_trans_id, to_trans_id] per user.
+    
+    Runs in a worker process (or inline) on its own read-only connection to
+    the SQLite file database. SQLite has one writer at a time, so rows at or
+    below the run's high-water mark are already committed and never change,
+    and every chunk sees the same data as the coordinator.
+    
+    Returns:
+        list: (user_id, rows, net_cents, last_trans_id) tuples
+    """
+    conn = connect_db(database, readonly=True)
+    try:
+        return _sum_transactions(conn, from_trans_id, to_trans_id)
+    finally:
+        conn.close()
+
+def reconcile_ledger(conn, workers=None, chunk_rows=RECONCILE_CHUNK_ROWS):
+    """
+    Check users.balance_cents against each user's transactions.
+    
+    On SQLite the check is incremental: only rows added since the previous
+    run are read. The previous run's high-water trans_id bounds the range,
+    and per-user running totals live in reconciliation_checkpoints. The
+    balances and the new high-water mark are read in one snapshot; new rows
+    are summed in parallel chunks on read-only connections, and the
+    checkpoints are then advanced.
+    
+    Server backends (BANK_STORAGE_URL) hand out trans_ids before commit, so
+    a lower id can commit after a higher one and a high-water mark would
+    skip it for good. There every run sums all transactions inside the
+    same repeatable-read snapshot as the balances, and no checkpoints are
+    kept.
+    
+    Args:
+        conn: Primary (writable) database connection
+        workers: Worker processes (defaults to RECONCILE_WORKERS on SQLite;
+                 0 runs inline)
+        chunk_rows: trans_id span handled by one chunk
+        
+    Returns:
+        dict: from_trans_id, to_trans_id, rows, users, drifted (list of
+              (user_id, balance Money, expected Money)), elapsed_ms and rows_per_sec
+    
+    Raises:
+        ValueError: If workers are requested on a server backend
+    """
+    started = time.perf_counter()
+    database = database_path()
+    incremental = database is not None
+    if workers is None:
+        workers = RECONCILE_WORKERS if incremental else 0
+    elif workers and not incremental:
+        raise ValueError("Parallel reconciliation needs a SQLite database; use --workers 0 on server backends")
+    from_trans_id = 0
+    if incremental:
+        row = conn.execute("SELECT MAX(to_trans_id) FROM reconciliation_runs").fetchone()
+        from_trans_id = row[0] or 0
+    
+    # One read snapshot for the high-water mark and every balance (and, on servers, every sum)
+    snapshot = connect_db(database, readonly=True)
+    try:
+        snapshot.execute(dialect_of(snapshot).snapshot)
+        to_trans_id = snapshot.execute("SELECT COALESCE(MAX(trans_id), 0) FROM transactions").fetchone()[0]
+        if incremental:
+            users = snapshot.execute("""
+                SELECT u.user_id, u.balance_cents, u.opening_balance_cents,
+                       COALESCE(c.net_cents, 0), COALESCE(c.last_trans_id, 0)
+                FROM users u LEFT JOIN reconciliation_checkpoints c ON c.user_id = u.user_id
+            """).fetchall()
+        else:
+            users = snapshot.execute(
+                "SELECT user_id, balance_cents, opening_balance_cents, 0, 0 FROM users"
+            ).fetchall()
+            parts = [_sum_transactions(snapshot, 0, to_trans_id)]
+        snapshot.rollback()
+    finally:
+        snapshot.close()
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employees (
-            emp_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            full_name VARCHAR(100),
-            role VARCHAR(50)
-        )
-    ''')
+    if incremental:
+        bounds = [(lo, min(lo + chunk_rows, to_trans_id)) for lo in range(from_trans_id, to_trans_id, chunk_rows)]
+        if workers and len(bounds) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(_reconcile_chunk, [database] * len(bounds),
+                                          [b[0] for b in bounds], [b[1] for b in bounds]))
+        else:
+            parts = [_reconcile_chunk(database, lo, hi) for lo, hi in bounds]
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
-            admin_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            full_name VARCHAR(100)
-        )
-    ''')
+    deltas = {}
+    rows = 0
+    for part in parts:
+        for user_id, count, net, last_id in part:
+            prev = deltas.get(user_id, (0, 0))
+            deltas[user_id] = (prev[0] + net, max(prev[1], last_id))
+            rows += count
     
-    # Note: accounts table reserved for future multi-account feature
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS accounts (
-            acc_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            acc_type VARCHAR(50),
-            balance DECIMAL(10,2) DEFAULT 0.0,
-            FOREIGN KEY(user_id) REFERENCES users(user_id)
-        )
-    ''')
+    drifted = []
+    checkpoints = []
+    now = get_egypt_time()
+    for user_id, balance, opening, net, last_id in users:
+        delta, new_last = deltas.get(user_id, (0, last_id))
+        expected = opening + net + delta
+        if expected != balance:
+            drifted.append((user_id, Money(balance), Money(expected)))
+        if incremental and user_id in deltas:
+            checkpoints.append((user_id, new_last, net + delta, now))
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            trans_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            emp_id INTEGER,
-            trans_type VARCHAR(50),
-            amount DECIMAL(10,2),
-            trans_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(user_id),
-            FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+    elapsed = time.perf_counter() - started
+    with conn:
+        if checkpoints:
+            conn.executemany(
+                dialect_of(conn).upsert_sql(
+                    "reconciliation_checkpoints", ("user_id", "last_trans_id", "net_cents", "checked_at"),
+                    ("user_id",), assignments=("last_trans_id", "net_cents", "checked_at")
+                ),
+                checkpoints
+            )
+        conn.execute(
+            "INSERT INTO reconciliation_runs (started_at, from_trans_id, to_trans_id, rows_checked, "
+            "users_checked, drifted, elapsed_ms) VALUES (?,?,?,?,?,?,?)",
+            (now, from_trans_id, to_trans_id, rows, len(users), len(drifted), round(elapsed * 1000, 2))
         )
-    ''')
+    return {
+        "from_trans_id": from_trans_id,
+        "to_trans_id": to_trans_id,
+        "rows": rows,
+        "users": len(users),
+        "drifted": drifted,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+    }
+
+@app.cli.command("reconcile")
+@click.option("--workers", type=int, default=None, help="Worker processes (0 = inline)")
+@click.option("--chunk-rows", type=int, default=RECONCILE_CHUNK_ROWS, help="trans_id span per chunk")
+def reconcile_command(workers, chunk_rows):
+    """Check customer balances against transactions added since the last run."""
+    conn = connect_db()
+    try:
+        report = reconcile_ledger(conn, workers=workers, chunk_rows=chunk_rows)
+    except ValueError as e:
+        print(f"[X] {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    print(f"Checked {report['rows']} new rows up to trans_id {report['to_trans_id']} for "
+          f"{report['users']} users in {report['elapsed_ms']:.0f}ms ({report['rows_per_sec'] or 0:,.0f} rows/s)")
+    for user_id, balance, expected in report["drifted"][:50]:
+        print(f"[X] user {user_id}: balance {balance} != opening + history {expected}")
+    if report["drifted"]:
+        raise SystemExit(1)
+    print("[OK] No drifted balances")
+
+# ---------------------------
+# Idempotency keys
+# ---------------------------
+def new_idempotency_key():
+    """Fresh key for the hidden idempotency_key field of a posting form."""
+    return secrets.token_urlsafe(16)
+
+def request_idempotency_key():
+    """
+    Key id of the current posting request.
+    
+    Taken from the Idempotency-Key header (API clients) or the hidden
+    idempotency_key form field, and prefixed with the logged-in role and id
+    so two clients can never share a key.
     
-    conn.commit()
-    conn.close()
+    Returns:
+        str: Key id for post_transfer()/post_cash(), or None without a key
+        
+    Raises:
+        ValueError: If the key is too long
+    """
+    key = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key") or "").strip()
+    if not key:
+        return None
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f"Idempotency key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    _start_idempotency_purger()
+    identity = session.get("identity") or {}
+    return f"{identity.get('role')}:{identity.get('id')}:{key}"
 
-# Initialize database on startup
-init_db()
+@app.cli.command("purge-idempotency-keys")
+def purge_idempotency_keys_command():
+    """Delete expired idempotency keys now (the app also does this in the background)."""
+    print(f"Purged {purge_idempotency_keys()} expired idempotency key(s)")
 
 # ---------------------------
 # Home / Login
@@ -208,52 +3835,26 @@ def login():
             flash("All fields are required!", "danger")
             return render_template("login.html")
 
-        conn = None
         try:
             conn = get_db()
-            cursor = conn.cursor()
             
-            if user_type == "user":
-                cursor.execute("SELECT * FROM users WHERE username=?", (username,))
-                user = cursor.fetchone()
-                if user and check_password_hash(user[2], password):
-                    session['user_id'] = user[0]
-                    session.permanent = True
-                    flash(f"Welcome back, {user[3]}!", "success")
-                    return redirect(url_for("user_dashboard"))
-                else:
-                    flash("Invalid username or password!", "danger")
-                    
-            elif user_type == "employee":
-                cursor.execute("SELECT * FROM employees WHERE username=?", (username,))
-                emp = cursor.fetchone()
-                if emp and check_password_hash(emp[2], password):
-                    session['emp_id'] = emp[0]
-                    session.permanent = True
-                    flash(f"Welcome back, {emp[3]}!", "success")
-                    return redirect(url_for("employee_dashboard"))
-                else:
-                    flash("Invalid username or password!", "danger")
-                    
-            elif user_type == "admin":
-                cursor.execute("SELECT * FROM admins WHERE username=?", (username,))
-                admin = cursor.fetchone()
-                if admin and check_password_hash(admin[2], password):
-                    session['admin_id'] = admin[0]
-                    session.permanent = True
-                    flash(f"Welcome back, {admin[3]}!", "success")
-                    return redirect(url_for("admin_dashboard"))
-                else:
-                    flash("Invalid username or password!", "danger")
-            else:
+            if user_type not in LOGIN_ROLES:
                 flash("Invalid user type!", "danger")
+                return render_template("login.html")
+            
+            table, id_column, session_key, dashboard = LOGIN_ROLES[user_type]
+            account = lookup_credentials(conn, user_type, username)
+            if account and verify_login_password(conn, table, id_column, account[0], account[1], password):
+                start_session(user_type, account, username)
+                flash(f"Welcome back, {account[2]}!", "success")
+                return redirect(url_for(dashboard))
+            flash("Invalid username or password!", "danger")
                 
+        except HashingOverloadedError:
+            raise
         except Exception as e:
             flash(f"An error occurred during login. Please try again.", "danger")
             print(f"Login error: {str(e)}")  # Log for debugging
-        finally:
-            if conn:
-                conn.close()
                 
     return render_template("login.html")
 
@@ -264,13 +3865,22 @@ def login():
 def user_dashboard():
     if "user_id" in session:
         conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id=?", (session["user_id"],))
-        user = cursor.fetchone()
-        cursor.execute("SELECT * FROM transactions WHERE user_id=? ORDER BY trans_date DESC LIMIT 10", (session["user_id"],))
-        transactions = cursor.fetchall()
-        conn.close()
-        return render_template("user_dashboard.html", user=user, transactions=transactions)
+        user_id = session["user_id"]
+        
+        def load():
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
+            user = cursor.fetchone()
+            cursor.execute(DASHBOARD_HISTORY_QUERY, (user_id,))
+            return user, cursor.fetchall(), list_accounts(cursor, user_id)
+        
+        def generation():
+            cursor = conn.cursor()
+            cursor.execute(DASHBOARD_GENERATION_QUERY, (user_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        user, transactions, accounts = dashboard_cache.get(user_id, load, generation)
+        return render_template("user_dashboard.html", user=user, transactions=transactions, accounts=accounts)
     return redirect(url_for("login"))
 
 @app.route("/user/transfer", methods=["GET", "POST"])
@@ -287,6 +3897,8 @@ def transfer():
     if request.method == "POST":
         recipient = request.form.get("recipient", "").strip()
         amount_str = request.form.get("amount", "")
+        from_type = request.form.get("from_account") or DEFAULT_ACCOUNT_TYPE
+        to_type = request.form.get("to_account") or DEFAULT_ACCOUNT_TYPE
         user_id = session["user_id"]
         
         conn = None
@@ -297,60 +3909,48 @@ def transfer():
                 return redirect(url_for("transfer"))
                 
             amount = validate_amount(amount_str)
+            idempotency = request_idempotency_key()
             
             conn = get_db()
             cursor = conn.cursor()
             
             # Get sender info
-            cursor.execute("SELECT user_id, username, balance FROM users WHERE user_id=?", (user_id,))
+            cursor.execute("SELECT user_id, username FROM users WHERE user_id=?", (user_id,))
             sender = cursor.fetchone()
             
             if not sender:
                 flash("Sender account not found!", "danger")
                 return redirect(url_for("transfer"))
             
-            # Prevent self-transfer
-            if sender[1] == recipient:
-                flash("You cannot transfer money to yourself!", "warning")
+            # Prevent self-transfer (moving money between own accounts is fine)
+            if sender[1] == recipient and from_type == to_type:
+                flash("You cannot transfer money to the same account!", "warning")
                 return redirect(url_for("transfer"))
             
             # Get receiver info
-            cursor.execute("SELECT user_id, balance FROM users WHERE username=?", (recipient,))
+            cursor.execute("SELECT user_id FROM users WHERE username=?", (recipient,))
             receiver = cursor.fetchone()
             
             if not receiver:
                 flash("Recipient not found!", "danger")
                 return redirect(url_for("transfer"))
             
-            sender_balance = Decimal(str(sender[2]))
-            receiver_balance = Decimal(str(receiver[1]))
-            
-            # Check sufficient balance
-            if amount > sender_balance:
-                flash(f"Insufficient balance! Your balance: ${sender_balance:.2f}", "danger")
+            sender_acc = find_account(cursor, sender[0], from_type)
+            receiver_acc = find_account(cursor, receiver[0], to_type)
+            if sender_acc is None:
+                flash(f"You have no {from_type} account!", "danger")
+                return redirect(url_for("transfer"))
+            if receiver_acc is None:
+                flash(f"Recipient has no {to_type} account!", "danger")
                 return redirect(url_for("transfer"))
             
-            # Perform transfer with transaction
-            new_sender_balance = sender_balance - amount
-            new_receiver_balance = receiver_balance + amount
-            
-            cursor.execute("UPDATE users SET balance=? WHERE user_id=?", 
-                         (float(new_sender_balance), sender[0]))
-            cursor.execute("UPDATE users SET balance=? WHERE user_id=?", 
-                         (float(new_receiver_balance), receiver[0]))
-            
-            # Record transactions
-            egypt_now = get_egypt_time()
-            cursor.execute(
-                "INSERT INTO transactions (user_id, emp_id, trans_type, amount, trans_date) VALUES (?,NULL,'Transfer Out',?,?)",
-                (sender[0], float(amount), egypt_now)
-            )
-            cursor.execute(
-                "INSERT INTO transactions (user_id, emp_id, trans_type, amount, trans_date) VALUES (?,NULL,'Transfer In',?,?)",
-                (receiver[0], float(amount), egypt_now)
-            )
+            # Balance check and both legs happen atomically in the engine
+            try:
+                post_transfer(conn, sender_acc, receiver_acc, amount, idempotency=idempotency)
+            except InsufficientFundsError as e:
+                flash(f"Insufficient balance! Your balance: ${e.balance:.2f}", "danger")
+                return redirect(url_for("transfer"))
             
-            conn.commit()
             flash(f"Transfer successful! ${amount:.2f} sent to {recipient}", "success")
             return redirect(url_for("user_dashboard"))
             
@@ -363,36 +3963,28 @@ def transfer():
             flash("An error occurred during transfer. Please try again.", "danger")
             print(f"Transfer error: {str(e)}")
             return redirect(url_for("transfer"))
-        finally:
-            if conn:
-                conn.close()
                 
     # GET request - show transfer form
     conn = None
     try:
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT balance FROM users WHERE user_id=?", (session["user_id"],))
+        cursor.execute("SELECT balance_cents FROM users WHERE user_id=?", (session["user_id"],))
         user = cursor.fetchone()
-        balance = user[0] if user else 0
-        return render_template("transfer.html", balance=balance)
+        balance = Money(user[0]).to_decimal() if user else 0
+        accounts = list_accounts(cursor, session["user_id"])
+        return render_template("transfer.html", balance=balance, accounts=accounts, account_types=ACCOUNT_TYPES,
+                               idempotency_key=new_idempotency_key())
     except Exception as e:
         print(f"Error loading transfer page: {str(e)}")
-        return render_template("transfer.html", balance=0)
-    finally:
-        if conn:
-            conn.close()
+        return render_template("transfer.html", balance=0, accounts=[], account_types=ACCOUNT_TYPES,
+                               idempotency_key=new_idempotency_key())
 
 
 @app.route("/employee/dashboard")
 def employee_dashboard():
     if "emp_id" in session:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM employees WHERE emp_id=?", (session["emp_id"],))
-        employee = cursor.fetchone()
-        conn.close()
-        return render_template("employee_dashboard.html", employee=employee)
+        return render_template("employee_dashboard.html", employee=session.get("identity"))
     return redirect(url_for("login"))
 
 @app.route("/employee/add_customer", methods=["GET", "POST"])
@@ -415,38 +4007,19 @@ def add_customer():
         
         conn = None
         try:
-            # Validate inputs
-            if not full_name:
-                raise ValueError("Full name is required")
-            if not username:
-                raise ValueError("Username is required")
-            # Email is optional now
-            if not password:
-                raise ValueError("Password is required")
-                
-            validate_username(username)
-            if email:
-                validate_email(email)
-            validate_password(password)
-            
-            # Validate balance
-            try:
-                balance = Decimal(str(balance_str))
-                if balance < 0:
-                    raise ValueError("Initial balance cannot be negative")
-            except (InvalidOperation, ValueError):
-                raise ValueError("Invalid balance amount")
+            balance = validate_customer(full_name, username, email, password, balance_str)
             
-            hashed_password = generate_password_hash(password)
+            hashed_password = password_hasher.hash(password)
             
             conn = get_db()
             cursor = conn.cursor()
             
             cursor.execute(
-                "INSERT INTO users (username, password, full_name, email, balance) VALUES (?,?,?,?,?)",
-                (username, hashed_password, full_name, email, float(balance))
+                "INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,?)",
+                (username, hashed_password, full_name, email, balance.cents)
             )
             conn.commit()
+            unknown_usernames.discard(("user", username))
             flash(f"Customer '{username}' added successfully!", "success")
             return redirect(url_for("employee_dashboard"))
             
@@ -456,16 +4029,51 @@ def add_customer():
         except sqlite3.IntegrityError:
             flash("Username already exists!", "danger")
             return render_template("add_customer.html")
+        except HashingOverloadedError:
+            raise
         except Exception as e:
             flash("An error occurred while adding customer. Please try again.", "danger")
             print(f"Add customer error: {str(e)}")
             return render_template("add_customer.html")
-        finally:
-            if conn:
-                conn.close()
                 
     return render_template("add_customer.html")
 
+@app.route("/employee/add_customer/bulk", methods=["GET", "POST"])
+def bulk_add_customers():
+    """
+    Import many customers from an uploaded CSV or JSON Lines file.
+    
+    Returns:
+        Upload page, with the per-row import report after a POST
+    """
+    if "emp_id" not in session:
+        return redirect(url_for("login"))
+        
+    report = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Please choose a file to import.", "danger")
+            return render_template("bulk_add_customer.html", report=None)
+        fmt = request.form.get("format") or upload.filename.rsplit(".", 1)[-1].lower()
+        if fmt not in BULK_IMPORT_FORMATS:
+            flash("Unsupported file format. Use CSV or JSONL.", "danger")
+            return render_template("bulk_add_customer.html", report=None)
+        try:
+            stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig")
+            report = import_customers(get_db(), iter_customer_records(stream, fmt))
+            flash(f"Imported {report['imported']} customer(s), {report['failed']} row(s) rejected.",
+                  "success" if not report["failed"] else "warning")
+        except HashingOverloadedError:
+            raise
+        except (UnicodeDecodeError, csv.Error) as e:
+            flash(f"Could not read the file: {str(e)}", "danger")
+        except Exception as e:
+            flash("An error occurred during the import. Please try again.", "danger")
+            print(f"Bulk import error: {str(e)}")
+            
+    return render_template("bulk_add_customer.html", report=report)
+
 @app.route("/employee/transaction", methods=["GET", "POST"])
 def transaction():
     """
@@ -481,6 +4089,7 @@ def transaction():
         username = request.form.get("username", "").strip()
         amount_str = request.form.get("amount", "")
         action_type = request.form.get("action_type", "")  # "Deposit" or "Withdraw"
+        acc_type = request.form.get("account") or DEFAULT_ACCOUNT_TYPE
         
         conn = None
         try:
@@ -491,31 +4100,28 @@ def transaction():
                 raise ValueError("Invalid transaction type")
                 
             amount = validate_amount(amount_str)
+            idempotency = request_idempotency_key()
             
             conn = get_db()
             cursor = conn.cursor()
-            cursor.execute("SELECT user_id, balance FROM users WHERE username=?", (username,))
+            cursor.execute("SELECT user_id FROM users WHERE username=?", (username,))
             user = cursor.fetchone()
             
             if not user:
                 flash("Customer not found!", "danger")
                 return redirect(url_for("transaction", action=action_type))
             
-            user_id = user[0]
-            balance = Decimal(str(user[1]))
-            
-            if action_type == "Withdraw" and amount > balance:
-                flash(f"Insufficient balance! Customer balance: ${balance:.2f}", "danger")
+            acc_id = find_account(cursor, user[0], acc_type)
+            if acc_id is None:
+                flash(f"Customer has no {acc_type} account!", "danger")
                 return redirect(url_for("transaction", action=action_type))
             
-            new_balance = balance + amount if action_type == "Deposit" else balance - amount
+            try:
+                post_cash(conn, acc_id, action_type, amount, session["emp_id"], idempotency=idempotency)
+            except InsufficientFundsError as e:
+                flash(f"Insufficient balance! Customer balance: ${e.balance:.2f}", "danger")
+                return redirect(url_for("transaction", action=action_type))
             
-            cursor.execute("UPDATE users SET balance=? WHERE user_id=?", (float(new_balance), user_id))
-            cursor.execute(
-                "INSERT INTO transactions (user_id, emp_id, trans_type, amount, trans_date) VALUES (?,?,?,?,?)",
-                (user_id, session["emp_id"], action_type, float(amount), get_egypt_time())
-            )
-            conn.commit()
             flash(f"{action_type} of ${amount:.2f} successful for {username}!", "success")
             return redirect(url_for("employee_dashboard"))
             
@@ -528,13 +4134,59 @@ def transaction():
             flash("An error occurred during transaction. Please try again.", "danger")
             print(f"Transaction error: {str(e)}")
             return redirect(url_for("transaction", action=action_type))
-        finally:
-            if conn:
-                conn.close()
                 
     # GET request - show transaction form
     action_type = request.args.get("action", "Deposit")
-    return render_template("transaction.html", action_type=action_type)
+    return render_template("transaction.html", action_type=action_type, account_types=ACCOUNT_TYPES,
+                           idempotency_key=new_idempotency_key())
+
+@app.route("/employee/transaction/batch", methods=["POST"])
+def transaction_batch():
+    """
+    Apply a batch of deposits/withdrawals and return per-item results as JSON.
+    
+    Accepts either a JSON body {"postings": [{"username", "action", "amount"}],
+    "chunk_size": int, "atomic": bool} or a CSV upload (field "file") with
+    username, action and amount columns plus optional chunk_size/atomic
+    form fields.
+    
+    Returns:
+        JSON report from post_batch()
+    """
+    if "emp_id" not in session:
+        return jsonify({"error": "Employee login required"}), 401
+        
+    try:
+        if request.is_json:
+            body = request.get_json(silent=True) or {}
+            items = body.get("postings")
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise ValueError("postings must be a list of objects")
+            chunk_size = body.get("chunk_size")
+            atomic = bool(body.get("atomic", False))
+        else:
+            upload = request.files.get("file")
+            if not upload:
+                raise ValueError("Send a JSON body or a CSV file upload")
+            items = list(csv.DictReader(io.TextIOWrapper(upload.stream, encoding="utf-8-sig")))
+            chunk_size = request.form.get("chunk_size")
+            atomic = request.form.get("atomic") in ("1", "true", "on")
+        if len(items) > BATCH_POSTING_MAX_ITEMS:
+            raise ValueError(f"A batch may contain at most {BATCH_POSTING_MAX_ITEMS} postings")
+        chunk_size = int(chunk_size) if chunk_size else None
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        postings = [(str(item.get("username") or "").strip(), str(item.get("action") or "").strip(),
+                     str(item.get("amount") or "")) for item in items]
+    except (ValueError, TypeError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        report = post_batch(get_db(), postings, session["emp_id"], chunk_size=chunk_size, atomic=atomic)
+    except Exception as e:
+        print(f"Batch posting error: {str(e)}")
+        return jsonify({"error": "An error occurred while applying the batch"}), 500
+    return jsonify(report)
 
 @app.route("/employee/transfer", methods=["GET", "POST"])
 def employee_transfer():
@@ -551,6 +4203,8 @@ def employee_transfer():
         sender_username = request.form.get("sender_username", "").strip()
         recipient_username = request.form.get("recipient_username", "").strip()
         amount_str = request.form.get("amount", "")
+        sender_type = request.form.get("sender_account") or DEFAULT_ACCOUNT_TYPE
+        recipient_type = request.form.get("recipient_account") or DEFAULT_ACCOUNT_TYPE
         
         conn = None
         try:
@@ -559,16 +4213,17 @@ def employee_transfer():
                 raise ValueError("Sender username is required")
             if not recipient_username:
                 raise ValueError("Recipient username is required")
-            if sender_username == recipient_username:
+            if sender_username == recipient_username and sender_type == recipient_type:
                 raise ValueError("Cannot transfer to the same account")
                 
             amount = validate_amount(amount_str)
+            idempotency = request_idempotency_key()
             
             conn = get_db()
             cursor = conn.cursor()
-            cursor.execute("SELECT user_id, balance FROM users WHERE username=?", (sender_username,))
+            cursor.execute("SELECT user_id FROM users WHERE username=?", (sender_username,))
             sender = cursor.fetchone()
-            cursor.execute("SELECT user_id, balance FROM users WHERE username=?", (recipient_username,))
+            cursor.execute("SELECT user_id FROM users WHERE username=?", (recipient_username,))
             receiver = cursor.fetchone()
             
             if not sender:
@@ -577,35 +4232,22 @@ def employee_transfer():
             if not receiver:
                 flash("Recipient account not found!", "danger")
                 return redirect(url_for("employee_transfer"))
-                
-            sender_balance = Decimal(str(sender[1]))
-            receiver_balance = Decimal(str(receiver[1]))
             
-            if amount > sender_balance:
-                flash(f"Insufficient balance! Sender balance: ${sender_balance:.2f}", "danger")
+            sender_acc = find_account(cursor, sender[0], sender_type)
+            receiver_acc = find_account(cursor, receiver[0], recipient_type)
+            if sender_acc is None:
+                flash(f"Sender has no {sender_type} account!", "danger")
+                return redirect(url_for("employee_transfer"))
+            if receiver_acc is None:
+                flash(f"Recipient has no {recipient_type} account!", "danger")
                 return redirect(url_for("employee_transfer"))
             
-            # Perform transfer
-            new_sender_balance = sender_balance - amount
-            new_receiver_balance = receiver_balance + amount
-            
-            cursor.execute("UPDATE users SET balance=? WHERE user_id=?", 
-                         (float(new_sender_balance), sender[0]))
-            cursor.execute("UPDATE users SET balance=? WHERE user_id=?", 
-                         (float(new_receiver_balance), receiver[0]))
-            
-            # Record transactions
-            egypt_now = get_egypt_time()
-            cursor.execute(
-                "INSERT INTO transactions (user_id, emp_id, trans_type, amount, trans_date) VALUES (?,?,'Transfer Out',?,?)",
-                (sender[0], session["emp_id"], float(amount), egypt_now)
-            )
-            cursor.execute(
-                "INSERT INTO transactions (user_id, emp_id, trans_type, amount, trans_date) VALUES (?,?,'Transfer In',?,?)",
-                (receiver[0], session["emp_id"], float(amount), egypt_now)
-            )
+            try:
+                post_transfer(conn, sender_acc, receiver_acc, amount, emp_id=session["emp_id"], idempotency=idempotency)
+            except InsufficientFundsError as e:
+                flash(f"Insufficient balance! Sender balance: ${e.balance:.2f}", "danger")
+                return redirect(url_for("employee_transfer"))
             
-            conn.commit()
             flash(f"Transfer successful! ${amount:.2f} from {sender_username} to {recipient_username}", "success")
             return redirect(url_for("employee_dashboard"))
             
@@ -618,21 +4260,20 @@ def employee_transfer():
             flash("An error occurred during transfer. Please try again.", "danger")
             print(f"Employee transfer error: {str(e)}")
             return redirect(url_for("employee_transfer"))
-        finally:
-            if conn:
-                conn.close()
                 
-    return render_template("employee_transfer.html")
+    return render_template("employee_transfer.html", account_types=ACCOUNT_TYPES, idempotency_key=new_idempotency_key())
 
 @app.route("/employee/search_customer", methods=["GET", "POST"])
 def search_customer():
     if "emp_id" not in session:
         return redirect(url_for("login"))
     customer = None
-    transactions = None
-    if request.method == "POST":
-        search_term = request.form["search_term"]
-        conn = get_db()
+    page = None
+    accounts = []
+    matches = []
+    search_term = request.values.get("search_term", "").strip()
+    if search_term:
+        conn = get_read_db()
         cursor = conn.cursor()
         try:
             # Try to search by user_id (integer)
@@ -642,24 +4283,66 @@ def search_customer():
             # Search by username (string)
             cursor.execute("SELECT * FROM users WHERE username=?", (search_term,))
         customer = cursor.fetchone()
-        if customer:
-            cursor.execute("SELECT * FROM transactions WHERE user_id=? ORDER BY trans_date DESC", (customer[0],))
-            transactions = cursor.fetchall()
-        conn.close()
         if not customer:
+            # Not an exact id/username: rank prefix and near-miss matches
+            matches = search_customers(conn, search_term)
+            if len(matches) == 1:
+                cursor.execute("SELECT * FROM users WHERE user_id=?", (matches[0][0],))
+                customer = cursor.fetchone()
+                matches = []
+        if customer:
+            filters = history_filters_from_request()
+            page = fetch_transactions_page(cursor, filters, user_id=customer[0])
+            accounts = list_accounts(cursor, customer[0])
+        elif not matches:
             flash("Customer not found!")
-    return render_template("search_customer.html", customer=customer, transactions=transactions)
+    return render_template("search_customer.html", customer=customer, search_term=search_term,
+                           matches=matches, accounts=accounts, account_types=ACCOUNT_TYPES,
+                           transactions=page["rows"] if page else None, page=page,
+                           page_args={"search_term": search_term, **filter_link_args(filters)} if page else {})
+
+@app.route("/employee/search_customer/suggest")
+def suggest_customers():
+    """Typeahead for the search box: ranked matches for ?q= as JSON."""
+    if "emp_id" not in session:
+        return jsonify({"error": "Employee login required"}), 401
+    query = request.args.get("q", "").strip()
+    matches = search_customers(get_read_db(), query) if len(query) >= 2 else []
+    return jsonify([
+        {"user_id": row[0], "username": row[1], "full_name": row[2], "email": row[3]} for row in matches
+    ])
 
+@app.route("/employee/open_account", methods=["POST"])
+def open_customer_account():
+    """
+    Open an additional account (e.g. savings) for a customer.
+    
+    Returns:
+        Redirect back to the customer's search page
+    """
+    if "emp_id" not in session:
+        return redirect(url_for("login"))
+    
+    username = request.form.get("username", "").strip()
+    acc_type = request.form.get("acc_type", "")
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM users WHERE username=?", (username,))
+    user = cursor.fetchone()
+    if not user:
+        flash("Customer not found!", "danger")
+        return redirect(url_for("search_customer"))
+    try:
+        open_account(conn, user[0], acc_type)
+        flash(f"Opened a {acc_type} account for {username}", "success")
+    except ValueError as e:
+        flash(str(e), "danger")
+    return redirect(url_for("search_customer", search_term=username))
 
 @app.route("/admin/dashboard")
 def admin_dashboard():
     if "admin_id" in session:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM admins WHERE admin_id=?", (session["admin_id"],))
-        admin = cursor.fetchone()
-        conn.close()
-        return render_template("admin_dashboard.html", admin=admin)
+        return render_template("admin_dashboard.html", admin=session.get("identity"))
     return redirect(url_for("login"))
 
 @app.route("/admin/manage_employees", methods=["GET", "POST"])
@@ -672,13 +4355,14 @@ def manage_employees():
         action = request.form.get("action")
         if action == "add":
             username = request.form["username"]
-            password = generate_password_hash(request.form["password"])
+            password = password_hasher.hash(request.form["password"])
             full_name = request.form["full_name"]
             role = request.form["role"]
             try:
                 cursor.execute("INSERT INTO employees (username, password, full_name, role) VALUES (?,?,?,?)",
                              (username, password, full_name, role))
                 conn.commit()
+                unknown_usernames.discard(("employee", username))
                 flash("Employee added successfully!")
             except sqlite3.IntegrityError:
                 flash("Username already exists!")
@@ -687,22 +4371,23 @@ def manage_employees():
             full_name = request.form["full_name"]
             role = request.form["role"]
             if request.form.get("password"):
-                password = generate_password_hash(request.form["password"])
+                password = password_hasher.hash(request.form["password"])
                 cursor.execute("UPDATE employees SET full_name=?, role=?, password=? WHERE emp_id=?",
                              (full_name, role, password, emp_id))
             else:
                 cursor.execute("UPDATE employees SET full_name=?, role=? WHERE emp_id=?",
                              (full_name, role, emp_id))
             conn.commit()
+            session_store.revoke("employee", emp_id)  # Role and name apply from the next login
             flash("Employee updated successfully!")
         elif action == "delete":
             emp_id = request.form["emp_id"]
             cursor.execute("DELETE FROM employees WHERE emp_id=?", (emp_id,))
             conn.commit()
+            session_store.revoke("employee", emp_id)
             flash("Employee deleted successfully!")
     cursor.execute("SELECT * FROM employees")
     employees = cursor.fetchall()
-    conn.close()
     return render_template("manage_employees.html", employees=employees)
 
 @app.route("/admin/reports")
@@ -710,18 +4395,22 @@ def reports():
     if "admin_id" not in session:
         return redirect(url_for("login"))
     report_type = request.args.get("type", "transactions")
-    conn = get_db()
+    conn = get_read_db()
     cursor = conn.cursor()
     
+    page = None
+    filters = None
+    group = None
     if report_type == "transactions":
-        cursor.execute("""
-            SELECT t.*, u.username as user_name, e.username as emp_name 
-            FROM transactions t 
-            LEFT JOIN users u ON t.user_id = u.user_id 
-            LEFT JOIN employees e ON t.emp_id = e.emp_id 
-            ORDER BY t.trans_date DESC
-        """)
-        data = cursor.fetchall()
+        filters = history_filters_from_request()
+        page = fetch_transactions_page(cursor, filters, columns=REPORT_HISTORY_COLUMNS, joins=HISTORY_NAME_JOINS)
+        data = page["rows"]
+    elif report_type == "summary":
+        group = request.args.get("group", "day")
+        if group not in SUMMARY_GROUPS:
+            group = "day"
+        filters = history_filters_from_request()
+        data = fetch_summary(cursor, group, filters["date_from"], filters["date_to"])
     elif report_type == "users":
         cursor.execute("SELECT * FROM users ORDER BY user_id")
         data = cursor.fetchall()
@@ -731,26 +4420,329 @@ def reports():
     else:
         data = []
     
-    conn.close()
-    return render_template("reports.html", report_type=report_type, data=data)
+    export_args = {"type": report_type, **(filter_link_args(filters) if filters else {})}
+    return render_template("reports.html", report_type=report_type, data=data, page=page, export_args=export_args,
+                           filters=filters, page_args=export_args if filters else {},
+                           transaction_types=TRANSACTION_TYPES, summary_group=group)
+
+@app.route("/admin/reports/export")
+def export_report():
+    """
+    Stream a report as a CSV or JSON Lines download.
+    
+    Accepts the same filters as the transactions report plus format
+    (csv or jsonl) and gzip=1 for a compressed download.
+    
+    Returns:
+        Streaming file response, or redirect to reports on invalid input
+    """
+    if "admin_id" not in session:
+        return redirect(url_for("login"))
+    report_type = request.args.get("type", "transactions")
+    fmt = request.args.get("format", "csv")
+    compress = request.args.get("gzip") == "1"
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError("Invalid export format")
+        filters = parse_history_filters(request.args)
+        cursor = get_read_db().cursor()
+        sql, params, columns = export_query(cursor, report_type, filters)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("reports", type=report_type))
+    
+    cursor.execute(sql, params)
+    body = iter_export(cursor, columns, fmt)
+    filename = f"{report_type}_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    if compress:
+        body = gzip_stream(body)
+        filename += ".gz"
+    response = Response(stream_with_context(body),
+                        mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 @app.route("/admin/view_transactions")
 def view_transactions():
     if "admin_id" not in session:
         return redirect(url_for("login"))
+    conn = get_read_db()
+    cursor = conn.cursor()
+    filters = history_filters_from_request()
+    page = fetch_transactions_page(cursor, filters, columns=ADMIN_HISTORY_COLUMNS, joins=HISTORY_NAME_JOINS)
+    return render_template("view_transactions.html", transactions=page["rows"], page=page,
+                           filters=filters, page_args=filter_link_args(filters),
+                           transaction_types=TRANSACTION_TYPES)
+
+@app.route("/admin/metrics")
+def admin_metrics():
+    """Request, SQL, pool and posting metrics in Prometheus text format."""
+    if "admin_id" not in session:
+        return redirect(url_for("login"))
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+# ---------------------------
+# JSON API (/api/v1)
+# ---------------------------
+class ApiError(Exception):
+    """An API failure, returned to the client as {"error": message} with an HTTP status."""
+    
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": str(error)}), error.status
+
+def api_body():
+    """
+    The request's JSON object.
+    
+    Requiring a JSON content type also keeps cross-site HTML forms (which
+    cannot send one) from posting with the session cookie.
+    
+    Raises:
+        ApiError: 415 if the body is not JSON, 400 if it is not an object
+    """
+    if not request.is_json:
+        raise ApiError("Send a JSON body (Content-Type: application/json)", 415)
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError("The JSON body must be an object")
+    return body
+
+def api_field(body, name, default=""):
+    """A body field as a stripped string (JSON numbers are accepted for amounts)."""
+    value = body.get(name)
+    return default if value is None else str(value).strip()
+
+def api_role():
+    """
+    The logged-in role allowed to use the customer API.
+    
+    Returns:
+        str: "user" or "employee"
+        
+    Raises:
+        ApiError: 401 without a customer or employee session
+    """
+    if "user_id" in session:
+        return "user"
+    if "emp_id" in session:
+        return "employee"
+    raise ApiError("Login required", 401)
+
+def api_customer_id(cursor, username):
+    """
+    Resolve a customer username for the API.
+    
+    Raises:
+        ApiError: 400 if username is empty, 404 if there is no such customer
+    """
+    if not username:
+        raise ApiError("Customer username is required")
+    cursor.execute("SELECT user_id FROM users WHERE username=?", (username,))
+    row = cursor.fetchone()
+    if not row:
+        raise ApiError("Customer not found", 404)
+    return row[0]
+
+def api_account(cursor, user_id, acc_type, owner):
+    """Resolve a customer's account of acc_type, or fail with a 404 naming owner."""
+    acc_id = find_account(cursor, user_id, acc_type)
+    if acc_id is None:
+        raise ApiError(f"{owner} has no {acc_type} account", 404)
+    return acc_id
+
+def api_posting(post, *args, **kwargs):
+    """
+    Run a posting-engine call and translate its failures into ApiErrors.
+    
+    Returns:
+        Whatever post() returns
+        
+    Raises:
+        ApiError: 409 for insufficient funds, 404 for a missing account,
+            422 for an idempotency key reused with a different posting,
+            400 for any other validation error, 500 otherwise
+    """
+    try:
+        return post(*args, **kwargs)
+    except InsufficientFundsError as e:
+        raise ApiError(f"Insufficient balance: {e.balance:.2f}", 409)
+    except AccountNotFoundError as e:
+        raise ApiError(str(e), 404)
+    except IdempotencyKeyReusedError as e:
+        raise ApiError(str(e), 422)
+    except ValueError as e:
+        raise ApiError(str(e))
+    except Exception as e:
+        print(f"API posting error: {str(e)}")
+        raise ApiError("An error occurred while posting. Please try again.", 500)
+
+def transaction_json(row):
+    """One TRANSACTION_COLUMNS row as a JSON object."""
+    return {
+        "trans_id": row[0],
+        "user_id": row[1],
+        "emp_id": row[2],
+        "type": row[3],
+        "amount": str(Money(row[4])),
+        "date": row[5],
+    }
+
+@app.route(f"{API_PREFIX}/login", methods=["POST"])
+def api_login():
+    """
+    Start a session for API calls; the response sets the same cookie as the login form.
+    
+    Body: {"username", "password", "user_type": "user" | "employee" | "admin"}
+    """
+    body = api_body()
+    username = api_field(body, "username")
+    password = body.get("password") or ""
+    user_type = api_field(body, "user_type", "user")
+    if not username or not isinstance(password, str) or not password:
+        raise ApiError("username and password are required")
+    if user_type not in LOGIN_ROLES:
+        raise ApiError("Invalid user type")
+    
+    table, id_column, _, _ = LOGIN_ROLES[user_type]
+    conn = get_db()
+    try:
+        account = lookup_credentials(conn, user_type, username)
+        valid = account and verify_login_password(conn, table, id_column, account[0], account[1], password)
+    except HashingOverloadedError:
+        return jsonify({"error": "The server is busy. Please try again in a moment."}), 503, {"Retry-After": "1"}
+    if not valid:
+        raise ApiError("Invalid username or password", 401)
+    start_session(user_type, account, username)
+    return jsonify({"role": user_type, "id": account[0], "full_name": account[2]})
+
+@app.route(f"{API_PREFIX}/logout", methods=["POST"])
+def api_logout():
+    session.clear()
+    return jsonify({"status": "ok"})
+
+@app.route(f"{API_PREFIX}/balance")
+def api_balance():
+    """
+    Balances of the logged-in customer, or of ?username= for employees.
+    
+    Returns:
+        JSON: user_id, username, total balance and per-account balances
+    """
+    role = api_role()
+    cursor = get_db().cursor()
+    if role == "user":
+        user_id = session["user_id"]
+    else:
+        user_id = api_customer_id(cursor, request.args.get("username", "").strip())
+    cursor.execute("SELECT user_id, username, balance_cents FROM users WHERE user_id=?", (user_id,))
+    user = cursor.fetchone()
+    if not user:
+        raise ApiError("Customer not found", 404)
+    return jsonify({
+        "user_id": user[0],
+        "username": user[1],
+        "balance": str(Money(user[2])),
+        "accounts": [
+            {"acc_id": acc_id, "type": acc_type, "balance": str(Money(cents))}
+            for acc_id, acc_type, cents in list_accounts(cursor, user_id)
+        ],
+    })
+
+@app.route(f"{API_PREFIX}/transactions")
+def api_transactions():
+    """
+    One page of transaction history, newest first.
+    
+    Accepts the history filters of parse_history_filters() (page_size,
+    date_from, date_to, trans_type, after/before cursors). Customers always
+    get their own history; employees may pass user= to pick a customer.
+    
+    Returns:
+        JSON: transactions plus next_cursor/prev_cursor for the adjacent pages
+    """
+    role = api_role()
+    try:
+        filters = parse_history_filters(request.args)
+    except ValueError as e:
+        raise ApiError(str(e))
+    cursor = get_read_db().cursor()
+    page = fetch_transactions_page(cursor, filters, user_id=session["user_id"] if role == "user" else None)
+    return jsonify({
+        "transactions": [transaction_json(row) for row in page["rows"]],
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"],
+    })
+
+@app.route(f"{API_PREFIX}/transfer", methods=["POST"])
+def api_transfer():
+    """
+    Transfer money between customer accounts.
+    
+    Body: {"recipient", "amount", "from_account", "to_account"}; employees
+    also send "sender" (customers always send from their own accounts).
+    An Idempotency-Key header makes retries safe: a repeated key returns
+    the original trans_ids.
+    
+    Returns:
+        JSON: the Transfer Out/Transfer In trans_ids (201)
+    """
+    role = api_role()
+    body = api_body()
+    from_type = api_field(body, "from_account") or DEFAULT_ACCOUNT_TYPE
+    to_type = api_field(body, "to_account") or DEFAULT_ACCOUNT_TYPE
+    try:
+        amount = validate_amount(api_field(body, "amount"))
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        raise ApiError(str(e))
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    if role == "user":
+        sender_id, emp_id = session["user_id"], None
+    else:
+        sender_id, emp_id = api_customer_id(cursor, api_field(body, "sender")), session["emp_id"]
+    receiver_id = api_customer_id(cursor, api_field(body, "recipient"))
+    sender_acc = api_account(cursor, sender_id, from_type, "Sender")
+    receiver_acc = api_account(cursor, receiver_id, to_type, "Recipient")
+    
+    trans_out, trans_in = api_posting(post_transfer, conn, sender_acc, receiver_acc, amount, emp_id=emp_id,
+                                      idempotency=idempotency)
+    return jsonify({"status": "ok", "amount": str(amount), "trans_ids": [trans_out, trans_in]}), 201
+
+@app.route(f"{API_PREFIX}/deposit", methods=["POST"], defaults={"action_type": "Deposit"})
+@app.route(f"{API_PREFIX}/withdraw", methods=["POST"], defaults={"action_type": "Withdraw"})
+def api_cash(action_type):
+    """
+    Teller deposit or withdrawal (employees only).
+    
+    Body: {"username", "amount", "account"}; honours Idempotency-Key
+    like api_transfer().
+    
+    Returns:
+        JSON: the trans_id of the posting (201)
+    """
+    if api_role() != "employee":
+        raise ApiError("Employee login required", 403)
+    body = api_body()
+    acc_type = api_field(body, "account") or DEFAULT_ACCOUNT_TYPE
+    try:
+        amount = validate_amount(api_field(body, "amount"))
+        idempotency = request_idempotency_key()
+    except ValueError as e:
+        raise ApiError(str(e))
+    
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT t.*, u.username as user_name, u.full_name as user_full_name, 
-               e.username as emp_name, e.full_name as emp_full_name 
-        FROM transactions t 
-        LEFT JOIN users u ON t.user_id = u.user_id 
-        LEFT JOIN employees e ON t.emp_id = e.emp_id 
-        ORDER BY t.trans_date DESC
-    """)
-    transactions = cursor.fetchall()
-    conn.close()
-    return render_template("view_transactions.html", transactions=transactions)
+    user_id = api_customer_id(cursor, api_field(body, "username"))
+    acc_id = api_account(cursor, user_id, acc_type, "Customer")
+    trans_id = api_posting(post_cash, conn, acc_id, action_type, amount, session["emp_id"], idempotency=idempotency)
+    return jsonify({"status": "ok", "type": action_type, "amount": str(amount), "trans_id": trans_id}), 201
 
 # ---------------------------
 # Logout
@@ -761,4 +4753,5 @@ def logout():
     return redirect(url_for("login"))
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Development server; production runs serve.py (or asgi.py)
+    app.run(debug=DEBUG)
@@ -0,0 +1,66 @@
+"""
+ASGI entry point for the banking app.
+
+The views stay synchronous Flask code (the database drivers block), so this
+is the WSGI app behind an ASGI adapter, not an async rewrite. asgiref's
+WsgiToAsgi runs the app through sync_to_async in thread-sensitive mode,
+which by default puts every request of a process on one shared thread.
+Here each request enters its own ThreadSensitiveContext, so it gets a
+thread of its own, and at most BANK_ASGI_THREADS requests run at once per
+process: the same concurrency as serve.py --threads, sized to the
+connection pool (DB_POOL_SIZE) by default. Only public asgiref API is used.
+
+A request takes its slot once its body has been read, so slow uploads wait
+on the event loop without holding one. Responses are written from the
+view's thread, so a client reading a large response (a CSV export) slowly
+still holds its slot, as it would under serve.py.
+
+Usage:
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:application --workers 4
+"""
+import asyncio
+import os
+
+try:
+    from asgiref.sync import ThreadSensitiveContext
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise ImportError("Serving over ASGI needs asgiref: pip install -r requirements-asgi.txt") from e
+
+from app import DB_POOL_SIZE, app
+
+ASGI_THREADS = int(os.environ.get("BANK_ASGI_THREADS", DB_POOL_SIZE))  # Requests served at once per process
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """
+    WsgiToAsgi that runs each request on its own thread, at most max_threads at a time.
+
+    Args:
+        wsgi_application: The WSGI app
+        max_threads: Requests running view code at once
+    """
+
+    def __init__(self, wsgi_application, max_threads=ASGI_THREADS):
+        super().__init__(wsgi_application)
+        self._slots = asyncio.Semaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        acquired = False
+
+        async def receive_body():
+            # The adapter calls the view right after the last body message
+            nonlocal acquired
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body") and not acquired:
+                await self._slots.acquire()
+                acquired = True
+            return message
+        try:
+            async with ThreadSensitiveContext():
+                await super().__call__(scope, receive_body, send)
+        finally:
+            if acquired:
+                self._slots.release()
+
+application = PooledWsgiToAsgi(app)
@@ -0,0 +1,381 @@
+"""
+Append-only binary audit log of committed postings.
+
+Every row the posting engine writes to `transactions` is also appended here
+as one fixed-width 56-byte record, so compliance scans and replays read a
+flat file instead of competing with live traffic for the database.
+
+Layout (little-endian):
+
+    segment header   64 bytes: magic, format version, record size,
+                     segment number, creation time, CRC-32 of the header
+    record           56 bytes: trans_id, entry_id, acc_id (u64),
+                     user_id, emp_id (u32, 0 = none), amount_cents,
+                     timestamp (i64), type code (u8), CRC-32 of the record
+
+The timestamp is trans_date ("YYYY-MM-DD HH:MM:SS", wall-clock time as
+stored) counted in seconds from 1970-01-01 00:00:00, so it converts back to
+the identical string. Segments are named audit-000001.log, audit-000002.log,
+... and a new one is started once the current one reaches segment_bytes.
+
+Writers from several processes share the directory: each append takes an
+flock on audit.lock, so records never interleave and only one process
+rotates. Records are appended after their transaction commits and are not
+fsynced, so a crash can lose the last few; `scripts/audit_log_tool.py sync`
+appends whatever `transactions` has that the log lacks.
+
+Readers mmap a segment. iter_segment() decodes it with Struct.iter_unpack
+and checks each record's CRC unless asked not to; a torn record at the end
+of the newest segment (a crash mid-write) is reported, not fatal.
+segment_columns() instead exposes each field as a strided memoryview over
+the mapping: every field sits at a fixed offset that is a multiple of its
+width, so sums, counts and filters over a column run at C speed without
+building a tuple per record.
+"""
+import calendar
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process
+    fcntl = None
+
+MAGIC = b"BANKAUDT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIq36x")        # + CRC-32 = 64 bytes
+RECORD = struct.Struct("<QQQIIqqB3x")       # + CRC-32 = 56 bytes
+CRC = struct.Struct("<I")
+HEADER_SIZE = HEADER.size + CRC.size
+RECORD_SIZE = RECORD.size + CRC.size
+FULL_RECORD = struct.Struct(RECORD.format + "I")
+
+# Field -> (memoryview format, index of the field in a record viewed as that format)
+COLUMNS = {
+    "trans_id": ("Q", 0), "entry_id": ("Q", 1), "acc_id": ("Q", 2),
+    "user_id": ("I", 6), "emp_id": ("I", 7),
+    "amount_cents": ("q", 4), "timestamp": ("q", 5),
+    "type": ("B", RECORD.size - 4), "crc": ("I", RECORD.size // CRC.size),
+}
+
+SEGMENT_PATTERN = re.compile(r"^audit-(\d{6,})\.log$")
+LOCK_NAME = "audit.lock"
+
+# Type codes are part of the file format: never renumber, only append
+TYPE_CODES = {"Deposit": 1, "Withdraw": 2, "Transfer In": 3, "Transfer Out": 4}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Signed effect of each type code on the customer's balance
+TYPE_SIGNS = {1: 1, 2: -1, 3: 1, 4: -1}
+
+class AuditLogError(Exception):
+    """Raised for a segment that is not an audit log or a corrupt record."""
+
+# ---------------------------
+# Encoding
+# ---------------------------
+@lru_cache(maxsize=4096)
+def to_timestamp(trans_date):
+    """Seconds since 1970-01-01 for a "YYYY-MM-DD HH:MM:SS" string (no timezone applied)."""
+    return calendar.timegm(time.strptime(str(trans_date)[:19], "%Y-%m-%d %H:%M:%S"))
+
+def from_timestamp(seconds):
+    """Inverse of to_timestamp()."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+def pack_record(trans_id, entry_id, acc_id, user_id, emp_id, trans_type, amount_cents, trans_date):
+    """
+    Encode one transactions row as a record of RECORD_SIZE bytes (RECORD plus its CRC-32).
+
+    Missing ids (None) are stored as 0.
+
+    Raises:
+        KeyError: If trans_type has no type code
+    """
+    body = RECORD.pack(trans_id, entry_id or 0, acc_id or 0, user_id or 0, emp_id or 0,
+                       amount_cents, to_timestamp(trans_date), TYPE_CODES[trans_type])
+    return body + CRC.pack(zlib.crc32(body))
+
+def to_row(record):
+    """
+    Turn a decoded record back into a transactions row.
+
+    Returns:
+        tuple: (trans_id, user_id, emp_id, trans_type, amount_cents, trans_date, acc_id, entry_id)
+    """
+    trans_id, entry_id, acc_id, user_id, emp_id, cents, timestamp, code = record[:8]
+    return (trans_id, user_id or None, emp_id or None, TYPE_NAMES[code], cents, from_timestamp(timestamp),
+            acc_id or None, entry_id or None)
+
+def _pack_header(number):
+    body = HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, number, int(time.time()))
+    return body + CRC.pack(zlib.crc32(body))
+
+def segment_name(number):
+    return f"audit-{number:06d}.log"
+
+def segments(directory):
+    """
+    Segment files of a log directory, oldest first.
+
+    Returns:
+        list: (segment number, path) tuples
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+# ---------------------------
+# Writer
+# ---------------------------
+class AuditLog:
+    """
+    Appends records to the newest segment of a log directory.
+
+    Args:
+        directory: Where the segments live (created on first append)
+        segment_bytes: Size after which a new segment is started
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = max(segment_bytes, HEADER_SIZE + RECORD_SIZE)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_fd = None
+        self._fd = None
+        self._number = 0
+        self._stats = {"records": 0, "bytes": 0, "rotations": 0}
+
+    def append(self, rows):
+        """
+        Append transactions rows (see pack_record() for the field order).
+
+        Args:
+            rows: Iterable of (trans_id, entry_id, acc_id, user_id, emp_id,
+                  trans_type, amount_cents, trans_date) tuples
+
+        Returns:
+            int: Records written
+        """
+        data = b"".join(pack_record(*row) for row in rows)
+        if not data:
+            return 0
+        with self._lock:
+            self._open()
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._follow()
+                if os.fstat(self._fd).st_size + len(data) > self.segment_bytes:
+                    self._rotate()
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            self._stats["records"] += len(data) // RECORD_SIZE
+            self._stats["bytes"] += len(data)
+        return len(data) // RECORD_SIZE
+
+    def _open(self):
+        """Open the lock file and newest segment (again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = None
+        self._number = 0
+        self._pid = os.getpid()
+
+    def _follow(self):
+        """Switch to the newest segment, creating the first one; called under the flock."""
+        if self._fd is not None and not os.path.exists(os.path.join(self.directory, segment_name(self._number + 1))):
+            return
+        existing = segments(self.directory)
+        if not existing:
+            self._create(1)
+            return
+        number, path = existing[-1]
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        self._number = number
+        if os.fstat(self._fd).st_size == 0:  # Created by a process that died before the header
+            os.write(self._fd, _pack_header(number))
+
+    def _create(self, number):
+        fd = os.open(os.path.join(self.directory, segment_name(number)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size == 0:
+            os.write(fd, _pack_header(number))
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd, self._number = fd, number
+
+    def _rotate(self):
+        """Start the next segment; the previous one is fsynced so sealed segments are complete."""
+        os.fsync(self._fd)
+        self._create(self._number + 1)
+        self._stats["rotations"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for fd in (self._fd, self._lock_fd):
+                    if fd is not None:
+                        os.close(fd)
+            self._pid = self._fd = self._lock_fd = None
+
+    def stats(self):
+        """
+        Snapshot of writer counters for this process.
+
+        Returns:
+            dict: records, bytes and rotations
+        """
+        with self._lock:
+            return dict(self._stats)
+
+# ---------------------------
+# Reader
+# ---------------------------
+def read_header(buffer, path="segment"):
+    """
+    Validate a segment header.
+
+    Returns:
+        int: Segment number
+
+    Raises:
+        AuditLogError: If the header is missing, corrupt or of another format
+    """
+    if len(buffer) < HEADER_SIZE:
+        raise AuditLogError(f"{path}: missing header")
+    magic, version, record_size, number, _ = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise AuditLogError(f"{path}: not an audit log segment")
+    if CRC.unpack_from(buffer, HEADER.size)[0] != zlib.crc32(buffer[:HEADER.size]):
+        raise AuditLogError(f"{path}: header checksum mismatch")
+    if version != FORMAT_VERSION or record_size != RECORD_SIZE:
+        raise AuditLogError(f"{path}: unsupported format version {version} (record size {record_size})")
+    return number
+
+def iter_segment(path, check=True, errors=None):
+    """
+    Yield the records of one segment.
+
+    Records are (trans_id, entry_id, acc_id, user_id, emp_id, amount_cents,
+    timestamp, type code, crc) tuples straight from Struct.iter_unpack.
+
+    Args:
+        path: Segment file
+        check: Verify each record's CRC (scans are several times faster without)
+        errors: List that receives (path, offset, message) for corrupt or torn
+                records, which are then skipped; without it they raise
+
+    Raises:
+        AuditLogError: Bad header, or a bad record when errors is None
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            body = records = None
+            try:
+                read_header(view, path)
+                end = HEADER_SIZE + (size - HEADER_SIZE) // RECORD_SIZE * RECORD_SIZE
+                body = view[HEADER_SIZE:end]
+                records = FULL_RECORD.iter_unpack(body)
+                if not check:
+                    yield from records
+                else:
+                    crc32 = zlib.crc32
+                    offset = HEADER_SIZE
+                    for record in records:
+                        if crc32(view[offset:offset + RECORD.size]) == record[8]:
+                            yield record
+                        elif errors is None:
+                            raise AuditLogError(f"{path}: checksum mismatch at offset {offset}")
+                        else:
+                            errors.append((path, offset, "checksum mismatch"))
+                        offset += RECORD_SIZE
+                if end != size:
+                    if errors is None:
+                        raise AuditLogError(f"{path}: torn record at offset {end} ({size - end} bytes)")
+                    errors.append((path, end, f"torn record ({size - end} bytes)"))
+            finally:
+                # The mmap cannot close while a view of it is still exported
+                records = None
+                if body is not None:
+                    body.release()
+                view.release()
+
+def iter_records(directory, check=True, errors=None):
+    """Yield the records of every segment in a log directory, oldest segment first."""
+    for _, path in segments(directory):
+        yield from iter_segment(path, check=check, errors=errors)
+
+@contextmanager
+def segment_columns(path):
+    """
+    Map one segment and expose each record field as a column.
+
+    Columns are zero-copy strided memoryviews (lists on big-endian hosts),
+    keyed like COLUMNS and all of the same length. They are only valid
+    inside the with block. CRCs are not checked and a torn last record is
+    left out: run iter_segment() with check=True to validate a segment.
+
+    Yields:
+        dict: column name -> sequence of ints
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER_SIZE + RECORD_SIZE:
+            if size:
+                read_header(f.read(HEADER_SIZE), path)
+            yield {name: [] for name in COLUMNS}
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            views = [memoryview(mapped)]
+            try:
+                read_header(views[0], path)
+                end = HEADER_SIZE + (size - HEADER_SIZE) // RECORD_SIZE * RECORD_SIZE
+                body = views[0][HEADER_SIZE:end]
+                views.append(body)
+                if sys.byteorder != "little":
+                    fields = list(zip(*FULL_RECORD.iter_unpack(body)))
+                    yield {name: list(fields[i]) for i, name in enumerate(
+                        ("trans_id", "entry_id", "acc_id", "user_id", "emp_id", "amount_cents", "timestamp",
+                         "type", "crc"))}
+                    return
+                casts = {}
+                columns = {}
+                for name, (fmt, index) in COLUMNS.items():
+                    if fmt not in casts:
+                        casts[fmt] = body.cast(fmt)
+                        views.append(casts[fmt])
+                    columns[name] = casts[fmt][index::RECORD_SIZE // casts[fmt].itemsize]
+                    views.append(columns[name])
+                yield columns
+            finally:
+                # The mmap cannot close while a view of it is still exported
+                for view in reversed(views):
+                    view.release()
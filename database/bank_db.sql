@@ -10,7 +10,9 @@ CREATE TABLE users (
     password VARCHAR(255) NOT NULL,
     full_name VARCHAR(100),
     email VARCHAR(100),
-    balance DECIMAL(10,2) DEFAULT 0.0
+    balance_cents BIGINT NOT NULL DEFAULT 0,
+    opening_balance_cents BIGINT NOT NULL DEFAULT 0,
+    dashboard_generation BIGINT NOT NULL DEFAULT 0
 );
 
 -- Employees (bank staff)
@@ -35,8 +37,34 @@ CREATE TABLE accounts (
     acc_id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT,
     acc_type VARCHAR(50),
-    balance DECIMAL(10,2) DEFAULT 0.0,
-    FOREIGN KEY(user_id) REFERENCES users(user_id)
+    balance_cents BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY(user_id) REFERENCES users(user_id),
+    UNIQUE KEY idx_accounts_user_type (user_id, acc_type)
+);
+
+-- System cash accounts: teller postings are spread over the shards by
+-- emp_id (mirrors SQLite migrations 8 and 12)
+INSERT INTO accounts (user_id, acc_type, balance_cents) VALUES
+    (NULL, 'cash', 0), (NULL, 'cash-1', 0), (NULL, 'cash-2', 0), (NULL, 'cash-3', 0),
+    (NULL, 'cash-4', 0), (NULL, 'cash-5', 0), (NULL, 'cash-6', 0), (NULL, 'cash-7', 0);
+
+-- Double-entry journal (mirrors SQLite migration 8)
+CREATE TABLE journal_entries (
+    entry_id INT AUTO_INCREMENT PRIMARY KEY,
+    entry_type VARCHAR(50) NOT NULL,
+    emp_id INT,
+    created_at TIMESTAMP NOT NULL,
+    FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+);
+
+CREATE TABLE ledger_legs (
+    leg_id INT AUTO_INCREMENT PRIMARY KEY,
+    entry_id INT NOT NULL,
+    acc_id INT NOT NULL,
+    amount_cents BIGINT NOT NULL,
+    FOREIGN KEY(entry_id) REFERENCES journal_entries(entry_id),
+    FOREIGN KEY(acc_id) REFERENCES accounts(acc_id),
+    INDEX idx_ledger_legs_acc (acc_id, entry_id)
 );
 
 -- Transactions
@@ -45,8 +73,59 @@ CREATE TABLE transactions (
     user_id INT,
     emp_id INT,
     trans_type VARCHAR(50),
-    amount DECIMAL(10,2),
+    amount_cents BIGINT NOT NULL,
     trans_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    acc_id INT,
+    entry_id INT,
     FOREIGN KEY(user_id) REFERENCES users(user_id),
-    FOREIGN KEY(emp_id) REFERENCES employees(emp_id)
+    FOREIGN KEY(emp_id) REFERENCES employees(emp_id),
+    FOREIGN KEY(acc_id) REFERENCES accounts(acc_id),
+    FOREIGN KEY(entry_id) REFERENCES journal_entries(entry_id)
+);
+
+-- Indexes for history lookups (mirror SQLite migrations 2-5)
+CREATE INDEX idx_transactions_user_date_id ON transactions (user_id, trans_date, trans_id);
+CREATE INDEX idx_transactions_emp_date ON transactions (emp_id, trans_date);
+CREATE INDEX idx_transactions_date ON transactions (trans_date);
+
+-- Daily rollup maintained with every posting (mirrors SQLite migration 6)
+CREATE TABLE daily_summary (
+    day DATE NOT NULL,
+    scope VARCHAR(10) NOT NULL,
+    scope_id INT NOT NULL,
+    trans_type VARCHAR(50) NOT NULL,
+    trans_count INT NOT NULL DEFAULT 0,
+    total_cents BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, day, trans_type)
+);
+CREATE INDEX idx_daily_summary_scope_day ON daily_summary (scope, day);
+
+-- Incremental reconciliation state (mirrors SQLite migration 9)
+CREATE TABLE reconciliation_checkpoints (
+    user_id INT PRIMARY KEY,
+    last_trans_id INT NOT NULL,
+    net_cents BIGINT NOT NULL,
+    checked_at TIMESTAMP NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(user_id)
+);
+
+CREATE TABLE reconciliation_runs (
+    run_id INT AUTO_INCREMENT PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL,
+    from_trans_id INT NOT NULL,
+    to_trans_id INT NOT NULL,
+    rows_checked INT NOT NULL,
+    users_checked INT NOT NULL,
+    drifted INT NOT NULL,
+    elapsed_ms DOUBLE NOT NULL
+);
+
+-- Idempotency keys of postings (mirrors SQLite migration 11)
+CREATE TABLE idempotency_keys (
+    key_id VARCHAR(300) PRIMARY KEY,
+    fingerprint VARCHAR(200) NOT NULL,
+    result TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    expires DOUBLE NOT NULL,
+    INDEX idx_idempotency_keys_expires (expires)
 );
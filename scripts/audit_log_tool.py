@@ -0,0 +1,279 @@
+"""
+Verify, repair and replay the binary audit log (see audit_log.py).
+
+Commands:
+    verify    check every record's CRC, compare the log with `transactions`
+              row by row, and check that each customer's opening balance
+              plus their logged postings equals balance_cents
+    sync      append `transactions` rows the log lacks (rows written before
+              the log existed, or lost to a crash between commit and append)
+    rebuild   insert logged rows missing from `transactions` (with
+              --overwrite also replace rows that differ), then rebuild
+              daily_summary
+    scan      replay the log three ways and report records/sec: checked
+              tuples, unchecked tuples and column sums
+
+Usage:
+    python scripts/audit_log_tool.py verify
+    python scripts/audit_log_tool.py sync --db database/bank_db.db --dir database/audit
+    python scripts/audit_log_tool.py rebuild --db restored.db
+    python scripts/audit_log_tool.py scan
+"""
+import argparse
+import heapq
+import os
+import sys
+import tempfile
+import time
+from operator import itemgetter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(BASE_DIR, 'database', 'bank_db.db')
+sys.path.insert(0, BASE_DIR)
+
+import audit_log
+import storage
+
+TRANSACTION_COLUMNS = ("trans_id", "user_id", "emp_id", "trans_type", "amount_cents", "trans_date", "acc_id",
+                       "entry_id")
+ROW_QUERY = f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions ORDER BY trans_id"
+BATCH = 10000
+
+def read_run(path):
+    """Yield the records of a scratch run file written by sorted_runs()."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(audit_log.RECORD_SIZE * BATCH)
+            if not chunk:
+                return
+            yield from audit_log.FULL_RECORD.iter_unpack(chunk)
+
+def sorted_runs(directory, errors, scratch):
+    """
+    One iterator of transactions rows in trans_id order per segment.
+
+    Segments already in trans_id order are streamed as they are. The others
+    are sorted one at a time into a run file under scratch, so memory holds
+    at most one segment whatever the size of the log.
+    """
+    runs = []
+    for _, path in audit_log.segments(directory):
+        with audit_log.segment_columns(path) as columns:
+            ids = columns["trans_id"]
+            ordered = all(a <= b for a, b in zip(ids, ids[1:]))
+        if ordered:
+            runs.append(map(audit_log.to_row, audit_log.iter_segment(path, errors=errors)))
+            continue
+        run = os.path.join(scratch, os.path.basename(path))
+        with open(run, "wb") as f:
+            for record in sorted(audit_log.iter_segment(path, errors=errors)):
+                f.write(audit_log.FULL_RECORD.pack(*record))
+        runs.append(map(audit_log.to_row, read_run(run)))
+    return runs
+
+def logged_rows(directory, errors, scratch):
+    """
+    Merge every segment's records into trans_id order, CRC checked.
+
+    Yields:
+        tuple: (transactions row, number of records logged for its trans_id)
+    """
+    row, copies = None, 0
+    for entry in heapq.merge(*sorted_runs(directory, errors, scratch), key=itemgetter(0)):
+        if row is not None and entry[0] == row[0]:
+            copies += 1
+            if entry != row:
+                errors.append(("", 0, f"trans_id {row[0]} logged twice with different contents"))
+            continue
+        if row is not None:
+            yield row, copies
+        row, copies = entry, 1
+    if row is not None:
+        yield row, copies
+
+def normalize(row):
+    """A transactions row as the log stores it (ids of 0 are NULL, dates to the second)."""
+    trans_id, user_id, emp_id, trans_type, cents, trans_date, acc_id, entry_id = row
+    return (trans_id, user_id or None, emp_id or None, trans_type, cents, str(trans_date)[:19],
+            acc_id or None, entry_id or None)
+
+def verify(app, args):
+    started = time.perf_counter()
+    errors = []
+    records = duplicates = missing = mismatched = extra = 0
+    net = {}
+    conn = app.connect_db()
+    with tempfile.TemporaryDirectory(prefix="audit-sort-") as scratch:
+        logged = logged_rows(args.dir, errors, scratch)
+
+        def take():
+            # Tally the current log row and move to the next one
+            nonlocal records, duplicates
+            row, copies = entry
+            records += copies
+            duplicates += copies - 1
+            _, user_id, _, trans_type, cents, _, _, _ = row
+            if user_id is not None:
+                net[user_id] = net.get(user_id, 0) + (cents if trans_type in ("Deposit", "Transfer In") else -cents)
+            return next(logged, None)
+
+        entry = next(logged, None)
+        for row in conn.execute(ROW_QUERY):
+            row = normalize(tuple(row))
+            while entry is not None and entry[0][0] < row[0]:
+                extra += 1
+                entry = take()
+            if entry is None or entry[0][0] != row[0]:
+                missing += 1
+                continue
+            if entry[0] != row:
+                mismatched += 1
+                if mismatched <= 20:
+                    print(f"  [X] trans_id {row[0]}: database {row[1:]} != log {entry[0][1:]}")
+            entry = take()
+        while entry is not None:
+            extra += 1
+            entry = take()
+    for path, offset, message in errors[:20]:
+        print(f"  [X] {os.path.basename(path) or 'log'} @{offset}: {message}")
+
+    drifted = 0
+    for user_id, balance, opening in conn.execute("SELECT user_id, balance_cents, opening_balance_cents FROM users"):
+        if opening + net.get(user_id, 0) != balance:
+            drifted += 1
+            if drifted <= 20:
+                print(f"  [X] user {user_id}: balance {app.Money(balance)} != opening + log "
+                      f"{app.Money(opening + net.get(user_id, 0))}")
+    conn.close()
+
+    print("=" * 50)
+    print("Audit Log Verification")
+    print("=" * 50)
+    print(f"Segments:           {len(audit_log.segments(args.dir))}")
+    print(f"Records:            {records}")
+    print(f"Corrupt/torn:       {len(errors)}")
+    print(f"Duplicates:         {duplicates}")
+    print(f"Missing from log:   {missing}")
+    print(f"Not in database:    {extra}")
+    print(f"Different:          {mismatched}")
+    print(f"Drifted balances:   {drifted}")
+    print(f"Elapsed:            {time.perf_counter() - started:.2f}s")
+    if errors or missing or extra or mismatched or drifted:
+        if missing and not (errors or extra or mismatched):
+            print("\n[!] Run `sync` to append the missing rows.")
+        else:
+            print("\n[X] The audit log and the database disagree.")
+        sys.exit(1)
+    print("\n[OK] Log intact; it matches `transactions` and every balance.")
+
+def sync(app, args):
+    started = time.perf_counter()
+    have = set()
+    for _, path in audit_log.segments(args.dir):
+        with audit_log.segment_columns(path) as columns:
+            have.update(columns["trans_id"])
+    log = audit_log.AuditLog(args.dir, app.AUDIT_LOG_SEGMENT_BYTES)
+    conn = app.connect_db()
+    appended = skipped = 0
+    pending = []
+    for row in conn.execute(ROW_QUERY):
+        trans_id, user_id, emp_id, trans_type, cents, trans_date, acc_id, entry_id = row
+        if trans_id in have:
+            continue
+        if trans_type not in audit_log.TYPE_CODES or cents is None or trans_date is None:
+            skipped += 1
+            print(f"  [!] trans_id {trans_id}: cannot be logged ({trans_type!r}, {cents!r}, {trans_date!r})")
+            continue
+        pending.append((trans_id, entry_id, acc_id, user_id, emp_id, trans_type, cents, str(trans_date)[:19]))
+        if len(pending) >= BATCH:
+            appended += log.append(pending)
+            pending = []
+    appended += log.append(pending)
+    conn.close()
+    log.close()
+    print(f"[OK] Appended {appended} row(s) in {time.perf_counter() - started:.2f}s"
+          + (f"; {skipped} row(s) skipped" if skipped else ""))
+
+def rebuild(app, args):
+    started = time.perf_counter()
+    errors = []
+    conn = app.connect_db()
+    dialect = storage.dialect_of(conn)
+    if args.overwrite:
+        query = dialect.upsert_sql("transactions", TRANSACTION_COLUMNS, ("trans_id",),
+                                   assignments=TRANSACTION_COLUMNS[1:])
+    else:
+        query = dialect.insert_ignore_sql("transactions", TRANSACTION_COLUMNS, ("trans_id",))
+    logged = written = 0
+    with tempfile.TemporaryDirectory(prefix="audit-sort-") as scratch, conn:
+        pending = []
+        for row, _ in logged_rows(args.dir, errors, scratch):
+            pending.append(row)
+            if len(pending) >= BATCH:
+                written += max(conn.executemany(query, pending).rowcount, 0)
+                logged += len(pending)
+                pending = []
+        if pending:
+            written += max(conn.executemany(query, pending).rowcount, 0)
+            logged += len(pending)
+        if written and dialect.name == "postgresql":
+            # Explicit trans_ids do not advance the serial sequence; later postings would collide
+            conn.execute("SELECT setval(pg_get_serial_sequence('transactions', 'trans_id'), MAX(trans_id)) "
+                         "FROM transactions")
+    if errors:
+        print(f"[!] {len(errors)} corrupt or torn record(s) skipped")
+    if written:
+        app.rebuild_daily_summary(conn)
+    conn.close()
+    print(f"[OK] {written} row(s) written from {logged} logged in {time.perf_counter() - started:.2f}s"
+          + ("; daily_summary rebuilt" if written else ""))
+
+def scan(app, args):
+    paths = [path for _, path in audit_log.segments(args.dir)]
+    results = []
+    for label, check in (("tuples, CRC checked", True), ("tuples, unchecked", False)):
+        started = time.perf_counter()
+        count = total = 0
+        for record in audit_log.iter_records(args.dir, check=check):
+            count += 1
+            total += record[5]
+        results.append((label, count, time.perf_counter() - started))
+    started = time.perf_counter()
+    count = total = 0
+    for path in paths:
+        with audit_log.segment_columns(path) as columns:
+            count += len(columns["amount_cents"])
+            total += sum(columns["amount_cents"])
+    results.append(("column sums", count, time.perf_counter() - started))
+
+    print("=" * 50)
+    print(f"Audit log scan ({len(paths)} segment(s))")
+    print("=" * 50)
+    for label, count, elapsed in results:
+        rate = count / elapsed if elapsed else 0
+        print(f"{label:<22} {count:>12,} records {rate:>14,.0f}/s")
+
+COMMANDS = {"verify": verify, "sync": sync, "rebuild": rebuild, "scan": scan}
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify, repair and replay the binary audit log")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--db", default=DATABASE, help="SQLite database path")
+    parser.add_argument("--dir", help="Audit log directory (default: BANK_AUDIT_LOG_DIR or audit/ next to the database)")
+    parser.add_argument("--overwrite", action="store_true", help="rebuild: replace rows that differ from the log")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print("[!] Database not found! Please run app.py first to create the database.")
+        sys.exit(1)
+    os.environ["BANK_DATABASE"] = os.path.abspath(args.db)
+    os.environ["BANK_AUDIT_LOG"] = "0"  # This process writes the log itself, only when syncing
+    import app
+    args.dir = args.dir or app.AUDIT_LOG_DIR
+    if args.command != "sync" and not audit_log.segments(args.dir):
+        print(f"[!] No audit log segments in {args.dir}")
+        sys.exit(1)
+    COMMANDS[args.command](app, args)
+
+if __name__ == "__main__":
+    main()
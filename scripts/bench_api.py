@@ -0,0 +1,199 @@
+"""
+Throughput benchmark: JSON API (/api/v1) vs the HTML form routes.
+
+Seeds a throwaway database (see bench_routes.py), then for each operation
+runs the same number of requests through the form route a browser uses and
+through its /api/v1 counterpart, and reports requests/sec and p50/p95
+latency for both:
+
+    balance   GET /user/dashboard                      vs GET /api/v1/balance
+    history   GET /employee/search_customer?...        vs GET /api/v1/transactions?user=...
+    transfer  POST /user/transfer (+ redirect)         vs POST /api/v1/transfer
+    deposit   POST /employee/transaction (+ redirect)  vs POST /api/v1/deposit
+
+Form posts are followed by the page their redirect loads, as in a browser.
+Requests go through the Flask test client, a threaded WSGI server, or an
+ASGI server (uvicorn running asgi.py; pip install -r requirements-asgi.txt).
+
+Usage:
+    python scripts/bench_api.py --clients 8 --requests 200
+    python scripts/bench_api.py --mode asgi --ops balance,transfer
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import HTTPSession, TestClientSession, load_app, percentile, start_server
+from bench_routes import PASSWORD, seed
+
+def start_asgi_server():
+    """Serve asgi.application with uvicorn on a free local port from a background thread."""
+    try:
+        import uvicorn
+        import asgi
+    except ImportError as e:
+        print(f"[X] --mode asgi needs requirements-asgi.txt installed ({e})")
+        sys.exit(1)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi.application, host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+def amount(rng, high):
+    return f"{rng.randint(1, high) / 100:.2f}"
+
+# operation -> (role, form request, API request, expected form status, expected API status)
+# Each request builder takes (customer username, rng) and returns (method, path, form data, JSON body).
+OPERATIONS = {
+    "balance": (
+        "user",
+        lambda name, rng: ("GET", "/user/dashboard", None, None),
+        lambda name, rng: ("GET", "/api/v1/balance", None, None),
+        200, 200,
+    ),
+    "history": (
+        "employee",
+        lambda name, rng: ("GET", f"/employee/search_customer?search_term={name}", None, None),
+        lambda name, rng: ("GET", f"/api/v1/transactions?user={name}", None, None),
+        200, 200,
+    ),
+    "transfer": (
+        "user",
+        lambda name, rng: ("POST", "/user/transfer", {"recipient": name, "amount": amount(rng, 500)}, None),
+        lambda name, rng: ("POST", "/api/v1/transfer", None, {"recipient": name, "amount": amount(rng, 500)}),
+        200, 201,
+    ),
+    "deposit": (
+        "employee",
+        lambda name, rng: ("POST", "/employee/transaction",
+                           {"username": name, "amount": amount(rng, 5000), "action_type": "Deposit"}, None),
+        lambda name, rng: ("POST", "/api/v1/deposit", None, {"username": name, "amount": amount(rng, 5000)}),
+        200, 201,
+    ),
+}
+
+def log_in(session, role, username):
+    """Log in through the API (the session cookie is shared with the form routes)."""
+    status = session.request("POST", "/api/v1/login", json_body={
+        "username": username, "password": PASSWORD, "user_type": role})
+    if status != 200:
+        raise RuntimeError(f"login as {username} failed with {status}")
+
+def client(new_session, op, variant, users, requests, warmup, seed_value, samples, errors):
+    """Issue warmup + requests of one operation through one variant ("form" or "api")."""
+    rng = random.Random(seed_value)
+    role, form, api, form_status, api_status = OPERATIONS[op]
+    build, expected = (form, form_status) if variant == "form" else (api, api_status)
+    session = new_session()
+    me = rng.randrange(users)
+    log_in(session, role, f"bench_{me}" if role == "user" else "bench_emp")
+    for i in range(warmup + requests):
+        other = (me + rng.randrange(1, users)) % users  # never the logged-in customer
+        method, path, data, json_body = build(f"bench_{other}", rng)
+        started = time.perf_counter()
+        status = session.request(method, path, data=data, json_body=json_body)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        samples.append(elapsed)
+        if status != expected:
+            errors.append(status)
+
+def run(new_session, op, variant, args):
+    """Run one operation/variant with args.clients threads; return (rps, p50 ms, p95 ms, errors)."""
+    samples = [[] for _ in range(args.clients)]
+    errors = [[] for _ in range(args.clients)]
+    threads = [
+        threading.Thread(target=client, args=(new_session, op, variant, args.users, args.requests,
+                                              args.warmup, args.seed + i, samples[i], errors[i]))
+        for i in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ordered = sorted(x for s in samples for x in s)
+    return (len(ordered) / elapsed, percentile(ordered, 50) * 1000, percentile(ordered, 95) * 1000,
+            sum(len(e) for e in errors))
+
+def parse_ops(text):
+    ops = [op.strip() for op in text.split(",") if op.strip()]
+    unknown = [op for op in ops if op not in OPERATIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown operation(s) {', '.join(unknown)} (choose from {', '.join(OPERATIONS)})")
+    return ops
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON API and form route throughput")
+    parser.add_argument("--users", type=int, default=200, help="Customers to seed")
+    parser.add_argument("--transactions", type=int, default=5000, help="History postings to seed")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per client")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per client")
+    parser.add_argument("--ops", type=parse_ops, default=list(OPERATIONS), help="Comma-separated operations")
+    parser.add_argument("--mode", choices=["test-client", "wsgi", "asgi"], default="test-client")
+    parser.add_argument("--method", default="pbkdf2:sha256:1000", help="Password hash method for seeded accounts")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_api_")
+    server = None
+    try:
+        app = load_app(workdir)
+        seeded = seed(app, args.users, args.transactions, args.method, random.Random(args.seed))
+
+        if args.mode == "wsgi":
+            server, base_url = start_server(app)
+            new_session = lambda: HTTPSession(base_url, follow_redirects=True)
+        elif args.mode == "asgi":
+            logging.getLogger("uvicorn.error").setLevel(logging.WARNING)
+            server, base_url = start_asgi_server()
+            new_session = lambda: HTTPSession(base_url, follow_redirects=True)
+        else:
+            new_session = lambda: TestClientSession(app, follow_redirects=True)
+
+        print("=" * 78)
+        print(f"JSON API vs form routes ({args.mode}, {args.users} users, {seeded} postings, "
+              f"{args.clients} clients x {args.requests} requests)")
+        print("=" * 78)
+        print(f"{'operation':<10} {'form rps':>9} {'api rps':>9} {'speedup':>8} "
+              f"{'form p50':>9} {'api p50':>8} {'form p95':>9} {'api p95':>8}")
+        failed = 0
+        for op in args.ops:
+            form_rps, form_p50, form_p95, form_errors = run(new_session, op, "form", args)
+            api_rps, api_p50, api_p95, api_errors = run(new_session, op, "api", args)
+            failed += form_errors + api_errors
+            print(f"{op:<10} {form_rps:>9.1f} {api_rps:>9.1f} {api_rps / form_rps:>7.2f}x "
+                  f"{form_p50:>9.2f} {api_p50:>8.2f} {form_p95:>9.2f} {api_p95:>8.2f}")
+        if failed:
+            print(f"\n[!] {failed} requests returned an unexpected status")
+        else:
+            print("\n[OK] All requests succeeded.")
+    finally:
+        if server is not None:
+            if args.mode == "asgi":
+                server.should_exit = True
+            else:
+                server.shutdown()
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
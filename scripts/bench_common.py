@@ -0,0 +1,105 @@
+"""
+Shared scaffolding for the benchmark and check scripts in this directory.
+
+Each script seeds its own throwaway database; this module holds the pieces
+they all need: importing the app inside a scratch directory, sessions that
+drive it through the Flask test client or real HTTP, a local WSGI server and
+nearest-rank percentiles.
+
+Usage (from another script in scripts/):
+    from bench_common import HTTPSession, TestClientSession, load_app, percentile, start_server
+"""
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+def load_app(workdir):
+    """Import the app with its database created inside workdir (unless BANK_DATABASE is absolute)."""
+    os.chdir(workdir)
+    import app
+    app.app.config["TESTING"] = True
+    return app
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+def start_server(app):
+    """Serve the app on an ephemeral local port from a background thread."""
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+class TestClientSession:
+    """
+    One browser with its own cookie jar, driven through the Flask test client.
+
+    Args:
+        app: The imported app module
+        follow_redirects: Load the page a redirect points to, as a browser would
+    """
+
+    def __init__(self, app, follow_redirects=False):
+        self.client = app.app.test_client()
+        self.follow_redirects = follow_redirects
+
+    def request(self, method, path, data=None, json_body=None):
+        """Send one request; returns the (final) status code."""
+        response = self.client.open(path, method=method, data=data, json=json_body,
+                                    follow_redirects=self.follow_redirects)
+        response.close()
+        return response.status_code
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HTTPSession:
+    """
+    One browser with its own cookie jar talking HTTP to a local server.
+
+    Args:
+        base_url: e.g. "http://127.0.0.1:8000"
+        follow_redirects: Load the page a redirect points to, as a browser would
+    """
+
+    def __init__(self, base_url, follow_redirects=False):
+        self.base_url = base_url
+        handlers = [urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())]
+        if not follow_redirects:
+            handlers.append(_NoRedirect())
+        self.opener = urllib.request.build_opener(*handlers)
+
+    def request(self, method, path, data=None, json_body=None):
+        """Send one request; returns the (final) status code."""
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
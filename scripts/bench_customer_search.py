@@ -0,0 +1,146 @@
+"""
+Latency benchmark for the customer search index.
+
+Seeds a throwaway database with synthetic customers (1M by default), then
+times app.search_customers() for several kinds of queries a teller types:
+username prefixes, first/last name prefixes, email prefixes, one-typo
+misspellings of existing names, and terms that match nobody. Each kind is
+reported with p50/p95/p99 latency and the share of typo queries that still
+found the intended customer. Exits non-zero if the p95 of any kind is
+over --target-ms.
+
+Usage:
+    python scripts/bench_customer_search.py --customers 1000000 --queries 500
+    python scripts/bench_customer_search.py --db /tmp/search_1m.db   # reuse a seeded database
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app, percentile
+
+FIRST_NAMES = ("james john robert michael william david richard joseph thomas charles mary patricia "
+               "jennifer linda elizabeth barbara susan jessica sarah karen ahmed mohamed mahmoud omar ali "
+               "hassan fatma aya nour salma youssef mostafa khaled tarek amr hany rania dina mona heba").split()
+LAST_NAMES = ("smith johnson williams brown jones garcia miller davis rodriguez martinez hernandez lopez "
+              "gonzalez wilson anderson thomas taylor moore jackson martin lee perez thompson white harris "
+              "sanchez clark ramirez lewis robinson ibrahim abdelrahman elsayed mansour fathy saleh gamal "
+              "adel fouad nasser").split()
+
+def seed(app, customers, rng, batch=50000):
+    """Insert synthetic customers; the index triggers keep customer_search in sync."""
+    conn = app.connect_db()
+    start = conn.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0]
+    for offset in range(0, customers, batch):
+        rows = []
+        for i in range(start + offset + 1, start + min(offset + batch, customers) + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            rows.append((f"{first[0]}{last}_{i}", "x", f"{first.title()} {last.title()}",
+                         f"{first}.{last}{i}@example.com"))
+        conn.executemany("INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,0)", rows)
+        conn.commit()
+        print(f"  seeded {start + offset + len(rows):,} customers", end="\r", flush=True)
+    print()
+    conn.execute("INSERT INTO customer_search(customer_search) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+
+def typo(word, rng):
+    """Apply one random edit after the first letter (where most typos happen)."""
+    i = rng.randrange(1, len(word))
+    kind = rng.choice(("swap", "drop", "replace", "insert"))
+    if kind == "swap" and i + 1 < len(word):
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if kind == "replace":
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+def make_queries(conn, count, rng):
+    """Build (kind, query, expected user_id or None) tuples from real rows."""
+    max_id = conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0]
+    queries = []
+    for _ in range(count):
+        row = None
+        while row is None:
+            row = conn.execute("SELECT user_id, username, full_name, email FROM users WHERE user_id=?",
+                               (rng.randint(1, max_id),)).fetchone()
+        user_id, username, full_name, email = row
+        first, last = full_name.lower().split()[:2]
+        queries.append(("username prefix", username[:rng.randint(3, len(username))], None))
+        queries.append(("name prefix", f"{first} {last[:rng.randint(2, len(last))]}", None))
+        queries.append(("email prefix", email.split("@")[0][:rng.randint(4, 12)], None))
+        queries.append(("typo username", typo(username, rng), user_id))
+        queries.append(("typo name", f"{typo(first, rng)} {last}", None))
+        queries.append(("no match", f"zq{rng.randint(0, 10 ** 6)}xv", None))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark customer search latency")
+    parser.add_argument("--customers", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=300, help="Queries per kind")
+    parser.add_argument("--db", help="Reuse (or create) this database instead of a throwaway one")
+    parser.add_argument("--target-ms", type=float, default=10.0, help="Maximum acceptable p95 per kind")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_search_")
+    try:
+        if args.db:
+            os.environ["BANK_DATABASE"] = os.path.abspath(args.db)
+        app = load_app(workdir)
+        app.init_db()
+        rng = random.Random(args.seed)
+        conn = app.connect_db()
+        existing = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        if existing < args.customers:
+            print(f"Seeding {args.customers - existing:,} customers...")
+            started = time.perf_counter()
+            seed(app, args.customers - existing, rng)
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+        queries = make_queries(conn, args.queries, rng)
+
+        for _, query, _ in queries[:50]:
+            app.search_customers(conn, query)  # warm the page cache
+        timings = {}
+        found = {}
+        for kind, query, expected in queries:
+            started = time.perf_counter()
+            rows = app.search_customers(conn, query)
+            timings.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+            if expected is not None:
+                found.setdefault(kind, []).append(any(row[0] == expected for row in rows))
+        conn.close()
+
+        print("=" * 72)
+        print(f"Customer search ({max(existing, args.customers):,} customers, {args.queries} queries per kind)")
+        print("=" * 72)
+        print(f"{'kind':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  recall")
+        over = []
+        for kind, samples in timings.items():
+            ordered = sorted(samples)
+            p95 = percentile(ordered, 95)
+            recall = f"{sum(found[kind]) / len(found[kind]):.0%}" if kind in found else ""
+            print(f"{kind:<16} {percentile(ordered, 50):>8.2f} {p95:>8.2f} {percentile(ordered, 99):>8.2f} "
+                  f"{ordered[-1]:>8.2f}  {recall}")
+            if p95 > args.target_ms:
+                over.append(kind)
+        if over:
+            print(f"\n[X] p95 over {args.target_ms:g} ms for: {', '.join(over)}")
+            sys.exit(1)
+        print(f"\n[OK] Every query kind has p95 under {args.target_ms:g} ms.")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
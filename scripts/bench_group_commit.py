@@ -0,0 +1,129 @@
+"""
+Throughput benchmark for group commit: transfers/sec against batch window size.
+
+Seeds a throwaway database (see bench_transfers.py), then runs the same
+transfer load through app.post_transfer() once per configuration:
+
+    direct NORMAL   one transaction per transfer, synchronous=NORMAL
+                    (the default; the WAL is not fsynced on commit)
+    direct FULL     one transaction and one fsync per transfer
+    window N ms     app.GroupCommitWriter with that batch window; batches
+                    are committed with synchronous=FULL
+
+For each it reports transfers/sec, p50/p95 latency as seen by the caller
+and the mean batch size, then checks that no money was created or lost.
+Put --dir on the disk the real database lives on: fsync on tmpfs is free.
+
+Usage:
+    python scripts/bench_group_commit.py --writers 32 --transfers 300
+    python scripts/bench_group_commit.py --windows 0,1,2,5,10 --dir /var/tmp
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app, percentile
+from bench_transfers import seed_users, verify
+
+def writer(app, acc_ids, transfers, max_amount, synchronous, seed_value, samples, results, index):
+    """Run transfers between random pairs on a dedicated connection, timing each one."""
+    conn = app.connect_db()
+    if synchronous:
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+    rng = random.Random(seed_value)
+    done = rejected = 0
+    for _ in range(transfers):
+        sender, receiver = rng.sample(acc_ids, 2)
+        amount = app.Money(rng.randint(1, max_amount * 100))
+        started = time.perf_counter()
+        try:
+            app.post_transfer(conn, sender, receiver, amount)
+            done += 1
+        except app.InsufficientFundsError:
+            rejected += 1
+        samples.append(time.perf_counter() - started)
+    conn.close()
+    results[index] = (done, rejected)
+
+def run(app, acc_ids, args, synchronous, seed_value):
+    """Run one configuration; return (transfers/sec, p50 ms, p95 ms, rejected)."""
+    samples = [[] for _ in range(args.writers)]
+    results = [None] * args.writers
+    threads = [
+        threading.Thread(target=writer, args=(app, acc_ids, args.transfers, args.max_amount, synchronous,
+                                              seed_value + i, samples[i], results, i))
+        for i in range(args.writers)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ordered = sorted(x for s in samples for x in s)
+    return (len(ordered) / elapsed, percentile(ordered, 50) * 1000, percentile(ordered, 95) * 1000,
+            sum(r[1] for r in results))
+
+def parse_windows(text):
+    try:
+        return [float(w) for w in text.split(",") if w.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("windows must be comma-separated milliseconds")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare transfer throughput with and without group commit")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--writers", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--transfers", type=int, default=300, help="Transfers per caller per configuration")
+    parser.add_argument("--opening-balance", default="1000.00")
+    parser.add_argument("--max-amount", type=int, default=50, help="Largest transfer in whole units")
+    parser.add_argument("--windows", type=parse_windows, default=[0, 1, 2, 5, 10], help="Batch windows in ms")
+    parser.add_argument("--max-items", type=int, default=256, help="Postings per batch")
+    parser.add_argument("--dir", help="Directory for the throwaway database (default: system temp)")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_group_commit_", dir=args.dir)
+    try:
+        app = load_app(workdir)
+        opening_balance = app.Money.parse(args.opening_balance)
+        acc_ids = seed_users(app, args.users, opening_balance)
+
+        configs = [("direct NORMAL", None, None), ("direct FULL", "FULL", None)]
+        configs += [(f"window {w:g} ms", None, w) for w in args.windows]
+
+        print("=" * 72)
+        print(f"Group commit ({args.writers} writers x {args.transfers} transfers, {args.users} users)")
+        print("=" * 72)
+        print(f"{'configuration':<16} {'tps':>9} {'p50 ms':>8} {'p95 ms':>8} {'batch':>7} {'rejected':>9}")
+        for i, (label, synchronous, window) in enumerate(configs):
+            app.posting_writer = None if window is None else app.GroupCommitWriter(window, args.max_items)
+            tps, p50, p95, rejected = run(app, acc_ids, args, synchronous, args.seed + i * args.writers)
+            batch = ""
+            if app.posting_writer is not None:
+                stats = app.posting_writer.stats()
+                batch = f"{stats['postings'] / max(1, stats['batches']):.1f}"
+            print(f"{label:<16} {tps:>9.1f} {p50:>8.2f} {p95:>8.2f} {batch:>7} {rejected:>9}")
+        app.posting_writer = None
+
+        problems = verify(app, opening_balance, args.users)
+        if problems:
+            print(f"\n[X] {len(problems)} consistency problem(s):")
+            for problem in problems[:20]:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("\n[OK] No money lost or created; every balance matches its history.")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Login throughput benchmark for the password hashing pool.
+
+Seeds a throwaway database with customer accounts, then for each hashing pool
+size fires concurrent logins through the Flask test client and reports
+logins/sec, shed (503) responses, and the latency of a cheap page requested
+while the login storm is running.
+
+Usage:
+    python scripts/bench_login.py --pool-sizes 0 1 2 4 --clients 16 --logins 200
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app
+
+def seed(app, accounts, password, method):
+    """Create customer accounts sharing one password hash."""
+    from werkzeug.security import generate_password_hash
+    pwhash = generate_password_hash(password, method=method)
+    conn = app.connect_db()
+    conn.executemany(
+        "INSERT INTO users (username, password, full_name, balance_cents) VALUES (?,?,?,0)",
+        [(f"login_{i}", pwhash, f"Login User {i}") for i in range(accounts)]
+    )
+    conn.commit()
+    conn.close()
+
+def login_client(app, accounts, logins, password, results, index):
+    """Perform logins from one simulated client."""
+    client = app.app.test_client()
+    ok = shed = 0
+    for i in range(logins):
+        response = client.post("/", data={
+            "username": f"login_{(index * logins + i) % accounts}",
+            "password": password,
+            "user_type": "user",
+        })
+        if response.status_code == 302:
+            ok += 1
+        elif response.status_code == 503:
+            shed += 1
+        client.get("/logout")
+    results[index] = (ok, shed)
+
+def probe_client(app, stop, latencies):
+    """Hit a cheap page repeatedly to measure how much the storm stalls it."""
+    client = app.app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get("/")
+        latencies.append((time.perf_counter() - started) * 1000)
+
+def run(app, pool_size, clients, logins, accounts, password):
+    """Run one login storm with the given hashing pool size."""
+    app.password_hasher.shutdown()
+    app.password_hasher = app.PasswordHasher(workers=pool_size)
+    results = [None] * clients
+    latencies = []
+    stop = threading.Event()
+    probe = threading.Thread(target=probe_client, args=(app, stop, latencies))
+    threads = [
+        threading.Thread(target=login_client, args=(app, accounts, logins, password, results, i))
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    probe.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe.join()
+    app.password_hasher.shutdown()
+    ok = sum(r[0] for r in results)
+    shed = sum(r[1] for r in results)
+    p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 20 else max(latencies, default=0)
+    return ok / elapsed, shed, p95
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput versus hashing pool size")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent login clients")
+    parser.add_argument("--logins", type=int, default=20, help="Logins per client")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--method", default=None, help="Hash method (defaults to PASSWORD_HASH_METHOD)")
+    args = parser.parse_args()
+
+    password = "bench-password"
+    workdir = tempfile.mkdtemp(prefix="bank_login_")
+    try:
+        app = load_app(workdir)
+        method = args.method or app.PASSWORD_HASH_METHOD
+        app.PASSWORD_HASH_METHOD = method
+        seed(app, args.accounts, password, method)
+        print("=" * 60)
+        print(f"Login benchmark ({method}, {args.clients} clients x {args.logins} logins)")
+        print("=" * 60)
+        print(f"{'pool size':>10} {'logins/s':>12} {'shed (503)':>12} {'probe p95 ms':>14}")
+        for pool_size in args.pool_sizes:
+            rate, shed, p95 = run(app, pool_size, args.clients, args.logins, args.accounts, password)
+            label = "inline" if pool_size == 0 else str(pool_size)
+            print(f"{label:>10} {rate:>12.1f} {shed:>12} {p95:>14.1f}")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
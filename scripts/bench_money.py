@@ -0,0 +1,121 @@
+"""
+Benchmark integer-cents money against the old REAL/Decimal representation.
+
+Builds two throwaway tables holding the same transactions, one with the old
+DECIMAL(10,2) (stored by SQLite as REAL) amount column and one with INTEGER
+cents, then times:
+
+- SUM() aggregates over every row, where REAL drifts and INTEGER is exact
+- the per-posting Decimal(str(row)) / float(new_balance) round-trip the routes
+  used to do, against plain integer arithmetic on Money.cents
+
+Usage:
+    python scripts/bench_money.py --rows 1000000 --repeat 5
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+def best_of(repeat, func):
+    """Return (best elapsed seconds, result) over repeat runs of func."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def seed(conn, rows):
+    """Fill both tables with the same random amounts and return the exact total in cents."""
+    rng = random.Random(42)
+    cents = [rng.randint(1, 100000) for _ in range(rows)]
+    conn.execute("CREATE TABLE tx_real (id INTEGER PRIMARY KEY, user_id INTEGER, amount DECIMAL(10,2))")
+    conn.execute("CREATE TABLE tx_cents (id INTEGER PRIMARY KEY, user_id INTEGER, amount_cents INTEGER)")
+    conn.executemany("INSERT INTO tx_real (user_id, amount) VALUES (?, ?)",
+                     ((i % 1000, c / 100) for i, c in enumerate(cents)))
+    conn.executemany("INSERT INTO tx_cents (user_id, amount_cents) VALUES (?, ?)",
+                     ((i % 1000, c) for i, c in enumerate(cents)))
+    conn.commit()
+    return sum(cents)
+
+def run(app, args):
+    """Run every comparison and exit non-zero if the integer total is not exact."""
+    conn = sqlite3.connect(":memory:")
+    exact = seed(conn, args.rows)
+
+    print("=" * 60)
+    print(f"Money representation benchmark ({args.rows:,} rows, best of {args.repeat})")
+    print("=" * 60)
+
+    real_time, real_sum = best_of(args.repeat, lambda: conn.execute("SELECT SUM(amount) FROM tx_real").fetchone()[0])
+    int_time, int_sum = best_of(args.repeat, lambda: conn.execute("SELECT SUM(amount_cents) FROM tx_cents").fetchone()[0])
+    print(f"SUM() REAL:          {real_time * 1000:8.1f} ms  total {Decimal(str(real_sum))}")
+    print(f"SUM() INTEGER cents: {int_time * 1000:8.1f} ms  total {app.Money(int_sum)}")
+    drift = Decimal(str(real_sum)) - app.Money(exact).to_decimal()
+    print(f"REAL drift from exact total: {drift}")
+
+    group_real, _ = best_of(args.repeat, lambda: conn.execute(
+        "SELECT user_id, SUM(amount) FROM tx_real GROUP BY user_id").fetchall())
+    group_int, _ = best_of(args.repeat, lambda: conn.execute(
+        "SELECT user_id, SUM(amount_cents) FROM tx_cents GROUP BY user_id").fetchall())
+    print(f"GROUP BY SUM REAL:   {group_real * 1000:8.1f} ms")
+    print(f"GROUP BY SUM cents:  {group_int * 1000:8.1f} ms  ({group_real / group_int:.2f}x)")
+
+    rng = random.Random(7)
+    amounts = [rng.randint(1, 10000) for _ in range(args.postings)]
+
+    def decimal_round_trip():
+        balance = 1000000.0
+        for c in amounts:
+            amount = Decimal(str(c / 100))
+            new_balance = Decimal(str(balance)) + amount
+            balance = float(new_balance)
+        return balance
+
+    def integer_cents():
+        balance = app.Money(100000000)
+        for c in amounts:
+            balance = balance + app.Money(c)
+        return balance.cents
+
+    dec_time, _ = best_of(args.repeat, decimal_round_trip)
+    cents_time, _ = best_of(args.repeat, integer_cents)
+    print(f"\nPosting arithmetic ({args.postings:,} updates):")
+    print(f"  Decimal(str()) / float(): {dec_time * 1000:8.1f} ms")
+    print(f"  Money integer cents:      {cents_time * 1000:8.1f} ms  ({dec_time / cents_time:.2f}x)")
+
+    conn.close()
+    if int_sum != exact:
+        print("\n[X] INTEGER total does not match the exact total!")
+        sys.exit(1)
+    print("\n[OK] INTEGER cents total is exact.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare INTEGER cents with REAL/Decimal money")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--postings", type=int, default=200000, help="Balance updates for the round-trip test")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_money_")
+    try:
+        os.chdir(workdir)
+        import app
+        run(app, args)
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Mixed-workload latency benchmark for the banking routes.
+
+Seeds a throwaway database with customers and transaction history, then runs
+concurrent clients that pick operations (login, dashboard, transfer, deposit,
+reports) from a weighted mix and time every request. Clients go through the
+Flask test client (in-process) or real HTTP against a local threaded WSGI
+server. Per-route p50/p95/p99 latency and throughput are printed and written
+to JSON, together with the slowest SQL statements from app.metrics, so runs
+on different commits can be compared with --compare.
+
+Usage:
+    python scripts/bench_routes.py --users 500 --transactions 20000 --clients 8 --requests 300
+    python scripts/bench_routes.py --mode wsgi --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import HTTPSession, TestClientSession, load_app, percentile, start_server
+
+PASSWORD = "bench-password"
+DEFAULT_MIX = "login=1,dashboard=4,transfer=2,deposit=2,reports=1"
+
+def seed(app, users, transactions, method, rng):
+    """
+    Create customers, one employee and one admin, plus deposit/withdraw history.
+
+    History goes through app.post_batch() so balances, the ledger and
+    daily_summary stay consistent with what the routes expect.
+    """
+    from werkzeug.security import generate_password_hash
+    pwhash = generate_password_hash(PASSWORD, method=method)
+    conn = app.connect_db()
+    conn.executemany(
+        "INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,?)",
+        [(f"bench_{i}", pwhash, f"Bench User {i}", f"bench_{i}@example.com", 1000000) for i in range(users)]
+    )
+    conn.execute("INSERT INTO employees (username, password, full_name, role) VALUES ('bench_emp', ?, 'Bench Teller', 'Teller')",
+                 (pwhash,))
+    conn.execute("INSERT INTO admins (username, password, full_name) VALUES ('bench_admin', ?, 'Bench Admin')", (pwhash,))
+    conn.commit()
+    emp_id = conn.execute("SELECT emp_id FROM employees WHERE username='bench_emp'").fetchone()[0]
+    postings = [
+        (f"bench_{rng.randrange(users)}", "Deposit" if rng.random() < 0.7 else "Withdraw", f"{rng.randint(1, 50000) / 100:.2f}")
+        for _ in range(transactions)
+    ]
+    report = app.post_batch(conn, postings, emp_id, chunk_size=app.BULK_IMPORT_BATCH_SIZE)
+    conn.close()
+    return report["applied"]
+
+def login(session, username, user_type):
+    return session.request("POST", "/", {"username": username, "password": PASSWORD, "user_type": user_type})
+
+# operation -> status codes that count as success (form posts flash and redirect)
+OPERATIONS = {
+    "login": (302,),
+    "dashboard": (200,),
+    "transfer": (302,),
+    "deposit": (302,),
+    "reports": (200,),
+}
+
+def run_operation(op, sessions, new_session, users, rng):
+    """Issue one request for op and return its status code."""
+    if op == "login":
+        return login(new_session(), f"bench_{rng.randrange(users)}", "user")
+    if op == "dashboard":
+        return sessions["user"].request("GET", "/user/dashboard")
+    if op == "transfer":
+        return sessions["user"].request("POST", "/user/transfer", {
+            "recipient": f"bench_{rng.randrange(users)}", "amount": f"{rng.randint(1, 500) / 100:.2f}"})
+    if op == "deposit":
+        return sessions["employee"].request("POST", "/employee/transaction", {
+            "username": f"bench_{rng.randrange(users)}", "amount": f"{rng.randint(1, 5000) / 100:.2f}",
+            "action_type": "Deposit"})
+    return sessions["admin"].request("GET", "/admin/reports?type=transactions")
+
+def client(new_session, users, mix, requests, warmup, seed_value, samples, errors):
+    """Log in once per role, then issue warmup + requests weighted-random operations."""
+    rng = random.Random(seed_value)
+    sessions = {"user": new_session(), "employee": new_session(), "admin": new_session()}
+    login(sessions["user"], f"bench_{rng.randrange(users)}", "user")
+    login(sessions["employee"], "bench_emp", "employee")
+    login(sessions["admin"], "bench_admin", "admin")
+    ops, weights = zip(*mix.items())
+    for i in range(warmup + requests):
+        op = rng.choices(ops, weights)[0]
+        started = time.perf_counter()
+        status = run_operation(op, sessions, new_session, users, rng)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        samples.setdefault(op, []).append(elapsed)
+        if status not in OPERATIONS[op]:
+            errors[op] = errors.get(op, 0) + 1
+
+def summarize(latencies, errors, elapsed):
+    """Latency percentiles (ms) and throughput for one route or the total."""
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+def parse_mix(text):
+    """Parse "op=weight,..." into a dict, rejecting unknown operations."""
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r} (choose from {', '.join(OPERATIONS)})")
+        mix[op] = float(weight or 1)
+    return mix
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def top_statements(app, limit):
+    """The statements that took the most total time during the run."""
+    statements = app.metrics.snapshot()["statements"]
+    ranked = sorted(statements.items(), key=lambda item: item[1]["seconds"], reverse=True)[:limit]
+    return [{"sql": sql, "calls": stats["calls"], "total_ms": round(stats["seconds"] * 1000, 3),
+             "max_ms": round(stats["max"] * 1000, 3), "rows": stats["rows"]} for sql, stats in ranked]
+
+def compare(result, baseline_path):
+    """Print p95 and throughput changes per route against an earlier JSON result."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit') or '?'}):")
+    print(f"{'route':<12} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'rps change':>11}")
+    for route, now in result["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before:
+            continue
+        p95 = (now["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+        rps = (now["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+        flag = "  [!]" if p95 > 10 else ""
+        print(f"{route:<12} {before['p95_ms']:>11.2f} {now['p95_ms']:>10.2f} {p95:>+7.1f}% {rps:>+10.1f}%{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mixed route workloads and report per-route latency")
+    parser.add_argument("--users", type=int, default=200, help="Customers to seed")
+    parser.add_argument("--transactions", type=int, default=5000, help="History postings to seed")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per client")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per client")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--mode", choices=["test-client", "wsgi"], default="test-client")
+    parser.add_argument("--method", default="pbkdf2:sha256:1000",
+                        help="Password hash method for seeded accounts (cheap by default so logins do not dominate)")
+    parser.add_argument("--hash-workers", type=int, default=0, help="Hashing pool size (0 = hash inline)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_routes.json", help="Where to write the JSON result")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix="bank_routes_")
+    server = None
+    try:
+        app = load_app(workdir)
+        app.PASSWORD_HASH_METHOD = args.method
+        app.password_hasher.shutdown()
+        app.password_hasher = app.PasswordHasher(workers=args.hash_workers, method=args.method)
+        seeded = seed(app, args.users, args.transactions, args.method, random.Random(args.seed))
+
+        if args.mode == "wsgi":
+            server, base_url = start_server(app)
+            new_session = lambda: HTTPSession(base_url)
+        else:
+            new_session = lambda: TestClientSession(app)
+
+        print("=" * 70)
+        print(f"Route benchmark ({args.mode}, {args.users} users, {seeded} postings, "
+              f"{args.clients} clients x {args.requests} requests)")
+        print("=" * 70)
+
+        app.metrics.reset()
+        samples = [{} for _ in range(args.clients)]
+        errors = [{} for _ in range(args.clients)]
+        threads = [
+            threading.Thread(target=client, args=(new_session, args.users, args.mix, args.requests,
+                                                  args.warmup, args.seed + i, samples[i], errors[i]))
+            for i in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        routes = {}
+        for op in args.mix:
+            latencies = [x for s in samples for x in s.get(op, [])]
+            routes[op] = summarize(latencies, sum(e.get(op, 0) for e in errors), elapsed)
+        total = summarize([x for s in samples for v in s.values() for x in v],
+                          sum(n for e in errors for n in e.values()), elapsed)
+
+        print(f"{'route':<12} {'count':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for op, r in list(routes.items()) + [("TOTAL", total)]:
+            print(f"{op:<12} {r['count']:>7} {r['throughput_rps']:>8.1f} {r['p50_ms']:>9.2f} "
+                  f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}")
+
+        result = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "mode": args.mode,
+                "users": args.users,
+                "postings": seeded,
+                "clients": args.clients,
+                "requests_per_client": args.requests,
+                "warmup": args.warmup,
+                "mix": args.mix,
+                "seed": args.seed,
+                "elapsed_s": round(elapsed, 3),
+            },
+            "routes": routes,
+            "total": total,
+            "top_statements": top_statements(app, 10),
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n[OK] Results written to {output}")
+        if baseline:
+            compare(result, baseline)
+        if total["errors"]:
+            print(f"[!] {total['errors']} requests returned an unexpected status")
+    finally:
+        if server is not None:
+            server.shutdown()
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Concurrency stress benchmark for the posting engine.
+
+Seeds a throwaway SQLite database, then runs N writer threads that fire random
+transfers at each other through app.post_transfer(). At the end it checks that
+no money was created or lost and that every balance matches its transaction
+history, and prints throughput and retry counts.
+
+Usage:
+    python scripts/bench_transfers.py --writers 8 --transfers 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app
+
+def seed_users(app, users, opening_balance):
+    """Create users with the same opening balance and return their checking acc_ids."""
+    conn = app.connect_db()
+    conn.executemany(
+        "INSERT INTO users (username, password, full_name, email, balance_cents) VALUES (?,?,?,?,?)",
+        [(f"bench_{i}", "x", f"Bench User {i}", None, opening_balance.cents) for i in range(users)]
+    )
+    conn.commit()
+    ids = [row[0] for row in conn.execute(
+        "SELECT acc_id FROM accounts WHERE user_id IS NOT NULL AND acc_type=? ORDER BY acc_id",
+        (app.DEFAULT_ACCOUNT_TYPE,)
+    )]
+    conn.close()
+    return ids
+
+def writer(app, acc_ids, transfers, max_amount, results, index):
+    """Run transfers between random pairs on a dedicated connection."""
+    conn = app.connect_db()
+    rng = random.Random(index)
+    done = rejected = 0
+    for _ in range(transfers):
+        sender, receiver = rng.sample(acc_ids, 2)
+        amount = app.Money(rng.randint(1, max_amount * 100))
+        try:
+            app.post_transfer(conn, sender, receiver, amount)
+            done += 1
+        except app.InsufficientFundsError:
+            rejected += 1
+    conn.close()
+    results[index] = (done, rejected)
+
+def verify(app, opening_balance, users):
+    """
+    Check conservation of money, per-user history and the double-entry ledger.
+
+    Returns:
+        list: Human readable problems (empty when consistent)
+    """
+    conn = app.connect_db()
+    problems = []
+    total = conn.execute("SELECT SUM(balance_cents) FROM users").fetchone()[0]
+    expected_total = opening_balance.cents * users
+    if total != expected_total:
+        problems.append(f"total balance {app.Money(total)} != expected {app.Money(expected_total)}")
+    rows = conn.execute("""
+        SELECT u.user_id, u.balance_cents,
+               COALESCE(SUM(CASE WHEN t.trans_type IN ('Deposit', 'Transfer In') THEN t.amount_cents
+                                 ELSE -t.amount_cents END), 0) AS net
+        FROM users u LEFT JOIN transactions t ON t.user_id = u.user_id
+        GROUP BY u.user_id
+    """).fetchall()
+    for user_id, balance, net in rows:
+        if opening_balance.cents + net != balance:
+            problems.append(f"user {user_id}: balance {app.Money(balance)} != opening + history "
+                            f"{app.Money(opening_balance.cents + net)}")
+    problems.extend(app.verify_ledger(conn))
+    conn.close()
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the transfer engine with parallel writers")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--transfers", type=int, default=2000, help="Transfers per writer")
+    parser.add_argument("--opening-balance", default="1000.00")
+    parser.add_argument("--max-amount", type=int, default=200, help="Largest transfer in whole units")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_bench_")
+    try:
+        app = load_app(workdir)
+        opening_balance = app.Money.parse(args.opening_balance)
+        acc_ids = seed_users(app, args.users, opening_balance)
+        results = [None] * args.writers
+        threads = [
+            threading.Thread(target=writer, args=(app, acc_ids, args.transfers, args.max_amount, results, i))
+            for i in range(args.writers)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        done = sum(r[0] for r in results)
+        rejected = sum(r[1] for r in results)
+        print("=" * 50)
+        print("Transfer engine stress benchmark")
+        print("=" * 50)
+        print(f"Writers:            {args.writers}")
+        print(f"Users:              {args.users}")
+        print(f"Committed:          {done}")
+        print(f"Insufficient funds: {rejected}")
+        print(f"Busy retries:       {app.posting_stats['retries']}")
+        print(f"Elapsed:            {elapsed:.2f}s")
+        print(f"Throughput:         {(done + rejected) / elapsed:,.0f} postings/s")
+
+        problems = verify(app, opening_balance, args.users)
+        if problems:
+            print(f"\n[X] {len(problems)} consistency problem(s):")
+            for problem in problems[:20]:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("\n[OK] No money lost or created; every balance matches its history.")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Bulk-import customer accounts from a CSV or JSON Lines file.
+
+Uses the same validation, hashing and batched inserts as the
+/employee/add_customer/bulk page, with a hashing pool sized to all CPU cores.
+Rejected rows are written to an error report instead of aborting the run.
+
+Usage:
+    python scripts/bulk_import_customers.py customers.csv
+    python scripts/bulk_import_customers.py customers.jsonl --report errors.csv --batch-size 2000
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(BASE_DIR, 'database', 'bank_db.db')
+sys.path.insert(0, BASE_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import customers from CSV or JSONL")
+    parser.add_argument("file", help="Input file (.csv with header row, or .jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from extension)")
+    parser.add_argument("--db", default=DATABASE, help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Hashing processes")
+    parser.add_argument("--report", default="import_errors.csv", help="Where to write rejected rows")
+    args = parser.parse_args()
+
+    fmt = args.format or args.file.rsplit(".", 1)[-1].lower()
+    if fmt not in ("csv", "jsonl"):
+        print("[X] Unsupported format. Use --format csv or --format jsonl.")
+        sys.exit(2)
+    if not os.path.exists(args.db):
+        print("[!] Database not found! Please run app.py first to create the database.")
+        sys.exit(1)
+
+    os.environ["BANK_DATABASE"] = os.path.abspath(args.db)
+    import app
+
+    hasher = app.PasswordHasher(workers=args.workers, queue_limit=1, timeout=None)
+    conn = app.connect_db()
+    started = time.perf_counter()
+    try:
+        with open(args.file, newline="", encoding="utf-8-sig") as stream:
+            report = app.import_customers(
+                conn, app.iter_customer_records(stream, fmt), hasher=hasher,
+                batch_size=args.batch_size or app.BULK_IMPORT_BATCH_SIZE,
+            )
+    finally:
+        hasher.shutdown()
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    print("=" * 50)
+    print("Bulk Customer Import")
+    print("=" * 50)
+    print(f"Imported: {report['imported']}")
+    print(f"Rejected: {report['failed']}")
+    print(f"Elapsed:  {elapsed:.1f}s ({report['imported'] / elapsed if elapsed else 0:,.0f} rows/s)")
+    if report["errors"]:
+        with open(args.report, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(["line", "username", "error"])
+            writer.writerows(report["errors"])
+        print(f"\n[!] Rejected rows written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Consistency check for the customer dashboard cache.
+
+Seeds a throwaway database and runs writer threads, each owning a private
+pair of customers, that post transfers and deposits through the real routes
+(/user/transfer, /employee/transaction, /employee/transfer). Reader threads
+keep loading random dashboards at the same time so cache fills race the
+postings. After every committed posting the writer loads both customers'
+dashboards and fails if the balance shown differs from the database.
+
+With --foreign-writes each writer hands its postings to a forked child
+process with a cache of its own, as a sibling serve.py worker would, so only
+the dashboard generation check can catch them.
+
+Usage:
+    python scripts/check_dashboard_cache.py --pairs 8 --postings 200 --readers 4
+    python scripts/check_dashboard_cache.py --foreign-writes
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app
+
+BALANCE_PATTERN = re.compile(r'<h2 class="text-success mt-3">\$([-0-9.,]+)</h2>')
+
+def seed(app, pairs):
+    """Create two customers per pair and one teller; return the teller's emp_id."""
+    conn = app.connect_db()
+    conn.executemany(
+        "INSERT INTO users (username, password, full_name, balance_cents) VALUES (?,?,?,?)",
+        [(f"cache_{i}", "x", f"Cache User {i}", 100000) for i in range(pairs * 2)]
+    )
+    conn.execute("INSERT INTO employees (username, password, full_name, role) VALUES ('cache_emp', 'x', 'Cache Teller', 'Teller')")
+    conn.commit()
+    emp_id = conn.execute("SELECT emp_id FROM employees WHERE username='cache_emp'").fetchone()[0]
+    ids = {row[0]: row[1] for row in conn.execute("SELECT username, user_id FROM users WHERE username LIKE 'cache_%'")}
+    conn.close()
+    return emp_id, ids
+
+def as_role(client, key, value):
+    with client.session_transaction() as sess:
+        sess.clear()
+        sess[key] = value
+
+def shown_balance(client, user_id):
+    """Load the dashboard as user_id and return the balance it displays, in cents."""
+    as_role(client, "user_id", user_id)
+    match = BALANCE_PATTERN.search(client.get("/user/dashboard").get_data(as_text=True))
+    return round(float(match.group(1).replace(",", "")) * 100)
+
+def stored_balance(app, user_id):
+    conn = sqlite3.connect(app.DATABASE)
+    try:
+        return conn.execute("SELECT balance_cents FROM users WHERE user_id=?", (user_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def foreign_poster(app, pipe):
+    """Child process: make the postings the parent sends, with its own dashboard cache."""
+    app.reset_after_fork()
+    client = app.app.test_client()
+    while True:
+        job = pipe.recv()
+        if job is None:
+            return
+        key, value, path, data = job
+        as_role(client, key, value)
+        client.post(path, data=data)
+        pipe.send(True)
+
+def writer(app, index, names, ids, emp_id, postings, failures, checks, pipe=None):
+    """Post to a private pair of customers and check both dashboards after each commit."""
+    rng = random.Random(index)
+    client = app.app.test_client()
+    a, b = names
+    for step in range(postings):
+        amount = f"{rng.randint(1, 2000) / 100:.2f}"
+        kind = step % 3
+        if kind == 0:
+            job = ("user_id", ids[a], "/user/transfer", {"recipient": b, "amount": amount})
+        elif kind == 1:
+            job = ("emp_id", emp_id, "/employee/transaction", {"username": b, "amount": amount, "action_type": "Deposit"})
+        else:
+            job = ("emp_id", emp_id, "/employee/transfer",
+                   {"sender_username": b, "recipient_username": a, "amount": amount})
+        if pipe is not None:
+            pipe.send(job)
+            pipe.recv()
+        else:
+            key, value, path, data = job
+            as_role(client, key, value)
+            client.post(path, data=data)
+        for name in names:
+            shown, stored = shown_balance(client, ids[name]), stored_balance(app, ids[name])
+            checks[index] += 1
+            if shown != stored:
+                failures.append(f"{name}: dashboard shows {shown} cents, database has {stored} after step {step}")
+
+def reader(app, user_ids, stop, seed_value):
+    """Keep filling the cache with random dashboards while the writers post."""
+    rng = random.Random(seed_value)
+    client = app.app.test_client()
+    while not stop.is_set():
+        shown_balance(client, rng.choice(user_ids))
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the dashboard cache never serves a stale balance")
+    parser.add_argument("--pairs", type=int, default=4, help="Writer threads (each owns two customers)")
+    parser.add_argument("--postings", type=int, default=100, help="Postings per writer")
+    parser.add_argument("--readers", type=int, default=2, help="Threads loading random dashboards")
+    parser.add_argument("--foreign-writes", action="store_true",
+                        help="Commit postings in forked sibling processes (POSIX only)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bank_dashcache_")
+    try:
+        app = load_app(workdir)
+        if app.dashboard_cache.max_size <= 0:
+            print("[!] Dashboard cache is disabled (BANK_DASHBOARD_CACHE_SIZE=0); nothing to check.")
+            sys.exit(1)
+        emp_id, ids = seed(app, args.pairs)
+        pipes, children = [None] * args.pairs, []
+        if args.foreign_writes:
+            app.close_pools()
+            context = multiprocessing.get_context("fork")
+            for i in range(args.pairs):
+                pipes[i], child_pipe = context.Pipe()
+                children.append(context.Process(target=foreign_poster, args=(app, child_pipe), daemon=True))
+                children[-1].start()
+        failures = []
+        checks = [0] * args.pairs
+        stop = threading.Event()
+        readers = [threading.Thread(target=reader, args=(app, list(ids.values()), stop, i))
+                   for i in range(args.readers)]
+        writers = [threading.Thread(target=writer, args=(app, i, (f"cache_{2 * i}", f"cache_{2 * i + 1}"),
+                                                         ids, emp_id, args.postings, failures, checks, pipes[i]))
+                   for i in range(args.pairs)]
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        stop.set()
+        for t in readers:
+            t.join()
+        for pipe, child in zip(pipes, children):
+            pipe.send(None)
+            child.join()
+
+        stats = app.dashboard_cache.stats()
+        print("=" * 60)
+        where = "in sibling processes" if args.foreign_writes else "in this process"
+        print(f"Dashboard cache consistency ({args.pairs} writers posting {where}, {args.readers} readers)")
+        print("=" * 60)
+        print(f"Dashboard checks:  {sum(checks)}")
+        print(f"Cache hits/misses: {stats['hits']}/{stats['misses']} (hit ratio {stats['hit_ratio']:.1%})")
+        print(f"Invalidations:     {stats['invalidations']}")
+        print(f"Stale entries:     {stats['stale']} (generation changed after they were loaded)")
+        if failures:
+            print(f"\n[X] {len(failures)} stale dashboards:")
+            for failure in failures[:20]:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("\n[OK] No dashboard showed a stale balance after a committed posting.")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Verify that every hot query is served by an index.
+
+Builds a fresh database through the app's migrations, seeds enough rows that
+the planner's statistics resemble production, then calls the app's own query code for every
+request hot path (credential lookup, dashboard, history pages, reports,
+customer search, accounts, idempotency keys) with SQLite's trace callback on.
+Each statement it runs is checked with EXPLAIN QUERY PLAN, and the check
+fails if any of them scans a table without an index or sorts in a temp B-tree.
+Because the SQL is captured rather than copied, the check follows the app
+when a query changes.
+
+Usage:
+    python scripts/check_query_plans.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_common import load_app
+
+FIRST_NAMES = ("ahmed", "mohamed", "omar", "fatma", "salma", "youssef", "mary", "john")
+LAST_NAMES = ("hassan", "ibrahim", "mansour", "smith", "garcia", "nasser")
+# Enough rows that the planner's costs look like production, not a toy table
+SEED_USERS = 20000
+SEED_TRANSACTIONS = 20000
+
+# Plans where a temp B-tree is inherent and bounded: rollup rows ordered by an aggregate
+SORT_ALLOWED = ("summary by employee", "summary by customer")
+
+def hot_paths(app):
+    """
+    The app calls that run on request hot paths.
+
+    Returns:
+        list: (name, function(conn)) pairs; each function runs the app code
+              whose statements are checked
+    """
+    cursor_at = app.encode_cursor("2025-01-15 10:00:00", 1000)
+    filtered = {"trans_type": "Deposit", "date_from": "2025-01-01", "date_to": "2025-01-31"}
+    admin = {"columns": app.ADMIN_HISTORY_COLUMNS, "joins": app.HISTORY_NAME_JOINS}
+    report = {"columns": app.REPORT_HISTORY_COLUMNS, "joins": app.HISTORY_NAME_JOINS}
+
+    def page(args, **kwargs):
+        return lambda conn: app.fetch_transactions_page(conn.cursor(), app.parse_history_filters(args), **kwargs)
+
+    def export(conn):
+        sql, params, _ = app.export_query(conn.cursor(), "transactions", app.parse_history_filters(filtered))
+        conn.execute(sql, params).fetchone()
+
+    paths = [(f"login lookup ({role})", lambda conn, role=role: app.lookup_credentials(conn, role, "user_7"))
+             for role in app.CREDENTIAL_QUERIES]
+    paths += [
+        ("user_dashboard history", lambda conn: conn.execute(app.DASHBOARD_HISTORY_QUERY, (1,)).fetchall()),
+        ("dashboard generation", lambda conn: conn.execute(app.DASHBOARD_GENERATION_QUERY, (1,)).fetchone()),
+        ("customer accounts", lambda conn: app.list_accounts(conn.cursor(), 1)),
+        ("account lookup", lambda conn: app.find_account(conn.cursor(), 1, "checking")),
+        ("cash account shards", lambda conn: app.load_cash_accounts(conn.cursor())),
+        ("customer history page", page({}, user_id=1)),
+        ("customer history after cursor", page({"after": cursor_at}, user_id=1)),
+        ("customer history before cursor", page({"before": cursor_at}, user_id=1)),
+        ("customer history filtered", page(filtered, user_id=1)),
+        ("view_transactions page", page({}, **admin)),
+        ("view_transactions after cursor", page({"after": cursor_at}, **admin)),
+        ("view_transactions before cursor", page({"before": cursor_at}, **admin)),
+        ("view_transactions by username", page({"user": "user_7"}, **admin)),
+        ("reports history filtered", page(filtered, **report)),
+        ("export transactions filtered", export),
+    ]
+    paths += [(f"summary by {group}", lambda conn, group=group: app.fetch_summary(
+        conn.cursor(), group, "2025-01-01", "2025-01-31")) for group in app.SUMMARY_GROUPS]
+    paths += [
+        ("search username/email prefix", lambda conn: app.search_customers(conn, "user_1")),
+        ("search username typo", lambda conn: app.search_customers(conn, "usre_17")),
+        ("search name words", lambda conn: app.search_customers(conn, "ahmed hassan")),
+        ("search name typo", lambda conn: app.search_customers(conn, "ahmde hasan")),
+        ("idempotency key lookup", lambda conn: app._replay_posting(conn.cursor(), "user:1:probe", "probe")),
+        ("expired idempotency keys", lambda conn: app.purge_idempotency_keys(conn)),
+    ]
+    return paths
+
+def capture(conn, func):
+    """
+    Run func(conn) and return the distinct reads/updates it executed.
+
+    Statements are returned with their parameters inlined, as SQLite's
+    trace callback reports them.
+    """
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        func(conn)
+    finally:
+        conn.set_trace_callback(None)
+    seen = []
+    for sql in statements:
+        verb = sql.lstrip().split(None, 1)[0].upper()
+        if verb in ("SELECT", "WITH", "UPDATE", "DELETE") and sql not in seen:
+            seen.append(sql)
+    return seen
+
+def plan_problems(conn, sql, allow_sort=False):
+    """
+    Return the EXPLAIN QUERY PLAN lines that indicate a missing index.
+
+    Args:
+        conn: Database connection
+        sql: Query to explain
+        allow_sort: Accept temp B-trees (sorting by an aggregate)
+
+    Returns:
+        tuple: (all plan lines, offending plan lines)
+    """
+    details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    bad = [
+        d for d in details
+        if ("TEMP B-TREE" in d and not allow_sort)
+        or (d.startswith("SCAN") and "USING" not in d and "VIRTUAL TABLE INDEX" not in d)
+    ]
+    return details, bad
+
+def seed(app, conn):
+    conn.executemany(
+        "INSERT INTO employees (username, password, full_name, role) VALUES (?, 'x', ?, 'Teller')",
+        [(f"emp_{i}", f"Employee {i}") for i in range(5)]
+    )
+    conn.executemany(
+        "INSERT INTO users (username, password, full_name, email) VALUES (?, 'x', ?, ?)",
+        [(f"user_{i}", f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i % len(LAST_NAMES)]}",
+          f"user_{i}@example.com") for i in range(SEED_USERS)]
+    )
+    conn.executemany(
+        "INSERT INTO transactions (user_id, emp_id, trans_type, amount_cents, trans_date) VALUES (?,?,?,?,?)",
+        [(i % SEED_USERS + 1, i % 5 or None, "Deposit", 100, f"2025-01-{i % 28 + 1:02d} 10:00:00")
+         for i in range(SEED_TRANSACTIONS)]
+    )
+    conn.commit()
+    app.rebuild_daily_summary(conn)
+    conn.execute("ANALYZE")
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bank_plans_")
+    try:
+        app = load_app(workdir)
+        conn = app.connect_db()
+        seed(app, conn)
+
+        failures = 0
+        for name, func in hot_paths(app):
+            statements = capture(conn, func)
+            if not statements:
+                print(f"[!] {name}: no statements executed")
+                continue
+            for i, sql in enumerate(statements, 1):
+                details, bad = plan_problems(conn, sql, allow_sort=name in SORT_ALLOWED)
+                label = name if len(statements) == 1 else f"{name} #{i}"
+                print(f"{'[X]' if bad else '[OK]'} {label}")
+                for d in details:
+                    print(f"      {d}")
+                failures += bool(bad)
+        conn.close()
+        if failures:
+            print(f"\n{failures} hot query(s) are not index-backed.")
+            sys.exit(1)
+        print("\nAll hot queries use indexes.")
+    finally:
+        os.chdir(BASE_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
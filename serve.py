@@ -0,0 +1,326 @@
+"""
+Production server: preforked worker processes over a preloaded app.
+
+The master imports app.py once with BANK_INIT_DB=0, applies migrations
+exactly once (init_db()), compiles the templates and warms the page cache,
+closes its connections and forks --workers processes. Each worker opens
+its pooled connections and serves the shared listening socket with up to
+--threads requests at a time. The master prints the startup time once
+every worker is ready, restarts workers that die, and handles signals:
+
+    SIGTERM / SIGINT  stop accepting, let in-flight requests finish
+                      (up to --graceful-timeout seconds), exit
+    SIGHUP            graceful reload: check that the new code imports,
+                      re-exec the master on the same socket, start new
+                      workers, then stop the old ones once they are ready
+
+Needs fork (Linux, macOS). Put a reverse proxy (nginx) in front for TLS
+and slow clients; connections are closed after each response.
+
+Usage:
+    python serve.py --workers 4 --threads 8 --port 8000
+    kill -HUP <master pid>    # reload after deploying new code
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Set by a reloading master for the process that replaces it
+FD_ENV = "BANK_SERVE_FD"
+OLD_WORKERS_ENV = "BANK_SERVE_OLD_WORKERS"
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection, so an idle keep-alive client never holds a thread
+    protocol_version = "HTTP/1.0"
+
+class WorkerServer(BaseWSGIServer):
+    """
+    WSGI server on an inherited socket with at most `threads` requests in flight.
+
+    A free slot is taken before accept(), so a saturated worker leaves new
+    connections in the shared backlog for its idle siblings. The socket is
+    non-blocking because every worker is woken for each connection and all
+    but one lose the race to accept it.
+    """
+    multithread = True
+    SLOT_WAIT = 0.5     # Seconds to wait for a free slot before re-checking for shutdown
+
+    def __init__(self, app, sock, threads):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=RequestHandler, fd=sock.fileno())
+        self.socket.setblocking(False)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._active = set()
+        self._active_lock = threading.Lock()
+
+    def _handle_request_noblock(self):
+        # Bounded wait so serve_forever() still notices shutdown() while saturated
+        if not self._slots.acquire(timeout=self.SLOT_WAIT):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:  # A sibling accepted it first
+            self._slots.release()
+            return
+        if not self.verify_request(request, client_address):
+            self.shutdown_request(request)
+            self._slots.release()
+            return
+        try:
+            self.process_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            self._slots.release()
+        except BaseException:
+            self.shutdown_request(request)
+            self._slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        """Serve an accepted connection on its own thread; the caller already holds a slot."""
+        thread = threading.Thread(target=self._handle, args=(request, client_address), daemon=True)
+        with self._active_lock:
+            self._active.add(thread)
+        thread.start()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._active_lock:
+                self._active.discard(threading.current_thread())
+            self._slots.release()
+
+    def drain(self):
+        """Wait for the requests in flight (the master kills us after --graceful-timeout)."""
+        with self._active_lock:
+            threads = list(self._active)
+        for thread in threads:
+            thread.join()
+
+def listen(host, port, backlog):
+    """The listening socket: inherited from a reloading master, or bound now."""
+    fd = os.environ.pop(FD_ENV, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        sock = socket.create_server((host, port), backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(bank, sock, args, ready_fd):
+    """Body of a forked worker process; never returns."""
+    status = 0
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        bank.reset_after_fork()
+        bank.warm_up(connections=min(args.threads, bank.DB_POOL_SIZE))
+        server = WorkerServer(bank.app, sock, args.threads)
+
+        def stop(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        signal.signal(signal.SIGTERM, stop)
+
+        os.write(ready_fd, b".")
+        server.serve_forever()
+        server.drain()
+        server.server_close()
+    except BaseException as e:
+        print(f"[X] Worker {os.getpid()} failed: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        os._exit(status)
+
+class Master:
+    """Forks and supervises the workers for one listening socket."""
+
+    def __init__(self, bank, sock, args):
+        self.bank = bank
+        self.sock = sock
+        self.args = args
+        self.workers = set()
+        self.retiring = {}      # pid -> time it must be gone by
+        self.stopping = False
+        self.reloading = False
+        self.ready_r, self.ready_w = os.pipe()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            os.close(self.ready_r)
+            run_worker(self.bank, self.sock, self.args, self.ready_w)
+        self.workers.add(pid)
+        return pid
+
+    def wait_ready(self, count, timeout):
+        """Block until `count` workers have signalled readiness."""
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < count:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"only {ready} of {count} workers were ready after {timeout:g}s")
+            self.reap()
+            if not self.workers:
+                raise RuntimeError("every worker exited during startup")
+            if select.select([self.ready_r], [], [], 0.2)[0]:
+                ready += len(os.read(self.ready_r, count - ready))
+
+    def retire(self, pids):
+        """Ask workers to finish their requests and exit."""
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for pid in pids:
+            self.workers.discard(pid)
+            self.retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.retiring.pop(pid)
+
+    def reap(self):
+        """Collect exited children; returns the pids of workers that died unexpectedly."""
+        died = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                self.workers.discard(pid)
+                died.append(pid)
+                print(f"[!] Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}", file=sys.stderr)
+            self.retiring.pop(pid, None)
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self.retiring.pop(pid)
+        return died
+
+    def run(self):
+        """Supervise until stopped; returns True if the master should re-exec for a reload."""
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        os.set_blocking(self.ready_r, False)
+        while not self.stopping:
+            if self.reloading:
+                self.reloading = False
+                if new_code_imports():
+                    return True
+            for _ in self.reap():
+                if not self.stopping:
+                    time.sleep(1)  # Don't spin if workers crash on start
+                    self.spawn()
+            try:
+                os.read(self.ready_r, 1024)  # Readiness of respawned workers
+            except BlockingIOError:
+                pass
+            time.sleep(0.2)
+        self.retire(list(self.workers))
+        while self.retiring:
+            self.reap()
+            time.sleep(0.1)
+        return False
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reloading = True
+
+def new_code_imports():
+    """Import app.py in a child interpreter before re-exec'ing onto it."""
+    env = dict(os.environ, BANK_INIT_DB="0",
+               PYTHONPATH=os.pathsep.join(filter(None, [BASE_DIR, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", "import app"], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"[X] Reload aborted, app.py does not import:\n{result.stderr[-2000:]}", file=sys.stderr)
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the banking app with preforked worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="Requests served at once per worker")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--graceful-timeout", type=float, default=30, help="Seconds in-flight requests get on stop/reload")
+    parser.add_argument("--startup-timeout", type=float, default=60, help="Seconds workers get to become ready")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (werkzeug format)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("[X] serve.py needs fork (Linux/macOS). Use `flask --app app run` or an ASGI server (asgi.py) instead.")
+        sys.exit(1)
+    if not args.access_log:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    sock = listen(args.host, args.port, args.backlog)
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, "").split(",") if pid]
+
+    os.environ["BANK_INIT_DB"] = "0"
+    timings = {}
+    started = time.perf_counter()
+    import app as bank
+    timings["import"] = time.perf_counter() - started
+    started = time.perf_counter()
+    bank.init_db()
+    timings["init_db"] = time.perf_counter() - started
+    started = time.perf_counter()
+    templates = bank.warm_up()
+    timings["warm-up"] = time.perf_counter() - started
+
+    master = Master(bank, sock, args)
+    started = time.perf_counter()
+    for _ in range(args.workers):
+        master.spawn()
+    try:
+        master.wait_ready(args.workers, args.startup_timeout)
+    except RuntimeError as e:
+        print(f"[X] Startup failed: {e}", file=sys.stderr)
+        master.retire(list(master.workers))
+        sys.exit(1)
+    timings["workers"] = time.perf_counter() - started
+    if old_workers:
+        master.retire(old_workers)
+
+    host, port = sock.getsockname()[:2]
+    print(f"[OK] {'Reloaded' if old_workers else 'Serving'} on http://{host}:{port} "
+          f"with {args.workers} workers x {args.threads} threads (master pid {os.getpid()})")
+    print(f"     ready in {(time.perf_counter() - STARTED) * 1000:.0f} ms: "
+          + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+          + f" ({templates} templates compiled)", flush=True)
+
+    if master.run():
+        os.environ[FD_ENV] = str(sock.fileno())
+        os.environ[OLD_WORKERS_ENV] = ",".join(str(pid) for pid in master.workers)
+        print("[!] Reloading...", flush=True)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    print("[OK] Stopped.")
+
+if __name__ == "__main__":
+    main()